@@ -6,223 +6,270 @@ Created by Sunray_Vision
 GTK interface for MSI Modern 15H AI C1MGT-096IT thermal management
 """
 
-import os
+import time
+import cairo
 import gi
 import config as old_config # Importa il modulo di configurazione aggiornato.
+import ipc
+from charge_threshold import ThresholdSequence # Stessa sequenza soglia batteria del daemon.
+from ec import get_device # Motore EC condiviso con il daemon.
+from graph import GRAPH_SIGNALS, HistoryGraph
+from profiles import PROFILE_NAMES, profile_registers
+from scheduler import AdaptiveSchedule
+from state import load_state, save_state
 
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk, GLib
 
-# Percorso del file di interfaccia con l'Embedded Controller (EC).
-# L'accesso a questo file richiede privilegi di root.
-EC_IO_FILE = '/sys/kernel/debug/ec/ec0/io'
+# Preferenze correnti (profilo, soglia batteria, offset Basic) dal file di stato.
+PREFERENCES = load_state()
 
-# Variabile globale per memorizzare le temperature minime e massime di CPU e GPU.
-# [CPU_MIN_TEMP, CPU_MAX_TEMP, GPU_MIN_TEMP, GPU_MAX_TEMP]
-GLOBAL_MIN_MAX_TEMPS = [100, 0, 100, 0] # Inizializzati a valori che saranno facilmente superati/sottopassato.
+# Minimo e massimo di ogni temperatura dall'apertura della finestra: {segnale: [min, max]}.
+# Tenuti a parte e non ricavati dallo storico a livelli, che oltre i 512 s passa ai bucket
+# da un minuto e perderebbe i primi campioni della sessione.
+SESSION_RANGE = {}
 
-# --- Funzioni di Interazione con l'Embedded Controller (EC) ---
+# Connessione alla telemetria del daemon (None se il daemon non è in esecuzione).
+TELEMETRY_CLIENT = None
 
-def write_ec(byte_address: int, value: int):
-    """
-    Scrive un singolo byte (value) all'indirizzo (byte_address) specificato nell'Embedded Controller.
-    Richiede privilegi di root. Gestisce errori di I/O.
-    """
-    try:
-        # 'r+b' permette di seek e poi write, è più robusto per file speciali come /sys/kernel/debug/ec/ec0/io
-        with open(EC_IO_FILE, 'r+b') as f:
-            f.seek(byte_address)
-            f.write(bytes([value])) # Assicura che `value` sia un singolo byte
-    except FileNotFoundError:
-        print(f"ERRORE: Il file EC '{EC_IO_FILE}' non trovato. Assicurati che il modulo 'ec_sys' sia caricato e di eseguire come root.")
-        return False
-    except PermissionError:
-        print(f"ERRORE: Permesso negato per accedere a '{EC_IO_FILE}'. Eseguire l'applicazione con privilegi di root (es. sudo).")
-        return False
-    except Exception as e:
-        print(f"ERRORE: Impossibile scrivere all'indirizzo EC {hex(byte_address)} con valore {value}: {e}")
-        return False
-    return True
-
-def read_ec(byte_address: int, size: int, return_format: int):
-    """
-    Legge un certo numero di byte (size) dall'indirizzo (byte_address) specificato nell'Embedded Controller.
-    Restituisce il valore in base al formato richiesto (return_format: 0 per intero, 1 per esadecimale stringa).
-    Richiede privilegi di root. Gestisce errori di I/O.
-    """
-    try:
-        with open(EC_IO_FILE, 'r+b') as f:
-            f.seek(byte_address)
-            data = f.read(size)
-            if not data: # Se non vengono letti dati, potrebbe essere un problema
-                print(f"AVVISO: Nessun dato letto dall'indirizzo EC {hex(byte_address)}.")
-                return 0 # Ritorna un valore di default in caso di lettura fallita
-    except FileNotFoundError:
-        print(f"ERRORE: Il file EC '{EC_IO_FILE}' non trovato. Assicurati che il modulo 'ec_sys' sia caricato e di eseguire come root.")
-        return 0
-    except PermissionError:
-        print(f"ERRORE: Permesso negato per accedere a '{EC_IO_FILE}'. Eseguire l'applicazione con privilegi di root (es. sudo).")
-        return 0
-    except Exception as e:
-        print(f"ERRORE: Impossibile leggere dall'indirizzo EC {hex(byte_address)} di dimensione {size}: {e}")
-        return 0 # Ritorna 0 in caso di errore di lettura
+# Sequenza soglia batteria in corso senza daemon e id del suo timer GLib (None se nessuna).
+THRESHOLD_JOB = None
+THRESHOLD_SOURCE = None
 
-    if return_format == 0: # Restituisce intero
-        return int(data.hex(), 16)
-    elif return_format == 1: # Restituisce stringa esadecimale
-        return data.hex()
-    else:
-        print(f"AVVISO: Formato di ritorno non valido per read_ec: {return_format}. Restituito intero per default.")
-        return int(data.hex(), 16)
+# Intervallo di aggiornamento della finestra: breve quando le temperature salgono, lungo a riposo.
+GUI_SCHEDULE = AdaptiveSchedule(*old_config.GUI_POLL)
 
 # --- Logica di Gestione dei Profili Ventola ---
 
 def apply_fan_profile(profile_id: int):
     """
     Applica il profilo delle ventole specificato interagendo con l'EC.
+    Vengono scritti solo i registri che cambiano, in blocchi contigui.
     Parameters:
         profile_id (int): ID del profilo da applicare (1=Auto, 2=Basic, 3=Advanced, 4=Cooler Booster).
     """
-    # Disattiva Cooler Booster all'inizio, a meno che non sia il profilo selezionato
-    if profile_id != 4:
-        write_ec(old_config.EC_COOLER_BOOSTER_CONTROL_ADDR, old_config.EC_COOLER_BOOSTER_OFF_VALUE)
-
-    if profile_id == 1: # Auto
-        write_ec(old_config.EC_AUTO_ADV_CONTROL_ADDR, old_config.EC_AUTO_VALUE)
-        current_speeds = old_config.AUTO_FAN_CURVE
-    elif profile_id == 2: # Basic (Auto con offset)
-        write_ec(old_config.EC_AUTO_ADV_CONTROL_ADDR, old_config.EC_AUTO_VALUE) # Assicurati sia in modalità auto
-        # Calcola le velocità per il profilo Basic applicando l'offset e clippando i valori
-        current_speeds = [
-            [max(0, min(150, val + old_config.BASIC_FAN_OFFSET)) for val in old_config.AUTO_FAN_CURVE[0]],
-            [max(0, min(150, val + old_config.BASIC_FAN_OFFSET)) for val in old_config.AUTO_FAN_CURVE[1]]
-        ]
-    elif profile_id == 3: # Advanced
-        write_ec(old_config.EC_AUTO_ADV_CONTROL_ADDR, old_config.EC_ADVANCED_VALUE)
-        current_speeds = old_config.ADVANCED_FAN_CURVE
-    elif profile_id == 4: # Cooler Booster
-        # Attiva Cooler Booster e non scrive le curve individuali
-        write_ec(old_config.EC_COOLER_BOOSTER_CONTROL_ADDR, old_config.EC_COOLER_BOOSTER_ON_VALUE)
-        # Non c'è bisogno di scrivere le curve individuali in modalità Cooler Booster
-        print("Cooler Booster attivato. Le curve delle ventole sono gestite dal firmware.")
-        update_config_file_profile(profile_id) # Aggiorna la selezione anche per CB
-        return
-    else:
+    registers = profile_registers(profile_id, PREFERENCES["basic_fan_offset"])
+    if registers is None:
         print(f"AVVISO: Profilo ventola non valido: {profile_id}. Nessuna azione.")
         return
 
-    # Scrive le curve delle ventole nell'EC per CPU e GPU
-    for i in range(2): # 0 per CPU, 1 per GPU
-        for j in range(7): # Per i 7 punti della curva
-            address = old_config.EC_FAN_CURVE_ADDRESSES[i][j]
-            speed = current_speeds[i][j]
-            if not write_ec(address, speed):
-                print(f"AVVISO: Fallita la scrittura della velocità {speed} all'indirizzo {hex(address)} per il profilo {profile_id}.")
-
-    # Dopo aver applicato un profilo, aggiorna il valore nel file config.
-    update_config_file_profile(profile_id)
+    report = get_device().apply(registers)
+    if not report.ok:
+        print(f"AVVISO: Profilo {profile_id} applicato solo in parte: registri modificati {[hex(a) for a in report.changed]}.")
+    elif profile_id == 4:
+        # Le curve in modalità Cooler Booster sono gestite dal firmware.
+        print("Cooler Booster attivato. Le curve delle ventole sono gestite dal firmware.")
 
-def update_config_file_profile(profile_id: int):
-    """
-    Aggiorna la variabile DEFAULT_FAN_PROFILE nel file config.py.
-    Questo è un modo basilare e si consiglia di usare un modulo di configurazione
-    più robusto (es. json, configparser) per file di configurazione più complessi
-    in un'applicazione più grande.
-    """
-    try:
-        filepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.py')
-        with open(filepath, 'r') as f:
-            lines = f.readlines()
-
-        with open(filepath, 'w') as f:
-            for line in lines:
-                if line.strip().startswith('DEFAULT_FAN_PROFILE ='):
-                    f.write(f'DEFAULT_FAN_PROFILE = {profile_id}\n')
-                else:
-                    f.write(line)
-    except Exception as e:
-        print(f"ERRORE: Impossibile aggiornare DEFAULT_FAN_PROFILE nel file config.py: {e}")
+    # Dopo aver applicato un profilo, aggiorna il file di stato.
+    save_preference("fan_profile", profile_id)
 
-def update_config_file_battery_threshold(threshold: int):
+def save_preference(key: str, value: int):
     """
-    Aggiorna la variabile BATTERY_CHARGE_THRESHOLD nel file config.py.
+    Salva una preferenza nel file di stato (scrittura atomica, vedi state.py).
+    Il daemon, se attivo, la applica appena il file cambia.
     """
     try:
-        filepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.py')
-        with open(filepath, 'r') as f:
-            lines = f.readlines()
-
-        with open(filepath, 'w') as f:
-            for line in lines:
-                if line.strip().startswith('BATTERY_CHARGE_THRESHOLD ='):
-                    f.write(f'BATTERY_CHARGE_THRESHOLD = {threshold}\n')
-                else:
-                    f.write(line)
-    except Exception as e:
-        print(f"ERRORE: Impossibile aggiornare BATTERY_CHARGE_THRESHOLD nel file config.py: {e}")
+        PREFERENCES.update(save_state({key: value}))
+    except OSError as e:
+        print(f"ERRORE: Impossibile salvare {key} in {old_config.STATE_FILE}: {e}")
 
 # --- Funzioni di Aggiornamento UI e Callbacks ---
 
-def update_gui_values():
-    """
-    Aggiorna periodicamente i valori di temperatura e RPM delle ventole
-    nell'interfaccia grafica. Questa funzione viene chiamata da un timer GLib.
-    """
-    # Legge le temperature correnti di CPU e GPU dall'EC.
-    cpu_temp = read_ec(old_config.EC_TEMP_ADDRESSES[0], 1, 0)
-    gpu_temp = read_ec(old_config.EC_TEMP_ADDRESSES[1], 1, 0)
+def _label_text(value):
+    return "N/A" if value is None else str(value)
 
-    # Legge i valori per il calcolo degli RPM e gestisce la divisione per zero.
-    cpu_rpm_raw = read_ec(old_config.EC_RPM_ADDRESSES[0], 2, 0)
-    gpu_rpm_raw = read_ec(old_config.EC_RPM_ADDRESSES[1], 2, 0)
+# Testo attuale di ogni etichetta dei valori: set_text (e il relayout che provoca) solo se cambia.
+LABEL_TEXT = {}
 
-    # Evita ZeroDivisionError:
-    cpu_rpm = old_config.FAN_RPM_CALIBRATION_CONSTANT // cpu_rpm_raw if cpu_rpm_raw else 0
-    gpu_rpm = old_config.FAN_RPM_CALIBRATION_CONSTANT // gpu_rpm_raw if gpu_rpm_raw else 0
+def set_label(label: Gtk.Label, value):
+    text = _label_text(value)
+    if LABEL_TEXT.get(label) != text:
+        LABEL_TEXT[label] = text
+        label.set_text(text)
+
+def session_range(signal: str, value):
+    """Aggiorna e ritorna (min, max) della sessione per `signal`; (None, None) prima della prima lettura."""
+    if value is not None:
+        bounds = SESSION_RANGE.setdefault(signal, [value, value])
+        bounds[0], bounds[1] = min(bounds[0], value), max(bounds[1], value)
+    return tuple(SESSION_RANGE.get(signal, (None, None)))
+
+def show_readings(cpu_temp, gpu_temp, cpu_rpm, gpu_rpm, ts=None):
+    """
+    Aggiunge una lettura al grafico e ai min/max della sessione e aggiorna le etichette
+    della finestra che cambiano. Valori None (non ancora disponibili) vengono mostrati come N/A.
+    """
+    ts = time.time() if ts is None else ts
+    cpu_min, cpu_max = session_range("cpu_temp", cpu_temp)
+    gpu_min, gpu_max = session_range("gpu_temp", gpu_temp)
 
     # Aggiorna le etichette dell'interfaccia grafica.
     # Si assume che `main_window` (la finestra principale) sia globale e contenga gli attributi delle etichette.
     if hasattr(main_window, 'cpu_curr_label'): # Verifica che le etichette esistano
-        main_window.cpu_curr_label.set_text(str(cpu_temp))
-        main_window.gpu_curr_label.set_text(str(gpu_temp))
+        main_window.graph.push(ts, {"cpu_temp": cpu_temp, "gpu_temp": gpu_temp,
+                                    "cpu_rpm": cpu_rpm, "gpu_rpm": gpu_rpm})
+        set_label(main_window.cpu_curr_label, cpu_temp)
+        set_label(main_window.gpu_curr_label, gpu_temp)
 
-        # Aggiorna le temperature minime e massime registrate globalmente.
-        if cpu_temp < GLOBAL_MIN_MAX_TEMPS[0]: GLOBAL_MIN_MAX_TEMPS[0] = cpu_temp
-        if cpu_temp > GLOBAL_MIN_MAX_TEMPS[1]: GLOBAL_MIN_MAX_TEMPS[1] = cpu_temp
-        main_window.cpu_min_label.set_text(str(GLOBAL_MIN_MAX_TEMPS[0]))
-        main_window.cpu_max_label.set_text(str(GLOBAL_MIN_MAX_TEMPS[1]))
+        # Temperature minime e massime della sessione.
+        set_label(main_window.cpu_min_label, cpu_min)
+        set_label(main_window.cpu_max_label, cpu_max)
+        set_label(main_window.gpu_min_label, gpu_min)
+        set_label(main_window.gpu_max_label, gpu_max)
 
-        if gpu_temp < GLOBAL_MIN_MAX_TEMPS[2]: GLOBAL_MIN_MAX_TEMPS[2] = gpu_temp
-        if gpu_temp > GLOBAL_MIN_MAX_TEMPS[3]: GLOBAL_MIN_MAX_TEMPS[3] = gpu_temp
-        main_window.gpu_min_label.set_text(str(GLOBAL_MIN_MAX_TEMPS[2]))
-        main_window.gpu_max_label.set_text(str(GLOBAL_MIN_MAX_TEMPS[3]))
+        set_label(main_window.cpu_rpm_label, cpu_rpm)
+        set_label(main_window.gpu_rpm_label, gpu_rpm)
 
-        main_window.cpu_rpm_label.set_text(str(cpu_rpm))
-        main_window.gpu_rpm_label.set_text(str(gpu_rpm))
+def send_request(cmd: str, value: int):
+    """
+    Invia la richiesta al daemon senza attendere: il daemon unisce le richieste ravvicinate
+    e la conferma arriva in on_telemetry. Ritorna False se il daemon non è raggiungibile.
+    """
+    if TELEMETRY_CLIENT is None:
+        return False
+    try:
+        TELEMETRY_CLIENT.request(cmd, value)
+    except OSError as e:
+        print(f"AVVISO: Impossibile inviare la richiesta al daemon: {e}")
+        return False
+    return True
+
+def show_applied_profile():
+    """Riporta il selettore al profilo effettivamente applicato, senza generare una nuova richiesta."""
+    combo = main_window.profile_combo
+    combo.handler_block_by_func(on_profile_changed)
+    combo.set_active(PREFERENCES["fan_profile"] - 1)
+    combo.handler_unblock_by_func(on_profile_changed)
+
+def show_applied_threshold():
+    """Riporta il selettore della soglia al valore salvato, senza avviare una nuova sequenza."""
+    combo = main_window.bct_combo
+    combo.handler_block_by_func(on_bct_changed)
+    try:
+        combo.set_active(list(range(50, 101, 5)).index(PREFERENCES["battery_threshold"]))
+    except ValueError:
+        combo.set_active(0)
+    combo.handler_unblock_by_func(on_bct_changed)
+
+def on_ack(ack: dict):
+    """Conferma di una richiesta dal daemon, che ha già salvato la scelta nel file di stato."""
+    if not ack.get("ok"):
+        print(f"ERRORE: Il daemon non ha applicato {ack.get('cmd')}={ack.get('value')}: "
+              f"{ack.get('error') or ack.get('mismatched')}")
+        # Es. "permesso negato" per una GUI non root: i selettori non devono mostrare valori non applicati.
+        if ack.get("cmd") == "profile":
+            show_applied_profile()
+        elif ack.get("cmd") == "battery_threshold":
+            show_applied_threshold()
+        return
+    key = {"profile": "fan_profile", "battery_threshold": "battery_threshold"}.get(ack.get("cmd"))
+    if key is not None:
+        PREFERENCES[key] = ack["value"]
+
+def on_telemetry(fd, condition):
+    """
+    Callback GLib: nuovi campioni dal daemon sul socket di telemetria.
+    Se il daemon si ferma si torna alla lettura diretta dell'EC.
+    """
+    global TELEMETRY_CLIENT
+    try:
+        samples = TELEMETRY_CLIENT.read_samples()
+    except (OSError, ValueError) as e:
+        print(f"AVVISO: Telemetria del daemon interrotta ({e}). Lettura diretta dell'EC.")
+        TELEMETRY_CLIENT.close()
+        TELEMETRY_CLIENT = None
+        GLib.timeout_add(int(GUI_SCHEDULE.interval * 1000), update_gui_values)
+        return False
+    for ack in [s for s in samples if "ack" in s]:
+        on_ack(ack)
+    samples = [s for s in samples if "ack" not in s]
+    if samples:
+        latest = samples[-1] # Basta l'ultimo campione: quelli intermedi sono già superati.
+        show_readings(latest.get("cpu_temp"), latest.get("gpu_temp"),
+                      latest.get("cpu_rpm"), latest.get("gpu_rpm"), latest.get("ts"))
+    return True
+
+def start_subscription():
+    """Si iscrive alla telemetria del daemon. Ritorna False se il daemon non è raggiungibile."""
+    global TELEMETRY_CLIENT
+    TELEMETRY_CLIENT = ipc.connect()
+    if TELEMETRY_CLIENT is None:
+        return False
+    GLib.io_add_watch(TELEMETRY_CLIENT.fileno(), GLib.PRIORITY_DEFAULT,
+                      GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR, on_telemetry)
+    return True
 
-    return True # Importante: deve ritornare True per far sì che GLib.timeout_add continui a chiamare la funzione.
+def update_gui_values():
+    """
+    Aggiorna i valori di temperatura e RPM leggendo direttamente l'EC (richiede root).
+    Usata solo quando il daemon non è in esecuzione: ad ogni tick si riprova l'iscrizione.
+    """
+    if start_subscription():
+        return False # Da ora in poi gli aggiornamenti arrivano dal daemon.
+
+    # Legge temperature e RPM di CPU e GPU con un'unica lettura dell'EC.
+    readings = get_device().read_sensors()
+    if readings is None:
+        # Lettura fallita: mantiene i valori precedenti e riprova dopo l'intervallo corrente.
+        GLib.timeout_add(int(GUI_SCHEDULE.interval * 1000), update_gui_values)
+        return False
+    show_readings(*readings)
+
+    # Il prossimo aggiornamento arriva prima se le temperature stanno cambiando in fretta.
+    interval = GUI_SCHEDULE.observe(max(readings.cpu_temp, readings.gpu_temp), time.monotonic())
+    GLib.timeout_add(int(interval * 1000), update_gui_values)
+    return False # Il timer successivo è già stato programmato con l'intervallo adattivo.
 
 def on_profile_changed(combo_box: Gtk.ComboBoxText):
     """
     Funzione callback richiamata quando l'utente seleziona un nuovo profilo dal ComboBox delle ventole.
     """
     selected_text = combo_box.get_active_text()
-    profile_names = ["Auto", "Basic", "Advanced", "Cooler Booster"]
     try:
-        profile_id = profile_names.index(selected_text) + 1
-        apply_fan_profile(profile_id)
+        profile_id = PROFILE_NAMES.index(selected_text) + 1
+        if not send_request("profile", profile_id):
+            apply_fan_profile(profile_id) # Daemon non attivo: scrittura diretta nell'EC.
     except ValueError:
         print(f"ERRORE: Profilo '{selected_text}' non riconosciuto.")
 
+def start_threshold_sequence(threshold: int):
+    """Avvia la sequenza per `threshold`, annullando quella ancora in corso: vale solo l'ultima scelta."""
+    global THRESHOLD_JOB, THRESHOLD_SOURCE
+    if THRESHOLD_SOURCE is not None:
+        GLib.source_remove(THRESHOLD_SOURCE)
+        THRESHOLD_SOURCE = None
+    THRESHOLD_JOB = ThresholdSequence(threshold)
+    run_threshold_sequence(THRESHOLD_JOB)
+
+def run_threshold_sequence(job: ThresholdSequence):
+    """
+    Avanza la sequenza della soglia batteria sui timer GLib, senza bloccare la finestra.
+    A sequenza terminata salva la preferenza (solo se il registro ha confermato il valore).
+    """
+    global THRESHOLD_JOB, THRESHOLD_SOURCE
+    THRESHOLD_SOURCE = None
+    if job is not THRESHOLD_JOB:
+        return False  # Sostituita da una scelta più recente.
+    if not job.poll():
+        THRESHOLD_SOURCE = GLib.timeout_add(max(1, int(job.time_to_next() * 1000)), run_threshold_sequence, job)
+        return False
+    THRESHOLD_JOB = None
+    result = job.result()
+    if result["ok"]:
+        save_preference("battery_threshold", job.threshold)
+    else:
+        print(f"ERRORE: Soglia batteria {job.threshold}% non applicata: {result['error']}")
+    return False
+
 def on_bct_changed(combo_box: Gtk.ComboBoxText):
     """
     Funzione callback richiamata quando l'utente seleziona una nuova soglia di carica batteria.
     """
     try:
         threshold = int(combo_box.get_active_text())
-        # Scrive il valore nell'EC, aggiungendo un offset di 128 come da OFC.py originale
-        write_ec(old_config.EC_BATTERY_THRESHOLD_ADDR, threshold + 128)
-        update_config_file_battery_threshold(threshold)
+        if not send_request("battery_threshold", threshold):
+            # Daemon non attivo: stessa sequenza del daemon (soglia, 100%, soglia) con verifica.
+            start_threshold_sequence(threshold)
     except ValueError:
         print("ERRORE: Valore soglia batteria non valido.")
     except Exception as e:
@@ -230,13 +277,66 @@ def on_bct_changed(combo_box: Gtk.ComboBoxText):
 
 # --- Costruzione dell'Interfaccia Utente ---
 
+class HistoryGraphArea(Gtk.DrawingArea):
+    """
+    Grafico di temperature e RPM (vedi graph.py). Il disegno vive in una superficie Cairo
+    fuori schermo: un campione ridisegna lì solo le ultime colonne di pixel e invalida solo
+    quell'area della finestra; quando il grafico scorre la superficie viene traslata con
+    una sola copia. Il callback "draw" si limita a copiare la superficie nell'area da aggiornare.
+    """
+    def __init__(self):
+        super().__init__()
+        self.graph = HistoryGraph()
+        self.surface = None
+        self.set_size_request(-1, 120)
+        self.connect("configure-event", self.on_configure)
+        self.connect("draw", self.on_draw)
+
+    def on_configure(self, widget, event):
+        width, height = self.get_allocated_width(), self.get_allocated_height()
+        if self.surface is not None and (width, height) == (self.graph.width, self.graph.height):
+            return False
+        self.surface = self.get_window().create_similar_surface(cairo.CONTENT_COLOR, width, height)
+        self.graph.resize(width, height)
+        self.graph.draw(cairo.Context(self.surface), 0, width)
+        self.queue_draw()
+        return False
+
+    def on_draw(self, widget, cr):
+        if self.surface is not None:
+            cr.set_source_surface(self.surface, 0, 0)
+            cr.paint() # GTK ha già ritagliato il contesto all'area invalidata.
+        return False
+
+    def push(self, ts, sample):
+        shift = self.graph.add(ts, sample)
+        if self.surface is None:
+            return
+        width, height = self.graph.width, self.graph.height
+        if shift == 0:
+            # Cambia solo l'ultima colonna (e il raccordo con la precedente).
+            x0 = max(0, width - 2)
+            self.graph.draw(cairo.Context(self.surface), x0, width)
+            self.queue_draw_area(x0, 0, width - x0, height)
+            return
+        # Scorrimento: copia traslata della superficie, poi solo le colonne nuove.
+        scrolled = self.surface.create_similar(cairo.CONTENT_COLOR, width, height)
+        cr = cairo.Context(scrolled)
+        cr.set_source_surface(self.surface, -shift, 0)
+        cr.paint()
+        x0 = max(0, width - shift - 1)
+        self.graph.draw(cr, x0, width)
+        self.surface = scrolled
+        self.queue_draw()
+
+
 class FanControlWindow(Gtk.Window):
     """
     Classe principale della finestra dell'applicazione GTK per il controllo delle ventole.
     """
     def __init__(self):
         super().__init__(title="MSI Fan Control (Ultra 5 125H)") # Titolo aggiornato.
-        self.set_default_size(450, 280) # Aumentato leggermente le dimensioni per più spazio.
+        self.set_default_size(450, 420) # Spazio per il grafico storico.
         self.set_resizable(False) # Rendi la finestra non ridimensionabile per mantenere il layout.
 
         main_grid = Gtk.Grid()
@@ -256,9 +356,9 @@ class FanControlWindow(Gtk.Window):
         main_grid.attach(profile_label, 0, 0, 1, 1) # col, row, width, height
 
         self.profile_combo = Gtk.ComboBoxText()
-        for p in ("Auto", "Basic", "Advanced", "Cooler Booster"):
+        for p in PROFILE_NAMES:
             self.profile_combo.append_text(p)
-        self.profile_combo.set_active(old_config.DEFAULT_FAN_PROFILE - 1)
+        self.profile_combo.set_active(PREFERENCES["fan_profile"] - 1)
         self.profile_combo.connect("changed", on_profile_changed)
         main_grid.attach(self.profile_combo, 1, 0, 2, 1) # Occupa 2 colonne per maggiore spazio
 
@@ -291,28 +391,39 @@ class FanControlWindow(Gtk.Window):
         self.gpu_max_label = Gtk.Label(label="N/A"); main_grid.attach(self.gpu_max_label, 3, 5, 1, 1)
         self.gpu_rpm_label = Gtk.Label(label="N/A"); main_grid.attach(self.gpu_rpm_label, 4, 5, 1, 1)
 
+        # Grafico storico di temperature e RPM, con legenda nei colori delle linee
+        self.graph = HistoryGraphArea()
+        main_grid.attach(self.graph, 0, 6, 5, 1)
+        legend = Gtk.Label()
+        legend.set_markup("  ".join(
+            f'<span foreground="#{int(r * 255):02x}{int(g * 255):02x}{int(b * 255):02x}">■</span> {name}'
+            for _, name, _, (r, g, b) in GRAPH_SIGNALS)
+            + f"   <small>(ultimi {old_config.GUI_GRAPH_SECONDS // 60} min)</small>")
+        main_grid.attach(legend, 0, 7, 5, 1)
+
         # Separatore visivo
-        main_grid.attach(Gtk.Separator(orientation=Gtk.Orientation.HORIZONTAL), 0, 6, 5, 1)
+        main_grid.attach(Gtk.Separator(orientation=Gtk.Orientation.HORIZONTAL), 0, 8, 5, 1)
 
         # Selettore soglia di carica batteria
         battery_label = Gtk.Label(label="Soglia Carica Batteria (%):")
         battery_label.set_halign(Gtk.Align.START) # Allinea a sinistra
-        main_grid.attach(battery_label, 0, 7, 1, 1)
+        main_grid.attach(battery_label, 0, 9, 1, 1)
 
         self.bct_combo = Gtk.ComboBoxText()
         for val in range(50, 101, 5):
             self.bct_combo.append_text(str(val))
         # Trova e imposta la selezione predefinita
         try:
-            current_bct_index = list(range(50, 101, 5)).index(old_config.BATTERY_CHARGE_THRESHOLD)
+            current_bct_index = list(range(50, 101, 5)).index(PREFERENCES["battery_threshold"])
             self.bct_combo.set_active(current_bct_index)
         except ValueError:
             self.bct_combo.set_active(0) # Se il valore non è nel range, seleziona 50%
         self.bct_combo.connect("changed", on_bct_changed)
-        main_grid.attach(self.bct_combo, 1, 7, 2, 1) # Occupa 2 colonne
+        main_grid.attach(self.bct_combo, 1, 9, 2, 1) # Occupa 2 colonne
 
-        # Avvia il timer per l'aggiornamento dei valori
-        GLib.timeout_add(500, update_gui_values)
+        # Riceve i valori dal daemon; se non è attivo legge l'EC con un timer adattivo (vedi GUI_POLL).
+        if not start_subscription():
+            GLib.timeout_add(int(GUI_SCHEDULE.interval * 1000), update_gui_values)
 
 # Punto di ingresso dell'applicazione
 if __name__ == "__main__":
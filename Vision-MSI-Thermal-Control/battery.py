@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Monitor batteria
+Created by Sunray_Vision
+Livello batteria e stato alimentatore da uevent del kernel, con fonti di riserva memorizzate
+"""
+
+import os
+import re
+import socket
+import subprocess
+
+from ec import get_device
+
+POWER_SUPPLY_DIR = "/sys/class/power_supply"
+SYSFS_BATTERY_CAPACITY = os.path.join(POWER_SUPPLY_DIR, "BAT1", "capacity")
+
+# Indirizzi EC candidati per il livello batteria, in ordine di priorità.
+EC_BATTERY_ADDRESSES = [0xbf, 0xe2, 0xd7, 0xef, 0x68, 0x80]
+
+# Famiglia netlink degli uevent del kernel (linux/netlink.h).
+NETLINK_KOBJECT_UEVENT = 15
+
+
+def find_ac_online():
+    """Percorso del file 'online' dell'alimentatore (tipo Mains), o None se assente."""
+    try:
+        names = sorted(os.listdir(POWER_SUPPLY_DIR))
+    except OSError:
+        return None
+    for name in names:
+        try:
+            with open(os.path.join(POWER_SUPPLY_DIR, name, "type")) as f:
+                if f.read().strip() == "Mains":
+                    return os.path.join(POWER_SUPPLY_DIR, name, "online")
+        except OSError:
+            continue
+    return None
+
+
+def parse_uevent(data: bytes):
+    """Decodifica un messaggio uevent del kernel in un dict CHIAVE=valore (None se non valido)."""
+    fields = data.split(b"\0")
+    if not fields or b"@" not in fields[0]:
+        return None  # messaggi di udev (libudev) e non del kernel
+    event = {}
+    for field in fields[1:]:
+        key, sep, value = field.partition(b"=")
+        if sep:
+            event[key.decode(errors="replace")] = value.decode(errors="replace")
+    return event
+
+
+class BatteryMonitor:
+    """
+    Fonte del livello batteria con memoria: ad ogni lettura si usa la fonte che ha dato
+    l'ultimo valore valido (sysfs, un indirizzo EC, acpi) e si torna alle altre solo quando
+    fallisce. Se disponibile, il socket uevent del kernel notifica subito variazioni di
+    carica e collegamento/scollegamento dell'alimentatore.
+    Con `ec_executor` (es. il thread EC del daemon) le letture EC passano da quell'executor,
+    mentre sysfs e acpi restano nel thread chiamante.
+    """
+
+    def __init__(self, capacity_path: str = SYSFS_BATTERY_CAPACITY, ac_path: str = None,
+                 uevents: bool = True, ec_executor=None):
+        self.capacity_path = capacity_path
+        self.battery_name = os.path.basename(os.path.dirname(capacity_path))
+        self.ac_path = ac_path if ac_path is not None else find_ac_online()
+        self.ec_executor = ec_executor
+        self.source = None       # "sysfs", ("ec", indirizzo) oppure "acpi"
+        self.capacity = None
+        self.ac_online = None
+        self.sock = None
+        if uevents:
+            try:
+                sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+                sock.bind((0, 1))  # gruppo 1: eventi del kernel
+                sock.setblocking(False)
+                self.sock = sock
+            except (OSError, AttributeError) as e:
+                print(f"[BATTERY] Uevent non disponibili ({e}), solo lettura periodica.")
+
+    def fileno(self):
+        return self.sock.fileno() if self.sock is not None else None
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    # --- Fonti ---
+
+    def _read_sysfs(self):
+        try:
+            with open(self.capacity_path, "rb") as f:
+                value = int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+        return value if 1 <= value <= 100 else None
+
+    @staticmethod
+    def _read_ec(address=None):
+        """Con `address` legge solo quell'indirizzo; altrimenti sceglie tra i candidati."""
+        addresses = [address] if address is not None else EC_BATTERY_ADDRESSES
+        snap = get_device().read_registers(addresses)  # solo i byte candidati, non l'intervallo tra loro
+        if snap is None:
+            return None, None
+        valid = [(addr, snap.byte(addr)) for addr in addresses if 1 <= snap.byte(addr) <= 100]
+        if not valid:
+            return None, None
+        # Preferiamo valori NON 100% (potrebbero essere fissi)
+        non_100 = [(addr, value) for addr, value in valid if value < 95]
+        return (non_100 or valid)[0]
+
+    def _read_ec_source(self, address=None):
+        if self.ec_executor is None:
+            return self._read_ec(address)
+        return self.ec_executor.submit(self._read_ec, address).result()
+
+    @staticmethod
+    def _read_acpi():
+        try:
+            result = subprocess.run(["acpi", "-b"], capture_output=True, text=True, timeout=5)
+        except (OSError, subprocess.SubprocessError):
+            return None
+        # Esempio output: "Battery 0: Charging, 45%, 01:23:45 until charged"
+        match = re.search(r'(\d+)%', result.stdout) if result.returncode == 0 else None
+        return int(match.group(1)) if match else None
+
+    def _read_source(self, source):
+        if source == "sysfs":
+            return self._read_sysfs()
+        if source == "acpi":
+            return self._read_acpi()
+        return self._read_ec_source(source[1])[1]
+
+    def read_capacity(self):
+        """Livello batteria in % (0 se tutte le fonti falliscono)."""
+        if self.source is not None:
+            value = self._read_source(self.source)
+            if value is not None:
+                self.capacity = value
+                return value
+            print(f"[BATTERY] Fonte {self.source} non più valida, cerco un'alternativa.")
+            self.source = None
+
+        value = self._read_sysfs()
+        source = "sysfs"
+        if value is None:
+            address, value = self._read_ec_source()
+            source = ("ec", address)
+        if value is None:
+            value = self._read_acpi()
+            source = "acpi"
+        if value is None:
+            print("[BATTERY] ERRORE: Impossibile determinare livello batteria")
+            return 0
+
+        label = source if isinstance(source, str) else f"EC {hex(source[1])}"
+        print(f"[BATTERY] Fonte selezionata: {label} ({value}%)")
+        self.source = source
+        self.capacity = value
+        return value
+
+    def read_ac_online(self):
+        if self.ac_path is None:
+            return None
+        try:
+            with open(self.ac_path, "rb") as f:
+                self.ac_online = f.read().strip() == b"1"
+        except OSError:
+            pass
+        return self.ac_online
+
+    # --- Eventi ---
+
+    def read_events(self) -> dict:
+        """
+        Consuma gli uevent in coda e ritorna {"battery": %, "ac_online": bool} per i valori
+        cambiati (dict vuoto se nessun evento power_supply rilevante).
+        """
+        changed = {}
+        if self.sock is None:
+            return changed
+        while True:
+            try:
+                data = self.sock.recv(8192)
+            except BlockingIOError:
+                return changed
+            except OSError:
+                return changed
+            event = parse_uevent(data)
+            if not event or event.get("SUBSYSTEM") != "power_supply":
+                continue
+            if "POWER_SUPPLY_CAPACITY" in event and event.get("POWER_SUPPLY_NAME") == self.battery_name:
+                try:
+                    capacity = int(event["POWER_SUPPLY_CAPACITY"])
+                except ValueError:
+                    continue
+                if 1 <= capacity <= 100 and capacity != self.capacity:
+                    self.capacity = changed["battery"] = capacity
+            if "POWER_SUPPLY_ONLINE" in event and event.get("POWER_SUPPLY_TYPE") == "Mains":
+                online = event["POWER_SUPPLY_ONLINE"] == "1"
+                if online != self.ac_online:
+                    self.ac_online = changed["ac_online"] = online
+
+
+# Istanza condivisa, come ec.get_device().
+_monitor = None
+
+def get_monitor() -> BatteryMonitor:
+    global _monitor
+    if _monitor is None:
+        _monitor = BatteryMonitor()
+    return _monitor
+
+def set_monitor(monitor):
+    """Sostituisce il monitor condiviso (es. con le letture di una traccia, vedi replay.py)."""
+    global _monitor
+    if _monitor is not None and _monitor is not monitor:
+        _monitor.close()
+    _monitor = monitor
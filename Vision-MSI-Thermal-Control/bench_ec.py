@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Benchmark I/O EC
+Created by Sunray_Vision
+Misura syscall, transazioni EC e tempo per ciclo di daemon, GUI, cambio profilo e scrape delle metriche sull'EC simulato
+
+Uso:
+    python3 bench_ec.py                      # tabella dei risultati
+    python3 bench_ec.py --json > base.json   # salva un riferimento
+    python3 bench_ec.py --baseline base.json # esce con codice 1 se syscall o transazioni aumentano
+    python3 bench_ec.py --check              # come sopra, con il riferimento nel repository (CI)
+    python3 bench_ec.py --write-baseline     # aggiorna il riferimento dopo un miglioramento voluto
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+import ec
+from ec_sim import SimulatedEC
+
+
+def _daemon_cycle():
+    import fan_daemon
+    with contextlib.redirect_stdout(io.StringIO()):
+        fan_daemon.monitor_battery()
+
+def _gui_refresh():
+    # Corpo di OFC.update_gui_values senza la parte GTK.
+    ec.get_device().read_sensors()
+
+def _profile_switch():
+    import fan_daemon
+    _profile_switch.current = 3 if getattr(_profile_switch, "current", 2) == 2 else 2
+    with contextlib.redirect_stdout(io.StringIO()):
+        fan_daemon.apply_fan_profile(_profile_switch.current)
+
+def _profile_reapply():
+    import fan_daemon
+    with contextlib.redirect_stdout(io.StringIO()):
+        fan_daemon.apply_fan_profile(2)
+
+# Scrape per ciclo dello scenario "metrics": nessuno deve toccare l'EC.
+METRICS_SCRAPES = 10
+
+def check_openmetrics(text: str):
+    """Solleva ValueError se il testo non rispetta le regole OpenMetrics usate da metrics.py."""
+    lines = text.split("\n")
+    if lines[-2:] != ["# EOF", ""]:
+        raise ValueError("manca '# EOF' in fondo")
+    types = {}
+    buckets = {}
+    for line in lines[:-2]:
+        if line.startswith("# TYPE "):
+            _, _, family, kind = line.split(" ")
+            types[family] = kind
+            continue
+        if line.startswith("#"):
+            continue
+        series, value = line.rsplit(" ", 1)
+        name, _, labels = series.partition("{")
+        labels = labels.rstrip("}")
+        family = next((f for f in types if name == f or name.startswith(f + "_")), None)
+        if family is None:
+            raise ValueError(f"campione senza # TYPE: {line}")
+        suffix = name[len(family):]
+        kind = types[family]
+        if kind == "counter" and suffix != "_total":
+            raise ValueError(f"contatore senza _total: {line}")
+        if kind == "histogram":
+            if suffix not in ("_bucket", "_count", "_sum"):
+                raise ValueError(f"campione di istogramma non valido: {line}")
+            key = (family, ",".join(l for l in labels.split(",") if l and not l.startswith("le=")))
+            if suffix == "_bucket":
+                if buckets.get(key, 0) > float(value):
+                    raise ValueError(f"bucket non cumulativo: {line}")
+                buckets[key] = float(value)
+                if 'le="+Inf"' in labels:
+                    buckets[key, "inf"] = float(value)
+            elif suffix == "_count" and buckets.get((key, "inf")) != float(value):
+                raise ValueError(f"_count diverso dal bucket +Inf: {line}")
+
+
+async def _scrape(port: int) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    if not head.startswith(b"HTTP/1.1 200"):
+        raise ValueError(f"risposta non valida: {head.splitlines()[0]!r}")
+    return body
+
+async def _serve_scrapes(exporter, scrapes: int):
+    server = await exporter.start("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        return [await _scrape(port) for _ in range(scrapes)]
+    finally:
+        exporter.close()
+
+def _metrics_scrape():
+    # Un campione pubblicato dal daemon (lettura EC solo al riscaldamento) e poi METRICS_SCRAPES scrape HTTP.
+    from emergency import EmergencyWatchdog
+    from metrics import MetricsExporter
+    from telemetry import TelemetryStore
+
+    device = ec.get_device()
+    exporter = getattr(_metrics_scrape, "exporter", None)
+    if exporter is None or exporter.stats is not device.stats:
+        telemetry = TelemetryStore()
+        telemetry.record(profile=2, **device.read_sensors()._asdict())
+        exporter = _metrics_scrape.exporter = MetricsExporter(telemetry, device.stats, EmergencyWatchdog(device))
+    exporter.invalidate(time.time())
+    calls = list(device.stats.calls)
+    for body in asyncio.run(_serve_scrapes(exporter, METRICS_SCRAPES)):
+        check_openmetrics(body.decode())
+    if list(device.stats.calls) != calls:
+        raise AssertionError("lo scrape delle metriche ha eseguito transazioni EC")
+
+# Riferimento committato: solo i conteggi, i tempi dipendono dalla macchina.
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+SCENARIOS = {
+    "daemon": _daemon_cycle,
+    "gui": _gui_refresh,
+    "profile_switch": _profile_switch,
+    "profile_reapply": _profile_reapply,
+    "metrics": _metrics_scrape,
+}
+
+
+def run_scenario(name, cycles, call_latency=0.0, byte_latency=0.0):
+    """Esegue `cycles` iterazioni dello scenario su un EC simulato nuovo e ritorna le medie per ciclo."""
+    sim = SimulatedEC(call_latency=call_latency, byte_latency=byte_latency)
+    ec.set_device(sim)
+    func = SCENARIOS[name]
+    func()  # riscaldamento: import, apertura handle, primo stato
+    sim.reset_counters()
+
+    start = time.perf_counter()
+    for _ in range(cycles):
+        func()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "syscalls": sim.syscalls / cycles,
+        "transactions": sim.transactions / cycles,
+        "wall_us": elapsed / cycles * 1e6,
+    }
+
+
+def compare(results, baseline):
+    """Ritorna la lista delle regressioni rispetto al riferimento (solo conteggi, non tempi)."""
+    regressions = []
+    for name, result in results.items():
+        ref = baseline.get(name)
+        if ref is None:
+            continue
+        for key in ("syscalls", "transactions"):
+            if result[key] > ref[key]:
+                regressions.append(f"{name}.{key}: {ref[key]:g} -> {result[key]:g}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del livello I/O EC")
+    parser.add_argument("--cycles", type=int, default=200)
+    parser.add_argument("--call-latency", type=float, default=0.0, help="latenza per syscall (s)")
+    parser.add_argument("--byte-latency", type=float, default=0.0, help="latenza per byte EC (s)")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS))
+    parser.add_argument("--json", action="store_true", help="stampa i risultati in JSON")
+    parser.add_argument("--baseline", help="file JSON di riferimento per il controllo regressioni")
+    parser.add_argument("--check", action="store_true", help=f"confronta con {os.path.basename(BASELINE_FILE)}")
+    parser.add_argument("--write-baseline", action="store_true",
+                        help=f"salva i conteggi attuali in {os.path.basename(BASELINE_FILE)}")
+    args = parser.parse_args(argv)
+    if args.check and not args.baseline:
+        args.baseline = BASELINE_FILE
+
+    results = {
+        name: run_scenario(name, args.cycles, args.call_latency, args.byte_latency)
+        for name in (args.scenario or SCENARIOS)
+    }
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        print(f"{'scenario':<18}{'syscall/ciclo':>15}{'trans. EC/ciclo':>17}{'µs/ciclo':>12}")
+        for name, r in results.items():
+            print(f"{name:<18}{r['syscalls']:>15.1f}{r['transactions']:>17.1f}{r['wall_us']:>12.1f}")
+
+    if args.write_baseline:
+        with open(BASELINE_FILE, "w") as f:
+            json.dump({name: {key: r[key] for key in ("syscalls", "transactions")}
+                       for name, r in results.items()}, f, indent=2)
+            f.write("\n")
+        print(f"[BENCH] Riferimento salvato in {BASELINE_FILE}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f))
+        for line in regressions:
+            print(f"[REGRESSIONE] {line}", file=sys.stderr)
+        if not regressions:
+            print(f"[BENCH] Nessuna regressione rispetto a {args.baseline}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
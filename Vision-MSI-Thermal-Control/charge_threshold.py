@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Soglia di carica
+Created by Sunray_Vision
+Sequenza non bloccante per impostare la soglia batteria, con verifica e nuovi tentativi; usata da daemon e GUI
+"""
+
+import time
+
+import config
+from ec import get_device
+from ec_stats import WRITE
+
+# Il firmware accetta la nuova soglia solo dopo un passaggio per 100% (228 = 128 + 100).
+THRESHOLD_RESET_VALUE = 128 + 100
+
+
+def threshold_steps(threshold: int):
+    """Valori da scrivere in EC_BATTERY_THRESHOLD_ADDR, nell'ordine (bit 7 = soglia attiva)."""
+    return [threshold + 128, THRESHOLD_RESET_VALUE, threshold + 128]
+
+
+class ThresholdSequence:
+    """
+    Macchina a stati della scrittura soglia: ogni passo viene scritto e riletto; tra un passo
+    e il successivo si attende `dwell` secondi senza bloccare (il chiamante continua a fare
+    altro e richiama `poll()` allo scadere di `time_to_next()`). Se la rilettura non
+    corrisponde il passo viene ripetuto con attesa crescente, fino a `max_attempts` volte.
+    """
+
+    def __init__(self, threshold: int, device=None, clock=time.monotonic,
+                 dwell: float = config.BATTERY_THRESHOLD_DWELL,
+                 retry_delay: float = config.BATTERY_THRESHOLD_RETRY[0],
+                 max_attempts: int = config.BATTERY_THRESHOLD_RETRY[1]):
+        self.threshold = threshold
+        self.device = device if device is not None else get_device()
+        self.clock = clock
+        self.dwell = dwell
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.steps = threshold_steps(threshold)
+        self.step = 0
+        self.attempt = 0
+        self.retries = 0
+        self.next_time = clock()
+        self.done = False
+        self.ok = False
+        self.error = None
+
+    def time_to_next(self) -> float:
+        if self.done:
+            return float('inf')
+        return max(0.0, self.next_time - self.clock())
+
+    def poll(self) -> bool:
+        """Esegue il passo se è il momento. Ritorna True quando la sequenza è terminata."""
+        if self.done or self.clock() < self.next_time:
+            return self.done
+
+        target = {config.EC_BATTERY_THRESHOLD_ADDR: self.steps[self.step]}
+        self.device.apply(target)
+        if self.device.verify(target):
+            self.attempt += 1
+            self.retries += 1
+            self.device.stats.retry(WRITE, config.EC_BATTERY_THRESHOLD_ADDR)
+            if self.attempt >= self.max_attempts:
+                self.error = (f"registro {hex(config.EC_BATTERY_THRESHOLD_ADDR)} non conferma "
+                              f"{self.steps[self.step]} dopo {self.attempt} tentativi")
+                self.done = True
+                return True
+            self.next_time = self.clock() + self.retry_delay * 2 ** (self.attempt - 1)
+            return False
+
+        self.step += 1
+        self.attempt = 0
+        if self.step == len(self.steps):
+            self.ok = self.done = True
+            return True
+        self.next_time = self.clock() + self.dwell
+        return False
+
+    def result(self) -> dict:
+        """Esito nel formato delle conferme ai client (vedi commands.py)."""
+        result = {"ok": self.ok, "retries": self.retries}
+        if self.error:
+            result["error"] = self.error
+        return result
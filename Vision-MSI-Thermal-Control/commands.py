@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Coda comandi
+Created by Sunray_Vision
+Richieste di profilo e soglia batteria dai client: raggruppate, applicate in un'unica transazione e confermate
+"""
+
+import time
+
+# Comandi accettati dal daemon e relativi valori validi.
+COMMANDS = {
+    "profile": range(1, 5),
+    "battery_threshold": range(50, 101),
+}
+
+
+class CommandQueue:
+    """
+    Coda con debounce: richieste dello stesso tipo che arrivano entro `debounce` secondi
+    l'una dall'altra vengono unite e si applica solo l'ultima. Tutti i richiedenti
+    ricevono la conferma con l'esito della transazione effettivamente eseguita.
+    """
+
+    def __init__(self, debounce: float = 0.3, clock=time.monotonic):
+        self.debounce = debounce
+        self.clock = clock
+        self.pending = {}  # {comando: [valore, scadenza, [callback di conferma]]}
+        self.running = {}  # {comando: (valore, [callback di conferma])} per gli handler non bloccanti
+
+    @staticmethod
+    def validate(cmd, value):
+        """Ritorna un messaggio di errore, oppure None se la richiesta è valida."""
+        if cmd not in COMMANDS:
+            return f"comando sconosciuto: {cmd}"
+        if not isinstance(value, int) or value not in COMMANDS[cmd]:
+            return f"valore non valido per {cmd}: {value}"
+        return None
+
+    def submit(self, cmd: str, value: int, reply):
+        """Accoda una richiesta. `reply(result: dict)` viene chiamata quando è stata applicata."""
+        error = self.validate(cmd, value)
+        if error:
+            reply({"ok": False, "error": error, "cmd": cmd, "value": value})
+            return
+        deadline = self.clock() + self.debounce
+        entry = self.pending.get(cmd)
+        if entry is None:
+            self.pending[cmd] = [value, deadline, [reply]]
+        else:
+            entry[0], entry[1] = value, deadline
+            entry[2].append(reply)
+
+    def time_to_next(self) -> float:
+        # I comandi in attesa che termini la stessa transazione non contano.
+        deadlines = [entry[1] for cmd, entry in self.pending.items() if cmd not in self.running]
+        if not deadlines:
+            return float('inf')
+        return max(0.0, min(deadlines) - self.clock())
+
+    def run_due(self, handlers: dict):
+        """
+        Esegue i comandi la cui finestra di debounce è scaduta.
+        `handlers[cmd](value)` applica la transazione e ritorna un dict con almeno "ok",
+        oppure None se la transazione prosegue in background: in quel caso l'esito va
+        consegnato con `complete(cmd, result)` e nel frattempo lo stesso comando resta in coda.
+        """
+        now = self.clock()
+        for cmd in [c for c, entry in self.pending.items() if entry[1] <= now and c not in self.running]:
+            value, _, replies = self.pending.pop(cmd)
+            try:
+                result = handlers[cmd](value)
+            except Exception as e:
+                result = {"ok": False, "error": str(e)}
+            if result is None:
+                self.running[cmd] = (value, replies)
+                continue
+            self._reply(cmd, value, replies, result)
+
+    def complete(self, cmd: str, result: dict):
+        """Consegna l'esito di una transazione avviata da `run_due` che ha ritornato None."""
+        value, replies = self.running.pop(cmd)
+        self._reply(cmd, value, replies, result)
+
+    @staticmethod
+    def _reply(cmd, value, replies, result):
+        result = dict(result, cmd=cmd, value=value, merged=len(replies))
+        for reply in replies:
+            reply(result)
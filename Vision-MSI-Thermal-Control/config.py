@@ -1,7 +1,14 @@
 # config.py - Configurazioni specifiche per MSI Modern 15H AI C1MGT-096IT
 # CPU: Intel Core Ultra 5 125H (considerata 10th Gen+ per gli indirizzi EC)
 
+import os
+
 # --- Impostazioni Generali ---
+# Le preferenze qui sotto sono solo i valori iniziali: quelle correnti sono salvate dalla GUI
+# in STATE_FILE e il daemon le applica appena il file cambia, senza riavvio.
+STATE_FILE = os.environ.get(
+    "VISION_STATE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "state.json"))
+
 # Profilo della ventola predefinito all'avvio:
 # 1 = Auto, 2 = Basic, 3 = Advanced, 4 = Cooler Booster
 DEFAULT_FAN_PROFILE = 2
@@ -10,11 +17,118 @@ DEFAULT_FAN_PROFILE = 2
 # Quando la batteria raggiunge questa percentuale, la ricarica si ferma.
 BATTERY_CHARGE_THRESHOLD = 60
 
+# Attesa (secondi) tra i passi della scrittura soglia e [attesa iniziale (s), tentativi massimi]
+# per ripetere un passo che la rilettura non conferma (l'attesa raddoppia ad ogni tentativo).
+BATTERY_THRESHOLD_DWELL = 1.0
+BATTERY_THRESHOLD_RETRY = [0.2, 5]
+
 # Offset applicato alle velocità del profilo "Auto" per creare il profilo "Basic".
 # Un valore positivo aumenta le velocità, un valore negativo le diminuisce.
 # Range tipico: da -30 a +30. I valori saranno clippati tra 0 e 150.
 BASIC_FAN_OFFSET = 0
 
+# --- Controllo Ventole Software (ciclo chiuso) ---
+# Se True il daemon legge le temperature (vedi TEMP_POLL) e riscrive i punti della
+# curva EC in base alla temperatura, invece di lasciare la curva statica.
+SOFTWARE_FAN_CONTROL = False
+
+# Temperature obiettivo (°C) per [CPU, GPU] e banda di isteresi attorno ad esse.
+FAN_CONTROL_TARGET_TEMPS = [70, 68]
+FAN_CONTROL_HYSTERESIS = 3
+
+# Guadagni PID (valore ventola 0-150 per °C) e velocità minima/massima ammesse.
+FAN_CONTROL_PID = [4.0, 0.2, 1.0]
+FAN_CONTROL_MIN_SPEED = 30
+FAN_CONTROL_MAX_SPEED = 150
+
+# Intervallo minimo (secondi) tra due scritture EC del controllo software.
+FAN_CONTROL_MIN_WRITE_INTERVAL = 2.0
+
+# Curve per il controllo software al posto del PID: None (usa il PID) oppure [CPU, GPU], dove
+# ogni curva è nel formato accettato da curves.py, es. 7 valori, [[°C, valore], ...] oppure
+# {"type": "linear", "start": 50, "end": 90, "min": 30, "max": 150}.
+FAN_CONTROL_CURVES = None
+
+# Controllo predittivo: il PID usa la temperatura prevista tra FAN_CONTROL_HORIZON secondi
+# (modello termico stimato online, vedi thermal_model.py) quando è più alta di quella
+# attuale, così le ventole accelerano prima del picco invece che dopo.
+FAN_CONTROL_PREDICTIVE = False
+FAN_CONTROL_HORIZON = 5.0
+
+# Fattore di oblio del modello termico (più basso = si adatta prima, ma è più rumoroso).
+THERMAL_MODEL_FORGETTING = 0.99
+
+# --- Emergenza Termica ---
+# Un thread separato dal loop del daemon legge solo i registri di temperatura EC ogni
+# EMERGENCY_POLL_INTERVAL secondi e accende il Cooler Booster appena una supera EMERGENCY_TEMP
+# (°C), con qualsiasi profilo. Lo spegne quando tutte restano sotto EMERGENCY_TEMP -
+# EMERGENCY_HYSTERESIS per EMERGENCY_RELEASE_TIME secondi. None disattiva la guardia.
+EMERGENCY_TEMP = 95
+EMERGENCY_HYSTERESIS = 10
+EMERGENCY_POLL_INTERVAL = 0.1
+EMERGENCY_RELEASE_TIME = 10.0
+
+# --- Sensori CPU (hwmon) ---
+# L'EC espone una sola temperatura CPU, che segue i picchi dei singoli core in ritardo. Ad ogni
+# campione il daemon legge anche coretemp/k10temp e la thermal_zone del package (vedi
+# cpu_sensors.py) e il controllo usa la più alta tra la temperatura EC e la vista scelta:
+# "hottest" (core più caldo), "weighted" (media pesata per tipo di sensore) o "ec" (solo EC).
+CPU_TEMP_SOURCE = "hottest"
+CPU_SENSOR_WEIGHTS = {"core": 1.0, "package": 2.0, "zone": 1.0}
+
+# --- Profilo Automatico dal Carico ---
+# Se True il daemon sceglie il profilo ventole dal carico CPU (/proc/stat) e dalla pressione
+# PSI (/proc/pressure/cpu), letti ogni LOAD_PROFILE_INTERVAL secondi (vedi load_profile.py).
+# Regole (profilo, carico minimo 0-1, pressione minima 0-1, secondi) in ordine di priorità:
+# una regola vale quando carico o pressione restano oltre la soglia per tutta la finestra
+# (None ignora quel criterio). Senza regole valide si usa LOAD_PROFILE_IDLE. Si torna a un
+# profilo meno fresco solo dopo LOAD_PROFILE_MIN_DWELL secondi; una scelta manuale dura almeno
+# altrettanto. Il file di stato conserva il profilo scelto dall'utente.
+LOAD_PROFILE_SCHEDULER = False
+LOAD_PROFILE_INTERVAL = 2.0
+LOAD_PROFILE_RULES = [
+    (4, 0.90, None, 120.0),   # Cooler Booster: tutti i core occupati per due minuti
+    (3, 0.50, 0.20, 20.0),    # Advanced: compilazione o rendering sostenuti
+]
+LOAD_PROFILE_IDLE = 2         # Basic
+LOAD_PROFILE_MIN_DWELL = 60.0
+
+# --- Campionamento Adattivo ---
+# [Intervallo minimo (s), Intervallo massimo (s), Variazione "veloce" per secondo].
+# Se il valore cambia più velocemente della soglia si legge all'intervallo minimo,
+# se è stabile l'intervallo cresce fino al massimo.
+TEMP_POLL = [0.25, 20.0, 1.0]       # °C/s
+RPM_POLL = [1.0, 30.0, 200.0]       # RPM/s
+BATTERY_POLL = [30.0, 300.0, 0.05]  # %/s
+GUI_POLL = [0.25, 2.0, 1.0]         # °C/s, aggiornamento della finestra
+
+# --- Grafico della GUI ---
+# Secondi di storico mostrati nel grafico di temperature e RPM e scale fisse degli assi
+# [minimo, massimo]: con scale fisse un nuovo campione ridisegna solo le ultime colonne di pixel.
+GUI_GRAPH_SECONDS = 300
+GUI_GRAPH_TEMP_RANGE = [30, 100]
+GUI_GRAPH_RPM_RANGE = [0, 6000]
+
+# --- Verifica Registri ---
+# Ogni DRIFT_CHECK_INTERVAL secondi il daemon rilegge (una sola lettura) i registri che ha
+# scritto e riscrive solo quelli che il firmware ha cambiato. Dopo un resume il controllo è immediato.
+DRIFT_CHECK_INTERVAL = 30.0
+
+# --- Storico su Disco ---
+# Registro circolare dei campioni pubblicati dal daemon (vedi history.py), conservato tra
+# un riavvio e l'altro. Con 32 MB ci stanno ~1,6 milioni di campioni (settimane di dati).
+HISTORY_FILE = os.environ.get('VISION_HISTORY_FILE', '/var/lib/vision-thermal/history.bin')
+HISTORY_MAX_BYTES = 32 * 1024 * 1024
+
+# --- Telemetria ---
+# Socket Unix su cui il daemon pubblica ogni lettura (una riga JSON per campione).
+# La GUI e altri monitor si collegano qui invece di leggere l'EC direttamente.
+TELEMETRY_SOCKET = "/run/vision-thermal.sock"
+
+# Endpoint HTTP OpenMetrics/Prometheus del daemon (solo loopback), es. ("127.0.0.1", 9857).
+# None = disattivato. Ogni scrape usa l'ultimo campione già letto: non genera letture EC.
+METRICS_ADDRESS = None
+
 # --- Indirizzi dell'Embedded Controller (EC) e Valori ---
 # Questi valori sono specifici per le CPU Intel 10th Gen e successive,
 # inclusa la tua Intel Core Ultra 5 125H (come indicato da OFC.py "LINE_YES").
@@ -54,6 +168,15 @@ EC_FAN_CURVE_ADDRESSES = [
 # Ogni lista rappresenta 7 punti (presumibilmente per 7 soglie di temperatura).
 # Questi valori sono mappati dal firmware EC a percentuali di velocità.
 
+# Soglie di temperatura (°C) presunte dei 7 punti: il firmware non le espone. Servono al
+# compilatore delle curve (curves.py) per le curve a punti liberi o parametriche e per la
+# tabella temperatura -> velocità del controllo software.
+FAN_CURVE_TEMPS = [0, 50, 58, 66, 74, 82, 90]
+
+# Velocità minime di sicurezza: [temperatura (°C), valore minimo da lì in su].
+# Una curva che scende sotto questi valori viene rifiutata.
+FAN_CURVE_SAFETY_FLOOR = [[82, 40], [90, 50]]
+
 # Curva di velocità per il profilo "Auto".
 # [[CPU Speeds], [GPU Speeds]]
 AUTO_FAN_CURVE = [
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Carico CPU
+Created by Sunray_Vision
+Percentuale di utilizzo della CPU da /proc/stat e pressione (PSI) da /proc/pressure/cpu tra due letture consecutive
+"""
+
+import os
+import time
+
+PROC_STAT = "/proc/stat"
+PROC_PRESSURE_CPU = "/proc/pressure/cpu"
+
+# La riga "cpu" aggregata e la riga "some" di PSI stanno entrambe in 256 byte.
+READ_SIZE = 256
+
+
+class CpuLoad:
+    """
+    Carico CPU complessivo (0.0 - 1.0) dall'ultima lettura. Il file resta aperto
+    e ogni lettura è un solo pread della riga "cpu" aggregata, in un buffer riusato.
+    """
+
+    def __init__(self, path: str = PROC_STAT):
+        self.path = path
+        self.fd = None
+        self.buffer = bytearray(READ_SIZE)
+        self.last = None
+        self.load = None
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def _times(self):
+        if self.fd is None:
+            self.fd = os.open(self.path, os.O_RDONLY)
+        size = os.preadv(self.fd, [self.buffer], 0)
+        end = self.buffer.find(b"\n", 0, size)
+        # cpu user nice system idle iowait irq softirq steal ...
+        values = [int(v) for v in self.buffer[:size if end < 0 else end].split()[1:9]]
+        idle = values[3] + values[4]
+        return sum(values) - idle, sum(values)
+
+    def read(self):
+        """Ritorna il carico dall'ultima chiamata (None alla prima o se /proc/stat non è leggibile)."""
+        try:
+            busy, total = self._times()
+        except (OSError, ValueError, IndexError):
+            self.close()
+            return None
+        if self.last is not None and total > self.last[1]:
+            self.load = (busy - self.last[0]) / (total - self.last[1])
+        self.last = (busy, total)
+        return self.load
+
+
+class CpuPressure:
+    """
+    Pressione CPU (PSI): frazione del tempo (0.0 - 1.0) in cui almeno un task pronto ha
+    atteso la CPU dall'ultima lettura, dal contatore "total" (µs) della riga "some".
+    A differenza del carico distingue una CPU piena da una CPU contesa. None se il kernel
+    non ha PSI (CONFIG_PSI, oppure psi=0).
+    """
+
+    def __init__(self, path: str = PROC_PRESSURE_CPU, clock=time.monotonic):
+        self.path = path
+        self.clock = clock
+        self.fd = None
+        self.buffer = bytearray(READ_SIZE)
+        self.last = None
+        self.pressure = None
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def _total(self) -> int:
+        if self.fd is None:
+            self.fd = os.open(self.path, os.O_RDONLY)
+        size = os.preadv(self.fd, [self.buffer], 0)
+        # some avg10=1.23 avg60=0.80 avg300=0.50 total=123456
+        start = self.buffer.index(b"total=", 0, size) + len(b"total=")
+        end = self.buffer.find(b"\n", start, size)
+        return int(self.buffer[start:size if end < 0 else end])
+
+    def read(self):
+        """Ritorna la pressione dall'ultima chiamata (None alla prima o se PSI non è leggibile)."""
+        try:
+            total = self._total()
+        except (OSError, ValueError):
+            self.close()
+            return None
+        now = self.clock()
+        if self.last is not None and now > self.last[1]:
+            self.pressure = min(1.0, (total - self.last[0]) / 1e6 / (now - self.last[1]))
+        self.last = (total, now)
+        return self.pressure
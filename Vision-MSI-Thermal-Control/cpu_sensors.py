@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Sensori CPU
+Created by Sunray_Vision
+Temperature per core (coretemp/k10temp) e del package (thermal_zone) lette con pread su descrittori aperti una volta sola
+"""
+
+import glob
+import os
+from typing import NamedTuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy è opzionale: con poche decine di sensori bastano le liste
+    np = None
+
+import config
+
+HWMON_ROOT = "/sys/class/hwmon"
+THERMAL_ROOT = "/sys/class/thermal"
+
+# Driver hwmon con le temperature della CPU e tipi di thermal_zone del package.
+HWMON_DRIVERS = ("coretemp", "k10temp", "zenpower")
+THERMAL_ZONE_TYPES = ("x86_pkg_temp", "TCPU")
+
+# Etichette hwmon che indicano il package (le altre sono core o CCD).
+PACKAGE_LABELS = ("Package", "Tctl", "Tdie")
+
+# Un file temp*_input contiene al più "-273150\n".
+READ_SIZE = 16
+
+
+class CpuSensor(NamedTuple):
+    label: str   # es. "coretemp Core 4", "thermal_zone2 x86_pkg_temp"
+    kind: str    # "core", "package" o "zone"
+    path: str
+
+
+class CpuTemps(NamedTuple):
+    """Viste aggregate di una lettura (°C, None se non disponibili)."""
+    hottest: float    # core più caldo
+    package: float    # package (hwmon o thermal_zone)
+    weighted: float   # media pesata con CPU_SENSOR_WEIGHTS
+
+
+def _read_text(path: str):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def discover(hwmon_root: str = HWMON_ROOT, thermal_root: str = THERMAL_ROOT):
+    """Sensori di temperatura CPU disponibili, cercati una volta sola all'avvio."""
+    sensors = []
+    for hwmon in sorted(glob.glob(os.path.join(hwmon_root, "hwmon*"))):
+        driver = _read_text(os.path.join(hwmon, "name"))
+        if driver not in HWMON_DRIVERS:
+            continue
+        for path in sorted(glob.glob(os.path.join(hwmon, "temp*_input"))):
+            label = _read_text(path[:-len("input")] + "label") or os.path.basename(path)
+            kind = "package" if label.startswith(PACKAGE_LABELS) else "core"
+            sensors.append(CpuSensor(f"{driver} {label}", kind, path))
+    for zone in sorted(glob.glob(os.path.join(thermal_root, "thermal_zone*"))):
+        zone_type = _read_text(os.path.join(zone, "type"))
+        if zone_type in THERMAL_ZONE_TYPES:
+            sensors.append(CpuSensor(f"{os.path.basename(zone)} {zone_type}", "zone",
+                                     os.path.join(zone, "temp")))
+    return sensors
+
+
+class CpuSensors:
+    """
+    Descrittori aperti su tutti i sensori trovati: ogni `read()` è un pread per file,
+    senza open/close. I valori (millesimi di °C) vengono aggregati in un solo passaggio
+    vettoriale; un sensore che non risponde viene escluso da quella lettura.
+    """
+
+    def __init__(self, sensors=None, weights=config.CPU_SENSOR_WEIGHTS):
+        self.sensors = []
+        self.fds = []
+        for sensor in (discover() if sensors is None else sensors):
+            try:
+                self.fds.append(os.open(sensor.path, os.O_RDONLY | os.O_CLOEXEC))
+            except OSError:
+                continue
+            self.sensors.append(sensor)
+        kinds = [sensor.kind for sensor in self.sensors]
+        self.weights = [float(weights.get(kind, 0.0)) for kind in kinds]
+        self.cores = [kind == "core" for kind in kinds]
+        self.packages = [kind != "core" for kind in kinds]
+        if np is not None:
+            self.weights = np.array(self.weights)
+            self.cores = np.array(self.cores, dtype=bool)
+            self.packages = np.array(self.packages, dtype=bool)
+        self.last = None  # ultimi valori grezzi, per la diagnostica
+
+    def __len__(self):
+        return len(self.fds)
+
+    def close(self):
+        for fd in self.fds:
+            os.close(fd)
+        self.fds = []
+        self.sensors = []
+
+    def read_raw(self):
+        """Millesimi di °C per ogni sensore (None se la lettura fallisce)."""
+        values = []
+        for fd in self.fds:
+            try:
+                values.append(int(os.pread(fd, READ_SIZE, 0)))
+            except (OSError, ValueError):
+                values.append(None)
+        self.last = values
+        return values
+
+    def read(self):
+        """CpuTemps dell'ultima lettura, oppure None se nessun sensore risponde."""
+        if not self.fds:
+            return None
+        raw = self.read_raw()
+        if np is not None:
+            values = np.array([np.nan if v is None else v for v in raw], dtype=np.float64) / 1000
+            valid = ~np.isnan(values)
+            if not valid.any():
+                return None
+            cores, packages = valid & self.cores, valid & self.packages
+            weights = np.where(valid, self.weights, 0.0)
+            total = weights.sum()
+            return CpuTemps(
+                float(values[cores].max()) if cores.any() else None,
+                float(values[packages].max()) if packages.any() else None,
+                float(np.dot(weights, np.where(valid, values, 0.0)) / total) if total else None,
+            )
+
+        readings = [(v / 1000, w, core) for v, w, core in zip(raw, self.weights, self.cores) if v is not None]
+        if not readings:
+            return None
+        cores = [t for t, _, core in readings if core]
+        packages = [t for t, _, core in readings if not core]
+        total = sum(w for _, w, _ in readings)
+        return CpuTemps(
+            max(cores) if cores else None,
+            max(packages) if packages else None,
+            sum(t * w for t, w, _ in readings) / total if total else None,
+        )
+
+
+def fuse(ec_temp, temps: CpuTemps, source: str = config.CPU_TEMP_SOURCE):
+    """
+    Temperatura CPU per il controllo: la più alta tra quella dell'EC e la vista `source`
+    ("hottest", "weighted" o "ec"). L'EC resta il minimo, così un sensore hwmon che legge
+    basso non può rallentare le ventole.
+    """
+    if temps is None or source == "ec":
+        return ec_temp
+    value = temps.weighted if source == "weighted" else temps.hottest
+    if value is None:
+        value = temps.package
+    return ec_temp if value is None else max(ec_temp, value)
+
+
+if __name__ == "__main__":
+    sensors = CpuSensors()
+    temps = sensors.read()
+    if temps is None:
+        print("[SENSORI] Nessun sensore di temperatura CPU leggibile in hwmon o thermal_zone.")
+    else:
+        for sensor, raw in zip(sensors.sensors, sensors.last):
+            print(f"  {sensor.label:<32} {sensor.kind:<8} {'-' if raw is None else f'{raw / 1000:.1f}°C'}")
+        print(f"[SENSORI] Core più caldo {temps.hottest}, package {temps.package}, media pesata "
+              f"{None if temps.weighted is None else round(temps.weighted, 1)}")
+    sensors.close()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Compilatore curve ventole
+Created by Sunray_Vision
+Validazione delle curve e compilazione nei 7 punti EC e in una tabella temperatura -> velocità 0-110 °C
+"""
+
+import hashlib
+import json
+from typing import NamedTuple
+
+import config
+
+SPEED_MIN, SPEED_MAX = 0, 150
+EC_POINTS = 7
+
+# La tabella copre 0..TABLE_MAX_TEMP °C con un valore per grado.
+TABLE_MAX_TEMP = 110
+
+# Curve compilate tenute in memoria (per hash del contenuto).
+CACHE_SIZE = 64
+
+
+class CurveError(ValueError):
+    """Curva non valida: fuori range, non monotona o sotto il minimo di sicurezza."""
+
+
+class CompiledCurve(NamedTuple):
+    points: tuple   # 7 valori per i registri EC_FAN_CURVE_ADDRESSES
+    table: bytes    # velocità per ogni grado da 0 a TABLE_MAX_TEMP °C
+
+    def lookup(self, temp: float) -> int:
+        """Velocità alla temperatura `temp` (una sola indicizzazione)."""
+        index = int(temp + 0.5)
+        if index < 0:
+            index = 0
+        elif index > TABLE_MAX_TEMP:
+            index = TABLE_MAX_TEMP
+        return self.table[index]
+
+
+# ----------------------------
+#   Forme di curva accettate
+# ----------------------------
+
+def _interpolate(pairs, temp: float) -> float:
+    """Interpolazione lineare su [(°C, valore), ...] ordinati; costante oltre gli estremi."""
+    if temp <= pairs[0][0]:
+        return pairs[0][1]
+    for (t0, v0), (t1, v1) in zip(pairs, pairs[1:]):
+        if temp <= t1:
+            return v0 + (v1 - v0) * (temp - t0) / (t1 - t0)
+    return pairs[-1][1]
+
+def _parametric(spec: dict):
+    """Funzione temperatura -> velocità di una curva {"type": "linear"|"power", ...}."""
+    kind = spec.get("type")
+    if kind not in ("linear", "power"):
+        raise CurveError(f"tipo di curva sconosciuto: {kind!r}")
+    try:
+        start, end = float(spec["start"]), float(spec["end"])
+        low, high = float(spec.get("min", SPEED_MIN)), float(spec.get("max", SPEED_MAX))
+        exponent = float(spec.get("exponent", 2.0)) if kind == "power" else 1.0
+    except (KeyError, TypeError, ValueError) as e:
+        raise CurveError(f"parametri della curva non validi: {e}")
+    if end <= start:
+        raise CurveError("la curva deve avere end > start")
+
+    def speed(temp):
+        x = min(1.0, max(0.0, (temp - start) / (end - start)))
+        return low + (high - low) * x ** exponent
+    return speed
+
+def _speed_function(spec):
+    """Normalizza una curva in una funzione temperatura -> velocità."""
+    if isinstance(spec, dict):
+        return _parametric(spec)
+    if not isinstance(spec, (list, tuple)) or not spec:
+        raise CurveError(f"curva non riconosciuta: {spec!r}")
+    if all(isinstance(v, (int, float)) for v in spec):
+        if len(spec) != EC_POINTS:
+            raise CurveError(f"una curva a valori deve avere {EC_POINTS} punti, non {len(spec)}")
+        pairs = list(zip(config.FAN_CURVE_TEMPS, spec))
+    else:
+        try:
+            pairs = sorted((float(t), float(v)) for t, v in spec)
+        except (TypeError, ValueError):
+            raise CurveError(f"i punti devono essere coppie [°C, valore]: {spec!r}")
+        if len({t for t, _ in pairs}) != len(pairs):
+            raise CurveError("due punti con la stessa temperatura")
+    return lambda temp: _interpolate(pairs, temp)
+
+
+# ----------------------------
+#   Validazione e compilazione
+# ----------------------------
+
+def validate(values, temps):
+    """Controlla range, monotonia e minimi di sicurezza dei valori alle temperature `temps`."""
+    for temp, value in zip(temps, values):
+        if not SPEED_MIN <= value <= SPEED_MAX:
+            raise CurveError(f"valore {value} a {temp}°C fuori da {SPEED_MIN}-{SPEED_MAX}")
+    for (t0, v0), (t1, v1) in zip(zip(temps, values), zip(temps[1:], values[1:])):
+        if v1 < v0:
+            raise CurveError(f"curva non monotona: {v0} a {t0}°C, {v1} a {t1}°C")
+    for floor_temp, floor_value in config.FAN_CURVE_SAFETY_FLOOR:
+        for temp, value in zip(temps, values):
+            if temp >= floor_temp and value < floor_value:
+                raise CurveError(f"valore {value} a {temp}°C sotto il minimo di sicurezza {floor_value}")
+
+def _compile(spec) -> CompiledCurve:
+    speed = _speed_function(spec)
+    points = tuple(int(round(speed(t))) for t in config.FAN_CURVE_TEMPS)
+    validate(points, config.FAN_CURVE_TEMPS)
+    table_temps = range(TABLE_MAX_TEMP + 1)
+    table = [int(round(speed(t))) for t in table_temps]
+    validate(table, table_temps)
+    return CompiledCurve(points, bytes(table))
+
+_cache = {}
+
+def curve_key(spec) -> str:
+    """Hash del contenuto della curva e delle impostazioni da cui dipende la compilazione."""
+    payload = json.dumps([spec, config.FAN_CURVE_TEMPS, config.FAN_CURVE_SAFETY_FLOOR], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def compile_curve(spec) -> CompiledCurve:
+    """
+    Valida e compila una curva. Forme accettate:
+        - 7 valori (uno per punto EC, alle temperature FAN_CURVE_TEMPS)
+        - punti liberi [[°C, valore], ...], interpolati linearmente
+        - parametrica {"type": "linear" | "power", "start": °C, "end": °C,
+                       "min": valore, "max": valore, "exponent": 2.0}
+    Solleva CurveError se la curva non è valida. Il risultato è in cache per hash del contenuto.
+    """
+    key = curve_key(spec)
+    compiled = _cache.get(key)
+    if compiled is None:
+        compiled = _compile(spec)
+        if len(_cache) >= CACHE_SIZE:
+            _cache.clear()
+        _cache[key] = compiled
+    return compiled
+
+def offset_curve(values, offset: int):
+    """
+    I 7 punti EC `values` (es. `compile_curve(spec).points`) spostati di `offset`, clippati
+    tra 0 e 150 e alzati ai minimi di sicurezza.
+    """
+    shifted = [min(SPEED_MAX, max(SPEED_MIN, v + offset)) for v in values]
+    for floor_temp, floor_value in config.FAN_CURVE_SAFETY_FLOOR:
+        shifted = [max(v, floor_value) if t >= floor_temp else v
+                   for t, v in zip(config.FAN_CURVE_TEMPS, shifted)]
+    return shifted
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Verifica deriva EC
+Created by Sunray_Vision
+Controllo periodico dei registri scritti dal daemon: una lettura, un checksum e riscrittura dei soli byte cambiati
+"""
+
+import time
+import zlib
+
+from ec import plan_writes
+
+
+def suspended_time() -> float:
+    """
+    Secondi trascorsi in sospensione dall'avvio: CLOCK_BOOTTIME avanza anche durante
+    il suspend, CLOCK_MONOTONIC no. Un aumento tra due letture indica un resume.
+    """
+    return time.clock_gettime(time.CLOCK_BOOTTIME) - time.monotonic()
+
+
+class DriftMonitor:
+    """
+    Stato atteso dei registri {indirizzo: valore} (profilo, soglia batteria, curve del
+    controllo software). `check()` legge i soli blocchi contigui dei registri e confronta il
+    CRC32 dei byte attesi; solo se differisce cerca i registri cambiati e li riscrive,
+    uniti in blocchi contigui.
+    """
+
+    def __init__(self, device):
+        self.device = device
+        # (attesi, indirizzi ordinati, CRC32) sostituiti in blocco: `check()` può girare in
+        # un altro thread mentre il daemon registra nuovi valori.
+        self.state = ({}, (), zlib.crc32(b""))
+        self.checks = 0
+        self.events = 0
+        self.rewritten = 0
+
+    def _set(self, expected: dict):
+        addresses = tuple(sorted(expected))
+        self.state = (expected, addresses, zlib.crc32(bytes(expected[a] & 0xFF for a in addresses)))
+
+    def update(self, registers: dict):
+        """Registra valori appena scritti con successo."""
+        expected = dict(self.state[0])
+        expected.update(registers)
+        self._set(expected)
+
+    def discard(self, addresses):
+        """Smette di verificare gli indirizzi (es. durante la sequenza della soglia batteria)."""
+        self._set({addr: value for addr, value in self.state[0].items() if addr not in addresses})
+
+    def check(self):
+        """
+        Ritorna la lista degli indirizzi riscritti ([] se tutto corrisponde),
+        oppure None se la lettura o la scrittura fallisce.
+        """
+        expected, addresses, checksum = self.state
+        if not expected:
+            return []
+        snap = self.device.read_registers(addresses)
+        if snap is None:
+            return None
+        self.checks += 1
+        if zlib.crc32(bytes(snap.byte(a) for a in addresses)) == checksum:
+            return []
+
+        runs, changed = plan_writes(snap, expected)
+        for addr, data in runs:
+            try:
+                self.device.write_bytes(addr, data)
+            except OSError as e:
+                print(f"[ERRORE] Ripristino registri EC {hex(addr)} ({len(data)} byte): {e}")
+                self.device.close()
+                return None
+        self.events += 1
+        self.rewritten += len(changed)
+        return sorted(changed)
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Accesso EC
+Created by Sunray_Vision
+Motore condiviso di lettura/scrittura dell'Embedded Controller per daemon, GUI e strumenti
+"""
+
+import os
+import time
+from typing import NamedTuple
+
+import config
+from ec_stats import READ, WRITE, ECStats
+
+# Percorso del file di interfaccia con l'Embedded Controller (EC).
+# L'accesso a questo file richiede privilegi di root e il modulo 'ec_sys'.
+# VISION_EC_IO_FILE permette di puntare a una pagina simulata (vedi ec_sim.py).
+EC_IO_FILE = os.environ.get('VISION_EC_IO_FILE', '/sys/kernel/debug/ec/ec0/io')
+
+# Dimensione della pagina registri esposta da ec_sys.
+EC_PAGE_SIZE = 256
+
+# ----------------------------
+#   Snapshot e decodifica
+# ----------------------------
+
+class SensorReadings(NamedTuple):
+    """Valori dei sensori decodificati da uno snapshot EC."""
+    cpu_temp: int
+    gpu_temp: int
+    cpu_rpm: int
+    gpu_rpm: int
+
+
+class ECSnapshot:
+    """
+    Copia in memoria di uno o più blocchi contigui della pagina registri EC.
+    Tutte le decodifiche lavorano su questi byte, senza altre transazioni EC.
+    """
+    __slots__ = ("blocks",)
+
+    def __init__(self, data: bytes, base: int = 0):
+        self.blocks = [(base, bytes(data))]
+
+    @classmethod
+    def from_blocks(cls, blocks):
+        """Snapshot di più blocchi [(indirizzo_iniziale, bytes)] letti separatamente."""
+        snap = cls.__new__(cls)
+        snap.blocks = [(base, bytes(data)) for base, data in blocks]
+        return snap
+
+    @property
+    def base(self) -> int:
+        return self.blocks[0][0]
+
+    @property
+    def data(self) -> bytes:
+        """Byte del primo blocco (l'unico per gli snapshot di un intervallo)."""
+        return self.blocks[0][1]
+
+    def __contains__(self, byte_address: int) -> bool:
+        return any(base <= byte_address < base + len(data) for base, data in self.blocks)
+
+    def byte(self, byte_address: int) -> int:
+        """Ritorna il byte all'indirizzo EC specificato."""
+        for base, data in self.blocks:
+            if base <= byte_address < base + len(data):
+                return data[byte_address - base]
+        raise IndexError(f"indirizzo EC {hex(byte_address)} non letto in questo snapshot")
+
+    def word(self, byte_address: int) -> int:
+        """Ritorna la word a 16 bit (big endian) che inizia all'indirizzo specificato."""
+        return self.byte(byte_address) << 8 | self.byte(byte_address + 1)
+
+    def temps(self):
+        """[CPU, GPU] in °C dagli indirizzi EC_TEMP_ADDRESSES."""
+        return [self.byte(addr) for addr in config.EC_TEMP_ADDRESSES]
+
+    def rpm_raw(self):
+        """Valori grezzi a 16 bit dagli indirizzi EC_RPM_ADDRESSES."""
+        return [self.word(addr) for addr in config.EC_RPM_ADDRESSES]
+
+    def rpms(self):
+        """[CPU, GPU] in RPM. Un valore grezzo nullo (ventola ferma) vale 0."""
+        return [rpm_from_raw(raw) for raw in self.rpm_raw()]
+
+    def fan_curves(self):
+        """Punti della curva ventole attualmente scritti nell'EC: [[CPU], [GPU]]."""
+        return [[self.byte(addr) for addr in fan] for fan in config.EC_FAN_CURVE_ADDRESSES]
+
+    def sensors(self) -> SensorReadings:
+        cpu_temp, gpu_temp = self.temps()
+        cpu_rpm, gpu_rpm = self.rpms()
+        return SensorReadings(cpu_temp, gpu_temp, cpu_rpm, gpu_rpm)
+
+
+def rpm_from_raw(raw: int) -> int:
+    """Converte il valore grezzo EC in RPM evitando la divisione per zero."""
+    return config.FAN_RPM_CALIBRATION_CONSTANT // raw if raw else 0
+
+
+def runs(addresses, width: int = 1):
+    """
+    Blocchi [inizio, fine) contigui che coprono gli indirizzi dati (ciascuno largo `width` byte),
+    uniti come plan_writes unisce le scritture: ec_sys fa una transazione EC per byte,
+    quindi leggere i byte tra due blocchi costa più di un pread in più.
+    """
+    blocks = []
+    for addr in sorted(set(addresses)):
+        if blocks and addr <= blocks[-1][1]:
+            blocks[-1][1] = max(blocks[-1][1], addr + width)
+        else:
+            blocks.append([addr, addr + width])
+    return [tuple(block) for block in blocks]
+
+
+# Blocchi di temperature e RPM: solo i 6 byte dei sensori, non i ~100 che li separano.
+SENSOR_BLOCKS = sorted(runs(config.EC_TEMP_ADDRESSES) + runs(config.EC_RPM_ADDRESSES, 2))
+
+# ----------------------------
+#   Pianificazione scritture
+# ----------------------------
+
+class WriteReport(NamedTuple):
+    """Esito di ECDevice.apply: cosa è cambiato davvero e con quante transazioni."""
+    changed: dict   # {indirizzo: (valore_precedente, valore_nuovo)}
+    skipped: int    # scritture scartate perché l'EC conteneva già il valore
+    runs: list      # [(indirizzo_iniziale, bytes)] scritti con un pwrite ciascuno
+    ok: bool
+
+    @property
+    def transactions(self) -> int:
+        return len(self.runs)
+
+
+def plan_writes(snapshot: ECSnapshot, targets: dict):
+    """
+    Confronta i valori desiderati {indirizzo: valore} con lo snapshot corrente,
+    scarta quelli invariati e unisce gli indirizzi contigui in blocchi unici.
+    Ritorna (runs, changed) ordinati per indirizzo.
+    """
+    changed = {}
+    for addr in sorted(targets):
+        value = targets[addr] & 0xFF
+        old = snapshot.byte(addr) if snapshot is not None and addr in snapshot else None
+        if old != value:
+            changed[addr] = (old, value)
+
+    runs = []
+    for addr, (_, value) in changed.items():
+        if runs and runs[-1][0] + len(runs[-1][1]) == addr:
+            runs[-1][1].append(value)
+        else:
+            runs.append((addr, bytearray([value])))
+    return [(addr, bytes(data)) for addr, data in runs], changed
+
+# ----------------------------
+#   Dispositivo EC
+# ----------------------------
+
+class ECDevice:
+    """
+    Handle persistente sul file EC. Il descrittore resta aperto tra un ciclo e l'altro
+    e ogni lettura è un singolo pread, invece di open/seek/read/close per ogni byte.
+    """
+
+    def __init__(self, path: str = EC_IO_FILE):
+        self.path = path
+        self.fd = None
+        self.writable = False
+        self.stats = ECStats()  # latenze ed errori di ogni transazione (vedi ec_stats.py)
+        self.recorder = None    # TraceRecorder durante una registrazione (vedi recorder.py)
+
+    def open(self):
+        if self.fd is not None:
+            return self
+        try:
+            self.fd = os.open(self.path, os.O_RDWR)
+            self.writable = True
+        except PermissionError:
+            # Senza write_support=1 è comunque possibile leggere.
+            self.fd = os.open(self.path, os.O_RDONLY)
+            self.writable = False
+        return self
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def clone(self):
+        """Nuovo handle sullo stesso EC con un descrittore proprio (es. per un thread separato)."""
+        return ECDevice(self.path)
+
+    def read_bytes(self, byte_address: int, size: int) -> bytes:
+        """Legge `size` byte con un solo pread. Solleva OSError in caso di errore."""
+        start = time.perf_counter_ns()
+        try:
+            data = self._pread(byte_address, size)
+        except OSError:
+            self.stats.record(READ, byte_address, size, time.perf_counter_ns() - start, False)
+            raise
+        self.stats.record(READ, byte_address, size, time.perf_counter_ns() - start, True)
+        if self.recorder is not None:
+            self.recorder.ec_read(byte_address, data)
+        return data
+
+    def write_bytes(self, byte_address: int, data: bytes):
+        """Scrive `data` a partire da `byte_address` con un solo pwrite."""
+        start = time.perf_counter_ns()
+        try:
+            self._pwrite(byte_address, data)
+        except OSError:
+            self.stats.record(WRITE, byte_address, len(data), time.perf_counter_ns() - start, False)
+            raise
+        self.stats.record(WRITE, byte_address, len(data), time.perf_counter_ns() - start, True)
+        if self.recorder is not None:
+            self.recorder.ec_write(byte_address, data)
+
+    # Transazioni senza statistiche: i backend alternativi (es. ec_sim.py) ridefiniscono queste.
+
+    def _pread(self, byte_address: int, size: int) -> bytes:
+        self.open()
+        data = os.pread(self.fd, size, byte_address)
+        if len(data) != size:
+            raise OSError(f"lettura EC incompleta a {hex(byte_address)}: {len(data)}/{size} byte")
+        return data
+
+    def _pwrite(self, byte_address: int, data: bytes):
+        self.open()
+        written = os.pwrite(self.fd, bytes(data), byte_address)
+        if written != len(data):
+            raise OSError(f"scrittura EC incompleta a {hex(byte_address)}: {written}/{len(data)} byte")
+
+    def snapshot(self, start: int = 0, end: int = EC_PAGE_SIZE):
+        """
+        Legge l'intervallo [start, end) della pagina registri in un'unica transazione.
+        Ritorna un ECSnapshot, oppure None se la lettura fallisce.
+        """
+        try:
+            return ECSnapshot(self.read_bytes(start, end - start), start)
+        except OSError as e:
+            print(f"[ERRORE] snapshot EC [{hex(start)}, {hex(end)}): {e}")
+            self.close()
+            return None
+
+    def read_registers(self, addresses, width: int = 1):
+        """
+        Legge solo i blocchi contigui che contengono `addresses` (vedi runs()), un pread per
+        blocco. Ritorna un ECSnapshot, oppure None se una lettura fallisce.
+        """
+        return self.read_blocks(runs(addresses, width))
+
+    def read_blocks(self, ranges):
+        """Legge i blocchi [(inizio, fine)] (un pread ciascuno) in un ECSnapshot, o None se una lettura fallisce."""
+        blocks = []
+        for start, end in ranges:
+            try:
+                blocks.append((start, self.read_bytes(start, end - start)))
+            except OSError as e:
+                print(f"[ERRORE] lettura EC [{hex(start)}, {hex(end)}): {e}")
+                self.close()
+                return None
+        return ECSnapshot.from_blocks(blocks)
+
+    def apply(self, targets: dict) -> WriteReport:
+        """
+        Porta i registri ai valori {indirizzo: valore} richiesti: una lettura dei soli blocchi
+        interessati, poi solo i byte diversi, uniti in blocchi contigui sullo stesso handle.
+        """
+        if not targets:
+            return WriteReport({}, 0, [], True)
+        snap = self.read_registers(targets)
+        runs, changed = plan_writes(snap, targets)
+        ok = True
+        for addr, data in runs:
+            try:
+                self.write_bytes(addr, data)
+            except OSError as e:
+                print(f"[ERRORE] scrittura EC {hex(addr)} ({len(data)} byte): {e}")
+                self.close()
+                ok = False
+                break
+        return WriteReport(changed, len(targets) - len(changed), runs, ok)
+
+    def verify(self, targets: dict):
+        """
+        Rilegge i soli blocchi dei registri e ritorna gli indirizzi il cui valore
+        non corrisponde a `targets` (tutti, se la lettura fallisce).
+        """
+        if not targets:
+            return []
+        snap = self.read_registers(targets)
+        if snap is None:
+            return sorted(targets)
+        return [addr for addr in sorted(targets) if snap.byte(addr) != targets[addr] & 0xFF]
+
+    def read_sensors(self):
+        """Legge solo i blocchi dei sensori e ritorna SensorReadings (o None)."""
+        snap = self.read_blocks(SENSOR_BLOCKS)
+        return snap.sensors() if snap is not None else None
+
+
+# Istanza condivisa da daemon, GUI e script (vedi get_device e set_device).
+_device = None
+
+def get_device() -> ECDevice:
+    global _device
+    if _device is None:
+        _device = ECDevice()
+    return _device
+
+def set_device(device: ECDevice):
+    """Sostituisce il backend condiviso (es. con un SimulatedEC per test e benchmark)."""
+    global _device
+    if _device is not None and _device is not device:
+        _device.close()
+    _device = device
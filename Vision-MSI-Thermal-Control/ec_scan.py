@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Scanner differenziale EC
+Created by Sunray_Vision
+Campiona tutta la pagina EC nel tempo e classifica i registri per correlazione con segnali noti
+
+Uso (come root):
+    python3 ec_scan.py --once                     # singola lettura, byte tra 1 e 100 (ex find_battery.py)
+    python3 ec_scan.py --samples 300 --interval 1 # correla con batteria sysfs e temperature hwmon
+    python3 ec_scan.py --samples 120 --force-fans # alterna Cooler Booster per trovare i registri RPM
+"""
+
+import argparse
+import json
+import math
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:  # NumPy è opzionale: senza, le correlazioni sono calcolate in Python puro
+    np = None
+
+import config
+from cpu_sensors import CpuSensors
+from ec import EC_PAGE_SIZE, get_device
+from profiles import profile_registers
+from state import load_state
+
+# ----------------------------
+#   Segnali di riferimento
+# ----------------------------
+
+def read_sysfs_battery():
+    try:
+        with open("/sys/class/power_supply/BAT1/capacity") as f:
+            return float(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+def make_hwmon_reader():
+    """Temperatura CPU più alta tra core e package hwmon (descrittori aperti una volta sola)."""
+    sensors = CpuSensors()
+    if not sensors:
+        return None
+
+    def read():
+        temps = sensors.read()
+        if temps is None:
+            return None
+        values = [v for v in (temps.hottest, temps.package) if v is not None]
+        return max(values) if values else None
+    return read
+
+# ----------------------------
+#   Campionamento
+# ----------------------------
+
+def sample(count: int, interval: float, references: dict, force_fans: int = 0):
+    """
+    Legge `count` snapshot della pagina (un pread ciascuno) e i segnali di riferimento.
+    Con `force_fans` > 0 alterna Cooler Booster ogni `force_fans` campioni e aggiunge il
+    riferimento "fan_forced" (1 = ventole forzate al massimo).
+    Ritorna (pagine, riferimenti): lista di bytes e {nome: [valori]}.
+    """
+    device = get_device()
+    pages = []
+    series = {name: [] for name in references}
+    if force_fans:
+        series["fan_forced"] = []
+        state = load_state()
+        restore = profile_registers(state["fan_profile"], state["basic_fan_offset"])
+        if restore is None:
+            # Curva del profilo non valida (vedi curves.py): si ripristina solo il Cooler Booster
+            # com'era prima della scansione, l'unico registro che la scansione cambia.
+            snap = device.snapshot(config.EC_COOLER_BOOSTER_CONTROL_ADDR, config.EC_COOLER_BOOSTER_CONTROL_ADDR + 1)
+            if snap is None:
+                raise OSError("impossibile leggere il registro Cooler Booster prima della scansione")
+            restore = {config.EC_COOLER_BOOSTER_CONTROL_ADDR: snap.byte(config.EC_COOLER_BOOSTER_CONTROL_ADDR)}
+        boost = {config.EC_COOLER_BOOSTER_CONTROL_ADDR: config.EC_COOLER_BOOSTER_ON_VALUE}
+
+    try:
+        for i in range(count):
+            if force_fans:
+                forced = (i // force_fans) % 2 == 1
+                device.apply(boost if forced else restore)
+            start = time.monotonic()
+            snap = device.snapshot()
+            if snap is None:
+                print("[SCAN] Lettura EC fallita, campione saltato")
+            else:
+                pages.append(snap.data)
+                for name, read in references.items():
+                    series[name].append(read())
+                if force_fans:
+                    series["fan_forced"].append(1.0 if forced else 0.0)
+            print(f"\r[SCAN] Campione {i + 1}/{count}", end="", file=sys.stderr, flush=True)
+            time.sleep(max(0.0, interval - (time.monotonic() - start)))
+    finally:
+        if force_fans:
+            device.apply(restore)
+        print(file=sys.stderr)
+    return pages, series
+
+# ----------------------------
+#   Analisi
+# ----------------------------
+
+def candidate_columns(pages):
+    """
+    Serie candidate: ogni byte e ogni coppia contigua a 16 bit (big endian, come EC_RPM_ADDRESSES).
+    Ritorna (etichette, colonne) con colonne come matrice NumPy (campioni x candidati) o liste.
+    """
+    labels = [f"{hex(a)}" for a in range(EC_PAGE_SIZE)]
+    labels += [f"{hex(a)}:{hex(a + 1)}" for a in range(EC_PAGE_SIZE - 1)]
+    if np is not None:
+        matrix = np.frombuffer(b"".join(pages), dtype=np.uint8).reshape(len(pages), EC_PAGE_SIZE)
+        matrix = matrix.astype(np.float64)
+        words = matrix[:, :-1] * 256 + matrix[:, 1:]
+        return labels, np.hstack([matrix, words])
+    columns = [[float(page[a]) for page in pages] for a in range(EC_PAGE_SIZE)]
+    columns += [[float(page[a] * 256 + page[a + 1]) for page in pages] for a in range(EC_PAGE_SIZE - 1)]
+    return labels, columns
+
+def correlations(columns, reference):
+    """Correlazione di Pearson di ogni candidato con `reference` (NaN per serie costanti)."""
+    if np is not None:
+        ref = np.asarray(reference, dtype=np.float64)
+        x = columns - columns.mean(axis=0)
+        y = ref - ref.mean()
+        denom = np.sqrt((x * x).sum(axis=0) * (y * y).sum())
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return (x * y[:, None]).sum(axis=0) / denom
+
+    n = len(reference)
+    my = sum(reference) / n
+    dy = [v - my for v in reference]
+    syy = sum(d * d for d in dy)
+    result = []
+    for column in columns:
+        mx = sum(column) / n
+        dx = [v - mx for v in column]
+        sxx = sum(d * d for d in dx)
+        denom = math.sqrt(sxx * syy)
+        result.append(sum(a * b for a, b in zip(dx, dy)) / denom if denom else float("nan"))
+    return result
+
+def rank(pages, series, top: int = 10):
+    """Per ogni riferimento ritorna i `top` candidati ordinati per |r| decrescente."""
+    labels, columns = candidate_columns(pages)
+    ranking = {}
+    for name, values in series.items():
+        keep = [i for i, v in enumerate(values) if v is not None]
+        if len(keep) < 3:
+            continue
+        reference = [values[i] for i in keep]
+        if len(keep) != len(values):
+            subset = columns[keep] if np is not None else [[c[i] for i in keep] for c in columns]
+        else:
+            subset = columns
+        r = correlations(subset, reference)
+        scored = [(labels[i], float(r[i])) for i in range(len(labels)) if not math.isnan(r[i])]
+        scored.sort(key=lambda item: abs(item[1]), reverse=True)
+        ranking[name] = scored[:top]
+    return ranking
+
+# ----------------------------
+#   Riga di comando
+# ----------------------------
+
+def scan_once():
+    """Singola lettura della pagina: stampa i byte tra 1 e 100 (possibili percentuali batteria)."""
+    print("Scansionando indirizzi EC per trovare la batteria...")
+    snap = get_device().snapshot()  # Tutta la pagina registri in una sola lettura
+    if snap is None:
+        return
+    for addr in range(0x00, 0xFF):
+        value = snap.byte(addr)
+        if 1 <= value <= 100:  # Percentuali valide di batteria
+            print(f"Trovato: Indirizzo {hex(addr)} = {value}%")
+
+    # Controlla anche gli indirizzi noti
+    print("\nControllo indirizzi noti:")
+    for addr in [0xe2, 0xbf, 0xd7, 0xef]:
+        print(f"Indirizzo {hex(addr)} = {snap.byte(addr)}%")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scanner differenziale dei registri EC")
+    parser.add_argument("--once", action="store_true", help="singola lettura (comportamento di find_battery.py)")
+    parser.add_argument("--samples", type=int, default=120)
+    parser.add_argument("--interval", type=float, default=1.0, help="secondi tra due campioni")
+    parser.add_argument("--force-fans", type=int, default=0, metavar="N",
+                        help="alterna Cooler Booster ogni N campioni per trovare i registri RPM")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--save", help="salva pagine e riferimenti in JSON per analisi successive")
+    args = parser.parse_args(argv)
+
+    if args.once:
+        scan_once()
+        return 0
+
+    references = {"battery_sysfs": read_sysfs_battery}
+    hwmon = make_hwmon_reader()
+    if hwmon is not None:
+        references["cpu_temp_hwmon"] = hwmon
+
+    try:
+        pages, series = sample(args.samples, args.interval, references, args.force_fans)
+    except OSError as e:
+        print(f"[ERRORE] {e}")
+        return 1
+    if len(pages) < 3:
+        print("[SCAN] Campioni insufficienti.")
+        return 1
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"pages": [p.hex() for p in pages], "references": series}, f)
+
+    for name, candidates in rank(pages, series, args.top).items():
+        print(f"\n== {name} ==")
+        for label, r in candidates:
+            print(f"  {label:<12} r = {r:+.3f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - EC simulato
+Created by Sunray_Vision
+Backend EC in-process per test e benchmark senza root, ec_sys o il portatile MSI
+"""
+
+import os
+import time
+
+import config
+from ec import EC_PAGE_SIZE, ECDevice
+
+# Soglie di temperatura (°C) associate ai 7 punti della curva. Il firmware reale non le
+# espone: servono solo a dare al modello un comportamento plausibile.
+SIM_CURVE_TEMPS = config.FAN_CURVE_TEMPS
+
+# Velocità massima delle ventole simulate, raggiunta con il valore 150.
+SIM_MAX_RPM = 5200
+
+
+class SimulatedEC(ECDevice):
+    """
+    Pagina registri da 256 byte in memoria con latenza configurabile e un modello
+    termico del primo ordine che aggiorna temperature e RPM nel tempo, come il firmware.
+
+    Contatori disponibili per i benchmark:
+        syscalls      - chiamate equivalenti al kernel (open, close, pread, pwrite)
+        transactions  - transazioni EC a singolo byte (ec_sys legge/scrive un byte alla volta)
+    """
+
+    def __init__(self, page: bytes = None, call_latency: float = 0.0, byte_latency: float = 0.0,
+                 clock=time.monotonic, ambient: float = 40.0):
+        super().__init__(path="<simulato>")
+        self.page = bytearray(page if page is not None else EC_PAGE_SIZE)
+        self.call_latency = call_latency
+        self.byte_latency = byte_latency
+        self.clock = clock
+        self.syscalls = 0
+        self.transactions = 0
+
+        # Stato del modello termico
+        self.ambient = ambient
+        self.load = 0.3              # Carico 0..1, modificabile dai test
+        self.tau = 20.0              # Costante di tempo termica (s)
+        self.heat_gain = 55.0        # °C sopra l'ambiente a pieno carico e ventole ferme
+        self.cooling_gain = 25.0     # °C sottratti a ventole al massimo
+        self.temps = [ambient, ambient]
+        self._last_step = None
+        self._write_sensors()
+
+    # --- Modello del firmware ---
+
+    def fan_duty(self, fan: int) -> int:
+        """Valore 0..150 che il firmware userebbe per la ventola `fan` alla temperatura attuale."""
+        if self.page[config.EC_COOLER_BOOSTER_CONTROL_ADDR] == config.EC_COOLER_BOOSTER_ON_VALUE:
+            return 150
+        point = 0
+        for i, threshold in enumerate(SIM_CURVE_TEMPS):
+            if self.temps[fan] >= threshold:
+                point = i
+        return self.page[config.EC_FAN_CURVE_ADDRESSES[fan][point]]
+
+    def step(self, dt: float):
+        """Avanza il modello di `dt` secondi."""
+        for fan in range(2):
+            duty = min(150, self.fan_duty(fan)) / 150
+            target = self.ambient + self.load * self.heat_gain - duty * self.cooling_gain
+            alpha = min(1.0, dt / self.tau)
+            self.temps[fan] += (target - self.temps[fan]) * alpha
+        self._write_sensors()
+
+    def _advance(self):
+        now = self.clock()
+        if self._last_step is not None and now > self._last_step:
+            self.step(now - self._last_step)
+        self._last_step = now
+
+    def _write_sensors(self):
+        for fan in range(2):
+            self.page[config.EC_TEMP_ADDRESSES[fan]] = max(0, min(255, int(round(self.temps[fan]))))
+            rpm = SIM_MAX_RPM * min(150, self.fan_duty(fan)) // 150
+            raw = config.FAN_RPM_CALIBRATION_CONSTANT // rpm if rpm else 0
+            addr = config.EC_RPM_ADDRESSES[fan]
+            self.page[addr:addr + 2] = min(raw, 0xFFFF).to_bytes(2, 'big')
+
+    # --- Interfaccia ECDevice ---
+
+    def _access(self, size: int):
+        self.syscalls += 1
+        self.transactions += size
+        delay = self.call_latency + size * self.byte_latency
+        if delay:
+            time.sleep(delay)
+
+    def open(self):
+        if self.fd is None:
+            self.syscalls += 1
+            self.fd = -1
+            self.writable = True
+        return self
+
+    def close(self):
+        if self.fd is not None:
+            self.syscalls += 1
+            self.fd = None
+
+    def clone(self):
+        return self  # la pagina è in memoria: un altro handle vedrebbe un EC diverso
+
+    def _pread(self, byte_address: int, size: int) -> bytes:
+        self.open()
+        self._advance()
+        if byte_address < 0 or byte_address + size > EC_PAGE_SIZE:
+            raise OSError(f"lettura EC fuori pagina a {hex(byte_address)}")
+        self._access(size)
+        return bytes(self.page[byte_address:byte_address + size])
+
+    def _pwrite(self, byte_address: int, data: bytes):
+        self.open()
+        self._advance()
+        if byte_address < 0 or byte_address + len(data) > EC_PAGE_SIZE:
+            raise OSError(f"scrittura EC fuori pagina a {hex(byte_address)}")
+        self._access(len(data))
+        self.page[byte_address:byte_address + len(data)] = data
+
+    def reset_counters(self):
+        self.syscalls = 0
+        self.transactions = 0
+
+
+# ----------------------------
+#   Firmware simulato su file
+# ----------------------------
+
+def run_file_firmware(path: str, interval: float = 1.0, load: float = 0.3):
+    """
+    Mantiene una pagina EC simulata in un file regolare da 256 byte. Daemon e GUI possono
+    usarla con VISION_EC_IO_FILE=<path>: le loro scritture vengono rilette ad ogni passo.
+    """
+    sim = SimulatedEC()
+    sim.load = load
+    if os.path.exists(path) and os.path.getsize(path) == EC_PAGE_SIZE:
+        with open(path, 'rb') as f:
+            sim.page[:] = f.read()
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        os.pwrite(fd, bytes(sim.page), 0)
+        print(f"[SIM] Pagina EC simulata in {path} (carico {load:.0%})")
+        while True:
+            time.sleep(interval)
+            sim.page[:] = os.pread(fd, EC_PAGE_SIZE, 0)
+            sim.step(interval)
+            for addr in config.EC_TEMP_ADDRESSES:
+                os.pwrite(fd, bytes(sim.page[addr:addr + 1]), addr)
+            for addr in config.EC_RPM_ADDRESSES:
+                os.pwrite(fd, bytes(sim.page[addr:addr + 2]), addr)
+    finally:
+        os.close(fd)
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2:
+        print(f"Uso: {sys.argv[0]} <file_pagina> [carico 0..1]")
+        sys.exit(1)
+    run_file_firmware(sys.argv[1], load=float(sys.argv[2]) if len(sys.argv) > 2 else 0.3)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Statistiche EC
+Created by Sunray_Vision
+Contatori e istogrammi di latenza delle transazioni EC, per operazione e per registro, in array a dimensione fissa
+"""
+
+from array import array
+from bisect import bisect_left
+
+# Operazioni contate (indici degli array).
+READ, WRITE = 0, 1
+OPS = ("read", "write")
+
+# Limiti superiori dei bucket di latenza in µs; l'ultimo bucket raccoglie tutto ciò che è oltre.
+LATENCY_BUCKETS_US = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000)
+_BOUNDS_NS = tuple(b * 1000 for b in LATENCY_BUCKETS_US)
+_BUCKETS = len(LATENCY_BUCKETS_US) + 1
+
+REGISTERS = 256
+
+
+def _zeros(n: int):
+    return array('Q', bytes(8 * n))
+
+
+class ECStats:
+    """
+    Statistiche delle transazioni EC. Tutti i contatori sono array preallocati: registrare
+    una transazione aggiorna solo alcuni elementi, senza creare liste o dizionari.
+    Ogni transazione è attribuita al suo indirizzo iniziale (uno snapshot di un intervallo
+    conta come una lettura del primo registro).
+    """
+
+    def __init__(self):
+        ops = len(OPS)
+        self.calls = _zeros(ops)
+        self.bytes = _zeros(ops)
+        self.errors = _zeros(ops)
+        self.retries = _zeros(ops)
+        self.total_ns = _zeros(ops)
+        self.max_ns = _zeros(ops)
+        self.histogram = _zeros(ops * _BUCKETS)
+        self.reg_calls = _zeros(ops * REGISTERS)
+        self.reg_errors = _zeros(ops * REGISTERS)
+        self.reg_retries = _zeros(ops * REGISTERS)
+        self.reg_histogram = _zeros(ops * REGISTERS * _BUCKETS)
+
+    def record(self, op: int, address: int, size: int, elapsed_ns: int, ok: bool):
+        bucket = bisect_left(_BOUNDS_NS, elapsed_ns)
+        reg = op * REGISTERS + (address & 0xFF)
+        self.calls[op] += 1
+        self.bytes[op] += size
+        self.total_ns[op] += elapsed_ns
+        if elapsed_ns > self.max_ns[op]:
+            self.max_ns[op] = elapsed_ns
+        self.histogram[op * _BUCKETS + bucket] += 1
+        self.reg_calls[reg] += 1
+        self.reg_histogram[reg * _BUCKETS + bucket] += 1
+        if not ok:
+            self.errors[op] += 1
+            self.reg_errors[reg] += 1
+
+    def retry(self, op: int, address: int):
+        """Un'operazione ripetuta perché la rilettura non ha confermato il valore."""
+        self.retries[op] += 1
+        self.reg_retries[op * REGISTERS + (address & 0xFF)] += 1
+
+    def reset(self):
+        for counters in (self.calls, self.bytes, self.errors, self.retries, self.total_ns,
+                         self.max_ns, self.histogram, self.reg_calls, self.reg_errors,
+                         self.reg_retries, self.reg_histogram):
+            counters[:] = _zeros(len(counters))
+
+    # --- Lettura ---
+
+    def buckets(self, op: int, address: int = None):
+        """Conteggi dell'istogramma (operazione intera, o un solo registro)."""
+        if address is None:
+            start = op * _BUCKETS
+            return list(self.histogram[start:start + _BUCKETS])
+        start = (op * REGISTERS + address) * _BUCKETS
+        return list(self.reg_histogram[start:start + _BUCKETS])
+
+    def percentile(self, op: int, q: float, address: int = None):
+        """Limite superiore (µs) del bucket che contiene il percentile `q` (None se vuoto, inf oltre l'ultimo)."""
+        counts = self.buckets(op, address)
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q / 100 * total
+        seen = 0
+        for i, count in enumerate(counts):
+            seen += count
+            if count and seen >= rank:
+                return LATENCY_BUCKETS_US[i] if i < len(LATENCY_BUCKETS_US) else float('inf')
+        return float('inf')
+
+    def as_dict(self) -> dict:
+        result = {"buckets_us": list(LATENCY_BUCKETS_US), "ops": {}, "registers": {}}
+        for op, name in enumerate(OPS):
+            calls = self.calls[op]
+            result["ops"][name] = {
+                "calls": calls,
+                "bytes": self.bytes[op],
+                "errors": self.errors[op],
+                "retries": self.retries[op],
+                "avg_us": round(self.total_ns[op] / calls / 1000, 1) if calls else None,
+                "max_us": round(self.max_ns[op] / 1000, 1),
+                "histogram": self.buckets(op),
+            }
+            for address in range(REGISTERS):
+                reg = op * REGISTERS + address
+                if not self.reg_calls[reg] and not self.reg_retries[reg]:
+                    continue
+                entry = result["registers"].setdefault(hex(address), {})
+                entry[name] = {
+                    "calls": self.reg_calls[reg],
+                    "errors": self.reg_errors[reg],
+                    "retries": self.reg_retries[reg],
+                    "p99_us": self.percentile(op, 99, address),
+                }
+        return result
+
+
+def format_report(stats: dict, top: int = 10) -> str:
+    """Testo leggibile da un dict di `ECStats.as_dict()` (anche ricevuto dal daemon)."""
+    bounds = [f"≤{b}" for b in stats["buckets_us"]] + [f">{stats['buckets_us'][-1]}"]
+    lines = ["[EC] Statistiche transazioni (latenze in µs)"]
+    for name, op in stats["ops"].items():
+        lines.append(f"  {name:<5} chiamate {op['calls']}, byte {op['bytes']}, errori {op['errors']}, "
+                     f"ripetizioni {op['retries']}, media {op['avg_us']}, max {op['max_us']}")
+        histogram = ", ".join(f"{b}: {n}" for b, n in zip(bounds, op["histogram"]) if n)
+        if histogram:
+            lines.append(f"        {histogram}")
+
+    registers = sorted(stats["registers"].items(),
+                       key=lambda item: -sum(op["calls"] for op in item[1].values()))
+    if registers:
+        lines.append(f"  Registri più usati (primi {top}):")
+    for address, ops in registers[:top]:
+        detail = "; ".join(f"{name} {op['calls']} (errori {op['errors']}, ripetizioni {op['retries']}, "
+                           f"p99 ≤{op['p99_us']})" for name, op in ops.items())
+        lines.append(f"    {address:<5} {detail}")
+    return "\n".join(lines)
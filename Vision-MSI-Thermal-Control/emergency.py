@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Emergenza termica
+Created by Sunray_Vision
+Thread di guardia indipendente dal loop del daemon: Cooler Booster entro pochi decimi di secondo oltre la soglia critica
+"""
+
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+import config
+
+# Limiti (secondi) dell'istogramma della latenza di reazione.
+LATENCY_BUCKETS = (0.05, 0.1, 0.15, 0.2, 0.3, 0.5, 1.0)
+
+
+class EmergencyWatchdog:
+    """
+    Legge solo i registri di temperatura (un byte ciascuno) ogni `interval` secondi, su un
+    handle EC proprio: una sonda batteria lenta, un client o il thread EC del daemon non
+    possono ritardarlo. Oltre `threshold` °C attiva il Cooler Booster; lo spegne quando
+    tutte le temperature restano sotto `threshold - hysteresis` per `release_time` secondi,
+    riscrivendo il valore che il registro aveva prima (o quello che il daemon vi ha scritto
+    o gli ha passato con `hand_over` nel frattempo).
+
+    La latenza di reazione misurata va dall'ultima lettura sotto soglia alla conferma della
+    scrittura: è un limite superiore del tempo tra il superamento reale e il Cooler Booster.
+    `on_change(engaged, restore)` viene chiamata dal thread di guardia.
+    """
+
+    def __init__(self, device, on_change=None, threshold: float = config.EMERGENCY_TEMP,
+                 hysteresis: float = config.EMERGENCY_HYSTERESIS,
+                 interval: float = config.EMERGENCY_POLL_INTERVAL,
+                 release_time: float = config.EMERGENCY_RELEASE_TIME, clock=time.monotonic):
+        self.device = device
+        self.on_change = on_change
+        self.threshold = threshold
+        self.hysteresis = hysteresis
+        self.interval = interval
+        self.release_time = release_time
+        self.clock = clock
+        self.thread = None
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()  # engaged e restore: letti e scritti anche dal loop del daemon
+
+        self.engaged = False
+        self.restore = None        # valore del registro Cooler Booster da ripristinare
+        self.last_below = None     # istante dell'ultima lettura sotto soglia
+        self.release_since = None  # da quando le temperature sono sotto la soglia di rilascio
+        self.hottest = None
+
+        self.engagements = 0
+        self.errors = 0
+        self.latency_counts = array('Q', [0]) * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.latency_last = None
+
+    # --- Thread ---
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="emergency", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Ferma il thread. Il registro resta com'è: all'arresto il daemon riscrive il profilo Auto."""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.device.close()
+
+    def _run(self):
+        try:
+            # Priorità realtime minima (solo root): il thread si sveglia in orario anche
+            # con la CPU satura, proprio quando serve. Dorme quasi sempre, non affama nessuno.
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(1))
+        except (OSError, AttributeError):
+            pass
+        while not self.stopped.wait(self.interval):
+            self.tick()
+
+    # --- Controllo ---
+
+    def _read(self, addr: int):
+        return self.device.read_bytes(addr, 1)[0]
+
+    def _write(self, addr: int, value: int):
+        self.device.write_bytes(addr, bytes([value]))
+
+    def tick(self):
+        """Una lettura delle temperature; ritorna True se lo stato (attivo/non attivo) è cambiato."""
+        now = self.clock()
+        try:
+            self.hottest = max(self._read(addr) for addr in config.EC_TEMP_ADDRESSES)
+            if not self.engaged:
+                if self.hottest < self.threshold:
+                    self.last_below = now
+                    return False
+                self._engage(now)
+                return True
+            if self._hold():
+                return False
+            self._release()
+            return True
+        except OSError:
+            self.errors += 1
+            self.device.close()  # handle proprio: si riapre alla prossima lettura
+            return False
+
+    def hand_over(self, value: int) -> bool:
+        """
+        Il daemon vuole scrivere `value` nel registro Cooler Booster. Con l'emergenza attiva
+        il registro resta acceso, `value` diventa il valore da ripristinare al rilascio e
+        ritorna True: il daemon non deve scriverlo. Altrimenti ritorna False.
+        """
+        with self.lock:
+            if not self.engaged:
+                return False
+            self.restore = value
+            return True
+
+    def _engage(self, now: float):
+        with self.lock:
+            self.restore = self._read(config.EC_COOLER_BOOSTER_CONTROL_ADDR)
+            self._write(config.EC_COOLER_BOOSTER_CONTROL_ADDR, config.EC_COOLER_BOOSTER_ON_VALUE)
+            self.engaged = True
+        self.release_since = None
+        self.engagements += 1
+        self._observe_latency(self.clock() - (self.last_below if self.last_below is not None else now))
+        if self.on_change is not None:
+            self.on_change(True, self.restore)
+
+    def _hold(self) -> bool:
+        """Con l'emergenza attiva: True finché il Cooler Booster deve restare acceso."""
+        # Un cambio di profilo del daemon può aver spento il Cooler Booster: quel valore
+        # diventa quello da ripristinare e il Cooler Booster viene riacceso.
+        with self.lock:
+            current = self._read(config.EC_COOLER_BOOSTER_CONTROL_ADDR)
+            if current != config.EC_COOLER_BOOSTER_ON_VALUE:
+                self.restore = current
+                self._write(config.EC_COOLER_BOOSTER_CONTROL_ADDR, config.EC_COOLER_BOOSTER_ON_VALUE)
+        if self.hottest >= self.threshold - self.hysteresis:
+            self.release_since = None
+            return True
+        now = self.clock()
+        if self.release_since is None:
+            self.release_since = now
+        return now - self.release_since < self.release_time
+
+    def _release(self):
+        with self.lock:
+            self._write(config.EC_COOLER_BOOSTER_CONTROL_ADDR, self.restore)
+            self.engaged = False
+        self.last_below = self.clock()
+        if self.on_change is not None:
+            self.on_change(False, self.restore)
+
+    def _observe_latency(self, latency: float):
+        self.latency_counts[bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.latency_last = latency
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Controllo ventole software
+Created by Sunray_Vision
+Regolatore a ciclo chiuso: temperature EC -> velocità ventole con isteresi e PID
+"""
+
+import time
+
+import config
+from curves import compile_curve
+from thermal_model import ThermalModel
+
+
+class FanPID:
+    """
+    Regolatore PID per una singola ventola con banda di isteresi.
+    L'uscita è un valore 0-150 come quelli dei punti della curva EC.
+    """
+
+    def __init__(self, target: float, hysteresis: float, kp: float, ki: float, kd: float,
+                 min_speed: int, max_speed: int):
+        self.target = target
+        self.hysteresis = hysteresis
+        self.kp, self.ki, self.kd = kp, ki, kd
+        self.min_speed = min_speed
+        self.max_speed = max_speed
+        self.integral = 0.0
+        self.last_error = None
+        self.output = min_speed
+
+    def update(self, temp: float, dt: float) -> int:
+        error = temp - self.target
+
+        # Dentro la banda di isteresi la velocità resta invariata: niente pendolamenti.
+        if abs(error) <= self.hysteresis and self.last_error is not None:
+            self.last_error = error
+            return self.output
+
+        derivative = 0.0
+        if self.last_error is not None and dt > 0:
+            derivative = (error - self.last_error) / dt
+        self.last_error = error
+
+        # Anti-windup: l'integrale viene limitato in modo che da solo copra al più il range.
+        if self.ki:
+            limit = (self.max_speed - self.min_speed) / self.ki
+            self.integral = max(-limit, min(limit, self.integral + error * dt))
+
+        raw = self.min_speed + self.kp * error + self.ki * self.integral + self.kd * derivative
+        self.output = int(max(self.min_speed, min(self.max_speed, round(raw))))
+        return self.output
+
+
+class FanController:
+    """
+    Controllo ventole a ciclo chiuso. Ad ogni tick riceve le temperature [CPU, GPU],
+    calcola la velocità con FanPID (o dalla tabella di una curva compilata, vedi curves.py)
+    e scrive i 7 punti della curva di ogni ventola allo stesso valore, così il firmware
+    usa quella velocità a qualsiasi soglia.
+    Le scritture sono limitate a una ogni `min_write_interval` secondi e, grazie a
+    ECDevice.apply, toccano solo i byte cambiati.
+    In modalità predittiva il PID riceve la temperatura prevista tra `horizon` secondi
+    se supera quella attuale (vedi thermal_model.py).
+    """
+
+    def __init__(self, device, clock=time.monotonic, predictive: bool = config.FAN_CONTROL_PREDICTIVE,
+                 horizon: float = config.FAN_CONTROL_HORIZON, curves=config.FAN_CONTROL_CURVES):
+        self.device = device
+        # Con FAN_CONTROL_CURVES la velocità viene dalla tabella compilata invece che dal PID.
+        self.curves = [compile_curve(curve) for curve in curves] if curves is not None else None
+        self.clock = clock
+        self.horizon = horizon
+        self.models = [ThermalModel(), ThermalModel()] if predictive else None
+        self.predicted = None
+        kp, ki, kd = config.FAN_CONTROL_PID
+        self.pids = [
+            FanPID(target, config.FAN_CONTROL_HYSTERESIS, kp, ki, kd,
+                   config.FAN_CONTROL_MIN_SPEED, config.FAN_CONTROL_MAX_SPEED)
+            for target in config.FAN_CONTROL_TARGET_TEMPS
+        ]
+        self.min_write_interval = config.FAN_CONTROL_MIN_WRITE_INTERVAL
+        self.applied = None
+        self.last_update = None
+        self.last_write = None
+
+    def mode_registers(self):
+        """Modalità Advanced (curva personalizzata) con Cooler Booster spento."""
+        return {
+            config.EC_COOLER_BOOSTER_CONTROL_ADDR: config.EC_COOLER_BOOSTER_OFF_VALUE,
+            config.EC_AUTO_ADV_CONTROL_ADDR: config.EC_ADVANCED_VALUE,
+        }
+
+    def owned_addresses(self):
+        """Registri che il controller gestisce da solo: modalità Auto/Advanced e curve."""
+        return {config.EC_AUTO_ADV_CONTROL_ADDR}.union(*config.EC_FAN_CURVE_ADDRESSES)
+
+    def enable(self):
+        """Porta l'EC in modalità Advanced, necessaria perché il firmware usi le curve scritte."""
+        return self.device.apply(self.mode_registers())
+
+    def registers(self, speeds):
+        """Stato EC {indirizzo: valore} per le velocità [CPU, GPU]."""
+        return {addr: speeds[fan]
+                for fan in range(2)
+                for addr in config.EC_FAN_CURVE_ADDRESSES[fan]}
+
+    def control_temps(self, now, temps, rpms, load):
+        """Temperature date al PID: quelle lette, o le previste se più alte."""
+        if self.models is None:
+            return temps
+        self.predicted = []
+        for fan, (model, temp) in enumerate(zip(self.models, temps)):
+            model.observe(now, temp, load, rpms[fan] if rpms else None)
+            self.predicted.append(model.predict(self.horizon))
+        return [max(temp, predicted) for temp, predicted in zip(temps, self.predicted)]
+
+    def update(self, temps, rpms=None, load=None):
+        """
+        Esegue un passo di controllo. Ritorna il WriteReport se ha scritto nell'EC,
+        altrimenti None (nessun cambiamento o scrittura rimandata dal rate limit).
+        `rpms` [CPU, GPU] e `load` (0-1) servono solo al modello predittivo.
+        """
+        now = self.clock()
+        dt = now - self.last_update if self.last_update is not None else 0.0
+        self.last_update = now
+
+        targets = self.control_temps(now, temps, rpms, load)
+        if self.curves is not None:
+            speeds = [curve.lookup(temp) for curve, temp in zip(self.curves, targets)]
+        else:
+            speeds = [pid.update(temp, dt) for pid, temp in zip(self.pids, targets)]
+        if speeds == self.applied:
+            return None
+        if self.last_write is not None and now - self.last_write < self.min_write_interval:
+            return None
+
+        report = self.device.apply(self.registers(speeds))
+        self.last_write = now
+        if report.ok:
+            self.applied = speeds
+        return report
@@ -6,187 +6,718 @@ Created by Sunray_Vision
 Reverse engineering of MSI Modern 15H AI C1MGT-096IT EC for Linux thermal management
 """
 
-import time
-import os
-import subprocess
+import argparse
+import asyncio
+import signal
 import sys
-import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-# Assicura che config.py venga trovato
-sys.path.append("/home/vincent/Vision-MSI-Thermal-Control")
 import config
-
-EC_IO_FILE = '/sys/kernel/debug/ec/ec0/io'
-SYSFS_BATTERY_CAPACITY = "/sys/class/power_supply/BAT1/capacity"
+from ec import EC_PAGE_SIZE, get_device
+from battery import get_monitor
+from charge_threshold import ThresholdSequence
+from commands import CommandQueue
+from cpu_load import CpuLoad
+from cpu_sensors import CpuSensors, fuse
+from drift import DriftMonitor, suspended_time
+from emergency import EmergencyWatchdog
+from ec_stats import format_report
+from fan_control import FanController
+from history import History
+from load_profile import LoadProfileScheduler, LoadSampler
+from ipc import TelemetryServer, connect
+from metrics import MetricsExporter
+from profiles import PROFILE_NAMES, profile_registers
+from recorder import TraceRecorder
+from scheduler import AdaptiveSchedule, Scheduler
+from state import StateWatcher, load_state, save_state
+from telemetry import TelemetryStore, format_summary
 
 # ----------------------------
-# Funzioni lettura/scrittura EC
+#   Applica FAN PROFILE
 # ----------------------------
 
-def write_ec(byte_address: int, value: int):
-    try:
-        with open(EC_IO_FILE, 'r+b') as f:
-            f.seek(byte_address)
-            f.write(bytes([value]))
-        return True
-    except Exception as e:
-        print(f"[ERRORE] write_ec({hex(byte_address)}, {value}): {e}")
-        return False
-
-def read_ec(byte_address: int, size: int = 1):
-    try:
-        with open(EC_IO_FILE, 'rb') as f:
-            f.seek(byte_address)
-            data = f.read(size)
-        return int.from_bytes(data, 'big')
-    except Exception as e:
-        print(f"[ERRORE] read_ec({hex(byte_address)}): {e}")
-        return 0
+def apply_fan_profile(profile_id, basic_offset=None, registers=None):
+    """`registers`: quelli del profilo già calcolati (vedi Daemon.profile_target), altrimenti tutti."""
+    if registers is None:
+        registers = profile_registers(profile_id, basic_offset)
+    if registers is None:
+        print(f"[DAEMON] Profilo ventole non valido: {profile_id}")
+        return None
+
+    report = get_device().apply(registers)
+    if not report.ok:
+        print(f"[ERRORE] Profilo ventole {profile_id} applicato solo in parte")
+    elif not report.changed:
+        print(f"[DAEMON] Profilo ventole {profile_id} già attivo, nessuna scrittura")
+    else:
+        print(f"[DAEMON] Profilo ventole applicato: {profile_id} "
+              f"({len(report.changed)} registri, {report.transactions} scritture EC)")
+    return report
 
 # ----------------------------
-#   Applica FAN PROFILE
+#   Lettura batteria
 # ----------------------------
 
-def apply_fan_profile(profile_id):
-    if profile_id != 4:
-        write_ec(config.EC_COOLER_BOOSTER_CONTROL_ADDR, config.EC_COOLER_BOOSTER_OFF_VALUE)
-
-    if profile_id == 1:
-        curve = config.AUTO_FAN_CURVE
-        write_ec(config.EC_AUTO_ADV_CONTROL_ADDR, config.EC_AUTO_VALUE)
+def monitor_battery():
+    """Monitora la batteria - SOLO LETTURA, NO SCRITTURA"""
+    monitor = get_monitor()
+    previous = monitor.capacity
+    capacity = monitor.read_capacity()
 
-    elif profile_id == 2:
-        write_ec(config.EC_AUTO_ADV_CONTROL_ADDR, config.EC_AUTO_VALUE)
-        curve = [
-            [min(150, max(0, v + config.BASIC_FAN_OFFSET)) for v in config.AUTO_FAN_CURVE[0]],
-            [min(150, max(0, v + config.BASIC_FAN_OFFSET)) for v in config.AUTO_FAN_CURVE[1]],
-        ]
+    # SOLO LOGGING, e solo quando il livello cambia - non scrivere in sysfs che è readonly!
+    if capacity > 0 and capacity != previous:
+        print(f"[DAEMON] Livello batteria rilevato: {capacity}%")
+    elif capacity == 0:
+        print(f"[DAEMON] Batteria: lettura fallita")
 
-    elif profile_id == 3:
-        write_ec(config.EC_AUTO_ADV_CONTROL_ADDR, config.EC_ADVANCED_VALUE)
-        curve = config.ADVANCED_FAN_CURVE
+    return capacity
 
-    elif profile_id == 4:
-        write_ec(config.EC_COOLER_BOOSTER_CONTROL_ADDR, config.EC_COOLER_BOOSTER_ON_VALUE)
-        print("[DAEMON] Cooler Booster attivato.")
-        return
+# ----------------------------
+#   Comandi dai client
+# ----------------------------
 
-    for i in range(2):
-        for j in range(7):
-            addr = config.EC_FAN_CURVE_ADDRESSES[i][j]
-            val = curve[i][j]
-            write_ec(addr, val)
+def profile_transaction(profile_id, basic_offset=None, registers=None):
+    """Applica un profilo richiesto da un client e verifica i registri rileggendoli."""
+    if registers is None:
+        registers = profile_registers(profile_id, basic_offset)
+    report = apply_fan_profile(profile_id, basic_offset, registers)
+    mismatched = get_device().verify(registers) if registers is not None else []
+    return {
+        "ok": report is not None and report.ok and not mismatched,
+        "changed": len(report.changed) if report is not None else 0,
+        "mismatched": [hex(addr) for addr in mismatched],
+    }
 
-    print(f"[DAEMON] Profilo ventole applicato: {profile_id}")
+def report_battery_threshold(job):
+    """Stampa l'esito di una sequenza soglia terminata e lo ritorna nel formato delle conferme."""
+    result = job.result()
+    if result["ok"]:
+        print(f"[DAEMON] Soglia batteria impostata correttamente: {job.threshold}%"
+              + (f" ({job.retries} nuovi tentativi)" if job.retries else ""))
+    else:
+        print(f"[ERRORE] Soglia batteria {job.threshold}% non applicata: {result['error']}")
+    return result
 
 # ----------------------------
-#   Applica soglia batteria
+#   Core asincrono
 # ----------------------------
 
-def apply_battery_threshold(threshold):
-    write_ec(config.EC_BATTERY_THRESHOLD_ADDR, threshold + 128)
-    time.sleep(1)
-    write_ec(config.EC_BATTERY_THRESHOLD_ADDR, 128 + 100)
-    time.sleep(1)
-    write_ec(config.EC_BATTERY_THRESHOLD_ADDR, threshold + 128)
-    print(f"[DAEMON] Soglia batteria impostata correttamente: {threshold}%")
+# Senza inotify il file di stato viene controllato ogni STATE_POLL_INTERVAL secondi.
+STATE_POLL_INTERVAL = 2.0
 
-# ----------------------------
-#   Lettura INTELLIGENTE batteria (3 METODI)
-# ----------------------------
+# Ogni quanto si controlla se il sistema è appena uscito dalla sospensione (nessuna lettura EC).
+RESUME_POLL_INTERVAL = 2.0
 
-def get_battery_capacity_smart():
-    """Legge la batteria da multiple fonti e sceglie la migliore"""
-    try:
-        # Metodo 1: Sysfs (PIÙ AFFIDABILE - lo preferiamo)
+class Daemon:
+    """
+    Daemon su un loop asyncio: lettura sensori, batteria, file di stato e client sono
+    task indipendenti. L'I/O bloccante gira fuori dal loop: l'EC in un solo thread
+    (il driver ec_sys serve una transazione alla volta e un errore chiude il descrittore
+    condiviso), sysfs, acpi e file di stato in un pool separato, così una sonda batteria
+    lenta non ritarda mai la lettura delle temperature.
+    Tutti i tempi vengono da `clock`, così replay.py può eseguirlo su un orologio virtuale;
+    con `recorder` (vedi recorder.py) registra gli ingressi e le scritture EC in una traccia.
+    """
+
+    def __init__(self, clock=time.monotonic, recorder=None):
+        self.clock = clock
+        self.recorder = recorder
+        # Preferenze correnti dal file di stato (config.py fornisce solo i valori iniziali).
+        self.prefs = load_state()
+        self.watcher = StateWatcher()
+        self.device = get_device()
+        self.battery = get_monitor()
+        self.cpu_load = CpuLoad()
+        self.cpu_sensors = CpuSensors()  # descrittori hwmon aperti una volta sola
+        self.load_sampler = LoadSampler(clock=clock) if config.LOAD_PROFILE_SCHEDULER else None
+        self.load_profiles = None
+        self.scheduled_profile = None  # profilo scelto dal carico; prefs["fan_profile"] resta quello dell'utente
+        self.drift = DriftMonitor(self.device)
+        self.telemetry = TelemetryStore()
+        self.commands = CommandQueue(clock=clock)
+        self.handlers = {
+            "profile": self.handle_profile,
+            "battery_threshold": self.handle_battery_threshold,
+        }
+        self.ec_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ec")
+        self.io_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="io")
+        # La batteria viene letta nel pool io, ma il suo indirizzo EC di riserva passa dal thread EC.
+        self.battery.ec_executor = self.ec_pool
+        self.battery_schedule = AdaptiveSchedule(*config.BATTERY_POLL)
+        self.controller = None
+        self.watchdog = None
+        self.server = None
+        self.exporter = None
+        self.history = None
+        self.loop = None
+        self.stopping = None
+        self.commands_ready = None
+        self.tasks = []
+        self.threshold_task = None
+        self.threshold_from_client = False
+
+    # --- Esecuzione nei thread ---
+
+    def ec(self, func, *args):
+        """Esegue `func(*args)` nel thread dell'EC (awaitable)."""
+        return self.loop.run_in_executor(self.ec_pool, func, *args)
+
+    def io(self, func, *args):
+        """Esegue `func(*args)` nel pool per sysfs, acpi e file di stato (awaitable)."""
+        return self.loop.run_in_executor(self.io_pool, func, *args)
+
+    async def wait_readable(self, fd):
+        future = self.loop.create_future()
+        self.loop.add_reader(fd, lambda: future.done() or future.set_result(None))
         try:
-            with open("/sys/class/power_supply/BAT1/capacity", "r") as f:
-                sysfs_value = int(f.read().strip())
-                if 1 <= sysfs_value <= 100:
-                    print(f"[BATTERY] Lettura da sysfs: {sysfs_value}%")
-                    return sysfs_value
-                else:
-                    print(f"[BATTERY] Sysfs valore non valido: {sysfs_value}%")
+            await future
+        finally:
+            self.loop.remove_reader(fd)
+
+    def spawn(self, coro):
+        """Avvia un task di lunga durata: se termina con un errore il daemon si ferma."""
+        task = self.loop.create_task(coro)
+
+        def done(task):
+            if not task.cancelled() and task.exception() is not None:
+                print(f"[ERRORE] Task interrotto: {task.exception()!r}")
+                self.stopping.set()
+        task.add_done_callback(done)
+        self.tasks.append(task)
+        return task
+
+    # --- Telemetria e stato ---
+
+    def record(self, kind, **fields):
+        """Aggiunge un evento alla traccia, se la registrazione è attiva."""
+        if self.recorder is not None:
+            self.recorder.event(kind, **fields)
+
+    def publish(self):
+        now = time.time()
+        if self.server is not None:
+            self.server.publish(dict(ts=now, **self.telemetry.latest))
+        if self.exporter is not None:
+            self.exporter.invalidate(now)
+        if self.history is not None:
+            self.history.append(now, self.telemetry.latest)
+
+    async def persist(self, updates):
+        """Salva le preferenze applicate; il watcher non le riapplicherà."""
+        # Riconosciute prima della scrittura: l'evento inotify può arrivare prima del ritorno.
+        self.watcher.acknowledge(dict(self.watcher.current, **updates))
+        try:
+            self.watcher.acknowledge(await self.io(save_state, updates))
+        except OSError as e:
+            print(f"[ERRORE] Impossibile salvare lo stato in {config.STATE_FILE}: {e}")
+
+    # --- Comandi dai client ---
+
+    def complete(self, cmd, result):
+        self.commands.complete(cmd, result)
+        self.commands_ready.set()  # Un comando dello stesso tipo in coda può ora partire.
+
+    def on_message(self, client, message):
+        request_id = message.get("id")
+        if message.get("cmd") == "stats":
+            # Sola lettura: le statistiche EC sono disponibili anche ai client non root.
+            self.server.send(client, {"ack": request_id, "ok": True, "stats": self.device.stats.as_dict(),
+                                      "telemetry": self.telemetry.summary()})
+            return
+        if client.uid != 0:
+            # cmd e value come nelle altre conferme: il client sa quale scelta annullare.
+            self.server.send(client, {"ack": request_id, "ok": False, "cmd": message.get("cmd"),
+                                      "value": message.get("value"), "error": "permesso negato"})
+            return
+        print(f"[DAEMON] Richiesta {message.get('cmd')}={message.get('value')} (id {request_id})")
+        self.record("command", cmd=message.get("cmd"), value=message.get("value"))
+        self.commands.submit(message.get("cmd"), message.get("value"),
+                             lambda result: self.server.send(client, dict(result, ack=request_id)))
+        self.commands_ready.set()
+
+    def handle_profile(self, profile_id):
+        self.loop.create_task(self.profile_command(profile_id))
+        return None  # L'esito arriva con complete() a transazione terminata.
+
+    @property
+    def active_profile(self):
+        """Profilo applicato all'EC: quello scelto dal carico, se presente, altrimenti quello dell'utente."""
+        return self.scheduled_profile if self.scheduled_profile is not None else self.prefs["fan_profile"]
+
+    def profile_target(self, profile_id, basic_offset):
+        """
+        Registri da scrivere per il profilo (None se non valido). Con il controllo ventole
+        software attivo, modalità Auto/Advanced e curve restano al controller (il profilo
+        decide solo il Cooler Booster). Con l'emergenza termica attiva il Cooler Booster resta
+        alla guardia: il valore del profilo le viene passato come quello da ripristinare.
+        I registri esclusi non vengono né scritti né aggiunti alla verifica di deriva.
+        """
+        registers = profile_registers(profile_id, basic_offset)
+        if registers is not None and self.controller is not None:
+            owned = self.controller.owned_addresses()
+            registers = {addr: value for addr, value in registers.items() if addr not in owned}
+        if registers is not None and self.watchdog is not None:
+            cooler_booster = config.EC_COOLER_BOOSTER_CONTROL_ADDR
+            if self.watchdog.hand_over(registers[cooler_booster]):
+                registers = {addr: value for addr, value in registers.items() if addr != cooler_booster}
+        return registers
+
+    async def profile_command(self, profile_id):
+        registers = self.profile_target(profile_id, self.prefs["basic_fan_offset"])
+        try:
+            result = await self.ec(profile_transaction, profile_id, self.prefs["basic_fan_offset"], registers)
         except Exception as e:
-            print(f"[BATTERY] Sysfs fallito: {e}")
-
-        # Metodo 2: EC con indirizzi prioritari
-        ec_addresses = [0xbf, 0xe2, 0xd7, 0xef, 0x68, 0x80]
-        valid_ec_readings = []
-        
-        for addr in ec_addresses:
-            value = read_ec(addr, 1)
-            if 1 <= value <= 100:
-                print(f"[BATTERY] Trovato all'indirizzo {hex(addr)}: {value}%")
-                valid_ec_readings.append((addr, value))
-        
-        # Se abbiamo letture EC valide, scegliamo la più plausibile
-        if valid_ec_readings:
-            # Preferiamo valori NON 100% (potrebbero essere fissi)
-            non_100_values = [(addr, val) for addr, val in valid_ec_readings if val < 95]
-            if non_100_values:
-                best_addr, best_value = non_100_values[0]
-                print(f"[BATTERY] Scelto {hex(best_addr)}: {best_value}% (non-100)")
-                return best_value
-            else:
-                # Se tutti sono 100%, prendi il primo
-                best_addr, best_value = valid_ec_readings[0]
-                print(f"[BATTERY] Scelto {hex(best_addr)}: {best_value}% (tutti 100%)")
-                return best_value
+            result = {"ok": False, "error": str(e)}
+        if result["ok"]:
+            self.drift.update(registers)
+            self.prefs["fan_profile"] = profile_id
+            self.scheduled_profile = None
+            if self.load_profiles is not None:
+                self.load_profiles.override(profile_id, self.clock())
+            await self.persist({"fan_profile": profile_id})
+            self.telemetry.record(profile=profile_id)
+            self.publish()
+        self.complete("profile", result)
 
-        # Metodo 3: Lettura raw da /proc (fallback estremo)
+    def handle_battery_threshold(self, threshold):
+        self.start_battery_threshold(threshold, from_client=True)
+        return None
+
+    def start_battery_threshold(self, threshold, from_client):
+        """Avvia la sequenza soglia (vedi charge_threshold.py), sostituendo quella in corso."""
+        if self.threshold_task is not None and not self.threshold_task.done():
+            self.threshold_task.cancel()
+            if self.threshold_from_client:
+                self.complete("battery_threshold",
+                              {"ok": False, "error": "sostituita da una modifica del file di stato"})
+        self.threshold_from_client = from_client
+        self.drift.discard([config.EC_BATTERY_THRESHOLD_ADDR])  # cambia di proposito durante la sequenza
+        self.threshold_task = self.loop.create_task(
+            self.run_battery_threshold(ThresholdSequence(threshold, device=self.device, clock=self.clock),
+                                       from_client))
+
+    async def run_battery_threshold(self, job, from_client):
+        # Le pause tra i passi sono attese asyncio: intanto gli altri task continuano.
         try:
-            result = subprocess.run(["acpi", "-b"], capture_output=True, text=True)
-            if result.returncode == 0:
-                # Esempio output: "Battery 0: Charging, 45%, 01:23:45 until charged"
-                match = re.search(r'(\d+)%', result.stdout)
-                if match:
-                    acpi_value = int(match.group(1))
-                    print(f"[BATTERY] Lettura da acpi: {acpi_value}%")
-                    return acpi_value
+            while not await self.ec(job.poll):
+                await asyncio.sleep(job.time_to_next())
+            result = report_battery_threshold(job)
+            if result["ok"]:
+                self.drift.update({config.EC_BATTERY_THRESHOLD_ADDR: job.threshold + 128})
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            print(f"[BATTERY] ACPI fallito: {e}")
+            result = {"ok": False, "error": str(e)}
+        if from_client:
+            if result["ok"]:
+                self.prefs["battery_threshold"] = job.threshold
+                await self.persist({"battery_threshold": job.threshold})
+            self.complete("battery_threshold", result)
 
-        # Se TUTTO fallisce
-        print("[BATTERY] ERRORE: Impossibile determinare livello batteria")
-        return 0
-        
-    except Exception as e:
-        print(f"[BATTERY] ERRORE critico: {e}")
-        return 0
+    async def run_commands(self):
+        """Richieste dei client: di ogni raffica viene applicata solo l'ultima."""
+        while True:
+            delay = self.commands.time_to_next()
+            try:
+                await asyncio.wait_for(self.commands_ready.wait(),
+                                       None if delay == float('inf') else delay)
+            except asyncio.TimeoutError:
+                pass
+            self.commands_ready.clear()
+            self.commands.run_due(self.handlers)
 
-def monitor_battery():
-    """Monitora la batteria - SOLO LETTURA, NO SCRITTURA"""
-    capacity = get_battery_capacity_smart()
-    
-    # SOLO LOGGING - non scrivere in sysfs che è readonly!
-    if capacity > 0:
-        print(f"[DAEMON] Livello batteria rilevato: {capacity}%")
-    else:
-        print(f"[DAEMON] Batteria: lettura fallita")
-    
-    return capacity
+    # --- Sensori ---
 
-# ----------------------------
-#   Loop principale
-# ----------------------------
+    async def sample_sensors(self):
+        """Temperature e RPM: il daemon è l'unico lettore dell'EC e li pubblica ai client."""
+        scheduler = Scheduler(clock=self.clock)
+        scheduler.add("temps", AdaptiveSchedule(*config.TEMP_POLL))
+        scheduler.add("rpm", AdaptiveSchedule(*config.RPM_POLL))
+        while True:
+            await asyncio.sleep(scheduler.time_to_next())
+            sampled = False
+            for name in scheduler.due():
+                if name == "temps":
+                    # Sensori hwmon nel pool I/O mentre il thread EC legge le temperature.
+                    cpu_read = self.io(self.cpu_sensors.read) if self.cpu_sensors else None
+                    snap = await self.ec(self.device.read_registers, config.EC_TEMP_ADDRESSES)
+                    cpu = await cpu_read if cpu_read is not None else None
+                    if snap is None:
+                        scheduler.postpone("temps")
+                        continue
+                    temps = snap.temps()
+                    self.record("cpu_temps", value=None if cpu is None else list(cpu))
+                    # Il controllo segue il core più caldo (vedi CPU_TEMP_SOURCE), mai meno dell'EC.
+                    control = [fuse(temps[0], cpu), temps[1]]
+                    load = self.cpu_load.read()
+                    self.record("load", value=load)
+                    scheduler.observe("temps", max(control))
+                    self.telemetry.record(cpu_temp=temps[0], gpu_temp=temps[1],
+                                          cpu_load=None if load is None else round(load * 100),
+                                          cpu_core_temp=None if cpu is None or cpu.hottest is None
+                                          else round(cpu.hottest))
+                    sampled = True
+                    if self.controller is not None:
+                        rpms = [self.telemetry.latest.get("cpu_rpm"), self.telemetry.latest.get("gpu_rpm")]
+                        report = await self.ec(self.controller.update, control, rpms, load)
+                        if report is not None and report.ok:
+                            self.drift.update(self.controller.registers(self.controller.applied))
+                        if report is not None and report.changed:
+                            print(f"[DAEMON] Velocità ventole {self.controller.applied} "
+                                  f"(CPU {control[0]:.0f}°C, GPU {control[1]}°C)")
 
-def main():
-    print("[DAEMON] Avviato. Controllo ventole e batteria attivi.")
+                elif name == "rpm":
+                    snap = await self.ec(self.device.read_registers, config.EC_RPM_ADDRESSES, 2)
+                    if snap is None:
+                        scheduler.postpone("rpm")
+                        continue
+                    rpms = snap.rpms()
+                    scheduler.observe("rpm", max(rpms))
+                    self.telemetry.record(cpu_rpm=rpms[0], gpu_rpm=rpms[1])
+                    sampled = True
+            if sampled:
+                self.publish()
+
+    # --- Profilo dal carico ---
+
+    async def schedule_profiles(self):
+        """
+        Ogni LOAD_PROFILE_INTERVAL secondi classifica carico e pressione CPU (vedi
+        load_profile.py) e applica un profilo solo quando la classe cambia. Il profilo
+        scelto non viene salvato nel file di stato né in prefs: lì resta la scelta dell'utente.
+        Lo scheduler considera attivo il profilo solo dopo una transazione riuscita.
+        """
+        while True:
+            await asyncio.sleep(config.LOAD_PROFILE_INTERVAL)
+            load, pressure = self.load_sampler.read()
+            self.record("load_profile", value=[load, pressure])
+            profile_id = self.load_profiles.observe(self.clock(), load, pressure)
+            if profile_id is None:
+                continue
+            if profile_id == self.active_profile:
+                self.load_profiles.override(profile_id, self.clock())
+                continue
+            print(f"[DAEMON] Carico CPU {'-' if load is None else f'{load:.0%}'}, pressione "
+                  f"{'-' if pressure is None else f'{pressure:.0%}'}: profilo {PROFILE_NAMES[profile_id - 1]}")
+            # Con l'emergenza termica attiva il Cooler Booster resta alla guardia (vedi profile_target).
+            registers = self.profile_target(profile_id, self.prefs["basic_fan_offset"])
+            result = await self.ec(profile_transaction, profile_id, self.prefs["basic_fan_offset"], registers)
+            if not result["ok"]:
+                print(f"[ERRORE] Profilo {PROFILE_NAMES[profile_id - 1]} applicato solo in parte: "
+                      f"registri {result['mismatched']}")
+                continue
+            self.drift.update(registers)
+            self.load_profiles.override(profile_id, self.clock())
+            self.scheduled_profile = profile_id
+            self.telemetry.record(profile=profile_id)
+            self.publish()
+
+    # --- Verifica registri ---
+
+    async def verify_registers(self):
+        """
+        Ogni DRIFT_CHECK_INTERVAL secondi (subito dopo un resume) verifica che l'EC abbia
+        ancora profilo, curve e soglia scritti dal daemon e ripristina solo i byte cambiati.
+        """
+        last_check = self.clock()
+        suspended = suspended_time()
+        while True:
+            await asyncio.sleep(RESUME_POLL_INTERVAL)
+            previous, suspended = suspended, suspended_time()
+            resumed = suspended - previous > 1.0
+            if resumed:
+                print(f"[DAEMON] Ripresa dalla sospensione ({suspended - previous:.0f}s): verifica dei registri EC.")
+            elif self.clock() - last_check < config.DRIFT_CHECK_INTERVAL:
+                continue
+            last_check = self.clock()
+            drifted = await self.ec(self.drift.check)
+            if drifted:
+                print(f"[DAEMON] Deriva EC: {len(drifted)} registri ripristinati "
+                      f"({', '.join(hex(addr) for addr in drifted)}); eventi totali {self.drift.events}, "
+                      f"registri riscritti {self.drift.rewritten}")
+
+    # --- Batteria ---
+
+    async def poll_battery(self):
+        schedule = self.battery_schedule
+        while True:
+            delay = schedule.next_time - self.clock()
+            if delay > 0:
+                # Un uevent può spostare next_time: si ricontrolla al risveglio.
+                await asyncio.sleep(delay)
+                continue
+            capacity = await self.io(monitor_battery)
+            self.record("battery", value=capacity)
+            if capacity > 0:
+                schedule.observe(capacity, self.clock())
+                self.telemetry.record(battery=capacity)
+                self.publish()
+            else:
+                schedule.next_time = self.clock() + schedule.interval
+
+    async def battery_events(self):
+        """Uevent power_supply: carica e alimentatore aggiornati senza attendere la lettura periodica."""
+        while True:
+            await self.wait_readable(self.battery.fileno())
+            events = self.battery.read_events()
+            if events:
+                self.on_power_events(events)
+
+    def on_power_events(self, events):
+        print(f"[DAEMON] Evento alimentazione: {events}")
+        self.record("power", events=events)
+        self.telemetry.record(**events)
+        if "battery" in events:
+            self.battery_schedule.observe(events["battery"], self.clock())
+        self.publish()
+
+    # --- File di stato ---
+
+    async def watch_state(self):
+        while True:
+            if self.watcher.fileno() is not None:
+                await self.wait_readable(self.watcher.fileno())
+            else:
+                await asyncio.sleep(STATE_POLL_INTERVAL)
+            changed = await self.io(self.watcher.changes)
+            if changed:
+                print(f"[DAEMON] Stato modificato: {changed}")
+                await self.apply_preferences(changed)
+
+    async def apply_preferences(self, changed):
+        """Applica solo i campi indicati, senza riavvio."""
+        self.record("state", changed=changed)
+        self.prefs.update(changed)
+        prefs = self.prefs
+        if "fan_profile" in changed:
+            self.scheduled_profile = None  # la scelta dell'utente sostituisce quella del carico
+        profile_id = self.active_profile
+        if "fan_profile" in changed or ("basic_fan_offset" in changed and profile_id == 2):
+            registers = self.profile_target(profile_id, prefs["basic_fan_offset"])
+            result = await self.ec(profile_transaction, profile_id, prefs["basic_fan_offset"], registers)
+            if result["ok"]:
+                self.drift.update(registers)
+                if self.load_profiles is not None and "fan_profile" in changed:
+                    self.load_profiles.override(profile_id, self.clock())
+                self.telemetry.record(profile=profile_id)
+                self.publish()
+        if "battery_threshold" in changed:
+            self.start_battery_threshold(prefs["battery_threshold"], from_client=False)
+
+    async def reload(self):
+        """SIGHUP: rilegge il file di stato e riapplica tutte le preferenze."""
+        print("[DAEMON] SIGHUP: riapplico le preferenze dal file di stato.")
+        state = await self.io(load_state)
+        self.watcher.acknowledge(state)
+        await self.apply_preferences(state)
+
+    # --- Avvio e arresto ---
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        self.commands_ready = asyncio.Event()
+
+        if self.recorder is not None:
+            await self.start_recording()
+
+        registers = self.profile_target(self.prefs["fan_profile"], self.prefs["basic_fan_offset"])
+        report = await self.ec(apply_fan_profile, self.prefs["fan_profile"], self.prefs["basic_fan_offset"], registers)
+        if report is not None and report.ok:
+            self.drift.update(registers)
+        self.start_battery_threshold(self.prefs["battery_threshold"], from_client=False)
+        ac_online = await self.io(self.battery.read_ac_online)
+        self.record("ac", value=ac_online)
+        self.telemetry.record(profile=self.prefs["fan_profile"], ac_online=ac_online)
+
+        if self.cpu_sensors:
+            print(f"[DAEMON] Sensori CPU hwmon: {len(self.cpu_sensors)} "
+                  f"(temperatura di controllo: {config.CPU_TEMP_SOURCE})")
+
+        if self.load_sampler is not None:
+            self.load_profiles = LoadProfileScheduler(current=self.prefs["fan_profile"], now=self.clock())
+            self.load_sampler.read()  # prima lettura: i valori successivi sono differenze da qui
+            print(f"[DAEMON] Profilo automatico dal carico attivo (ogni {config.LOAD_PROFILE_INTERVAL:g}s, "
+                  f"permanenza minima {config.LOAD_PROFILE_MIN_DWELL:g}s).")
+
+        if config.SOFTWARE_FAN_CONTROL:
+            self.controller = FanController(self.device, clock=self.clock)
+            report = await self.ec(self.controller.enable)
+            if report.ok:
+                self.drift.update(self.controller.mode_registers())
+            print("[DAEMON] Controllo ventole software attivo"
+                  + (" (predittivo)." if self.controller.models is not None else "."))
 
-    apply_fan_profile(config.DEFAULT_FAN_PROFILE)
-    apply_battery_threshold(config.BATTERY_CHARGE_THRESHOLD)
+        if config.EMERGENCY_TEMP is not None:
+            self.start_watchdog()
+        await self.open_endpoints()
+        for service in self.services():
+            self.spawn(service())
 
-    battery_check_counter = 0
-    
-    while True:
-        # Controlla batteria ogni 5 cicli (2.5 minuti) invece che ogni 30 secondi
-        battery_check_counter += 1
-        if battery_check_counter >= 5:
-            monitor_battery()
-            battery_check_counter = 0
-            
-        time.sleep(30)
+        await self.stopping.wait()
+        await self.shutdown()
+
+    async def start_recording(self):
+        """Pagina EC iniziale e preferenze: il punto di partenza della riproduzione."""
+        try:
+            page = await self.ec(self.device.read_bytes, 0, EC_PAGE_SIZE)
+        except OSError as e:
+            print(f"[ERRORE] Registrazione traccia non avviata, lettura della pagina EC fallita: {e}")
+            self.recorder.close()
+            self.recorder = None
+            return
+        self.recorder.start(self.prefs, page)
+        self.device.recorder = self.recorder
+        print(f"[DAEMON] Registrazione traccia in {self.recorder.path}")
+
+    def start_watchdog(self):
+        """Guardia termica su un thread e un handle EC propri (vedi emergency.py)."""
+        self.watchdog = EmergencyWatchdog(
+            self.device.clone(),
+            on_change=lambda engaged, restore: self.loop.call_soon_threadsafe(self.on_emergency, engaged, restore))
+        self.watchdog.start()
+        print(f"[DAEMON] Guardia termica attiva: Cooler Booster oltre {config.EMERGENCY_TEMP}°C "
+              f"(lettura ogni {config.EMERGENCY_POLL_INTERVAL * 1000:.0f} ms)")
+
+    def on_emergency(self, engaged, restore):
+        """Il thread di guardia ha acceso (o spento) il Cooler Booster."""
+        self.record("emergency", engaged=engaged, restore=restore)
+        if engaged:
+            # Finché l'emergenza è attiva il registro è della guardia: niente ripristini per deriva.
+            self.drift.discard([config.EC_COOLER_BOOSTER_CONTROL_ADDR])
+            latency = self.watchdog.latency_last if self.watchdog is not None else None
+            print(f"[DAEMON] EMERGENZA TERMICA: Cooler Booster acceso"
+                  + (f" (reazione entro {latency * 1000:.0f} ms)" if latency is not None else ""))
+        else:
+            self.drift.update({config.EC_COOLER_BOOSTER_CONTROL_ADDR: restore})
+            print("[DAEMON] Emergenza termica rientrata: Cooler Booster ripristinato.")
+        self.publish()
+
+    async def open_endpoints(self):
+        """Storico, socket dei client, metriche e segnali."""
+        try:
+            self.history = History()
+        except (OSError, ValueError) as e:
+            print(f"[ERRORE] Storico {config.HISTORY_FILE} non disponibile: {e}")
+
+        try:
+            self.server = TelemetryServer(on_message=self.on_message)
+            self.server.attach(self.loop)
+        except OSError as e:
+            print(f"[ERRORE] Socket telemetria {config.TELEMETRY_SOCKET} non disponibile: {e}")
+
+        if config.METRICS_ADDRESS is not None:
+            host, port = config.METRICS_ADDRESS
+            if host not in ("127.0.0.1", "::1", "localhost"):
+                print(f"[ERRORE] METRICS_ADDRESS deve essere un indirizzo di loopback, non {host}")
+            else:
+                try:
+                    self.exporter = MetricsExporter(self.telemetry, self.device.stats, self.watchdog)
+                    await self.exporter.start(host, port)
+                    print(f"[DAEMON] Metriche OpenMetrics su http://{host}:{port}/metrics")
+                except OSError as e:
+                    self.exporter = None
+                    print(f"[ERRORE] Endpoint metriche {host}:{port} non disponibile: {e}")
+
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self.loop.add_signal_handler(signum, self.stopping.set)
+        self.loop.add_signal_handler(signal.SIGHUP, lambda: self.loop.create_task(self.reload()))
+        self.loop.add_signal_handler(signal.SIGUSR1, self.print_report)
+
+    def print_report(self):
+        """SIGUSR1: statistiche EC e riepilogo della telemetria."""
+        print(format_report(self.device.stats.as_dict()))
+        print(format_summary(self.telemetry.summary()))
+
+    def services(self):
+        """Task di lunga durata avviati da `run`."""
+        services = [self.sample_sensors, self.poll_battery, self.watch_state, self.run_commands,
+                    self.verify_registers]
+        if self.battery.fileno() is not None:
+            services.append(self.battery_events)
+        if self.load_profiles is not None:
+            services.append(self.schedule_profiles)
+        return services
+
+    async def shutdown(self):
+        print("[DAEMON] Arresto: ripristino il profilo Auto dell'EC.")
+        self.record("stop")
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.threshold_task is not None and not self.threshold_task.done():
+            # Interrotta a metà lascerebbe il registro al passo intermedio (carica al 100%):
+            # la sequenza ha un numero limitato di tentativi, quindi la si lascia finire.
+            print("[DAEMON] Attendo la fine della sequenza soglia batteria.")
+            await asyncio.gather(self.threshold_task, return_exceptions=True)
+        if self.watchdog is not None:
+            await self.io(self.watchdog.stop)
+
+        # Il firmware torna a gestire le ventole (EC_AUTO_VALUE e curva Auto).
+        report = await self.ec(self.device.apply, profile_registers(1))
+        if not report.ok:
+            print("[ERRORE] Ripristino del profilo Auto riuscito solo in parte")
+
+        if self.server is not None:
+            self.server.close()
+        if self.exporter is not None:
+            self.exporter.close()
+        if self.history is not None:
+            self.history.close()
+        self.watcher.close()
+        self.battery.close()
+        self.cpu_sensors.close()
+        if self.load_sampler is not None:
+            self.load_sampler.close()
+        if self.recorder is not None:
+            self.device.recorder = None
+            self.recorder.close()
+            print(f"[DAEMON] Traccia salvata: {self.recorder.events} eventi in {self.recorder.path}")
+        self.ec_pool.shutdown()
+        self.io_pool.shutdown(wait=False)
+
+def print_stats():
+    """--stats: chiede al daemon in esecuzione le statistiche delle transazioni EC e il riepilogo della telemetria."""
+    client = connect()
+    reply = None
+    if client is not None:
+        try:
+            reply = client.query("stats")
+        except OSError:  # anche ConnectionError: il daemon ha chiuso la connessione
+            pass
+        finally:
+            client.close()
+    if reply is None:
+        print("[DAEMON] Daemon non in esecuzione o non risponde.")
+        return 1
+    print(format_report(reply["stats"]))
+    if reply.get("telemetry"):
+        print(format_summary(reply["telemetry"]))
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vision MSI Thermal Control daemon")
+    parser.add_argument("--stats", action="store_true",
+                        help="stampa le statistiche EC del daemon in esecuzione (anche con kill -USR1)")
+    parser.add_argument("--record", metavar="FILE",
+                        help="registra una traccia per replay.py (.gz per comprimerla)")
+    args = parser.parse_args(argv)
+    if args.stats:
+        return print_stats()
+
+    recorder = None
+    if args.record:
+        try:
+            recorder = TraceRecorder(args.record)
+        except OSError as e:
+            print(f"[ERRORE] Impossibile creare la traccia {args.record}: {e}")
+            return 1
+
+    print("[DAEMON] Avviato. Controllo ventole e batteria attivi.")
+    asyncio.run(Daemon(recorder=recorder).run())
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
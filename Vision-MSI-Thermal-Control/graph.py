@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Grafico storico
+Created by Sunray_Vision
+Storico di temperature e RPM per la GUI: buffer limitato, decimazione alla larghezza in pixel e colonne ridisegnate solo quando cambiano
+"""
+
+import math
+from array import array
+from collections import deque
+
+import config
+
+# (segnale, legenda, asse, colore RGB). Temperature e RPM hanno ciascuno la propria scala fissa.
+GRAPH_SIGNALS = (
+    ("cpu_temp", "CPU °C", "temp", (0.90, 0.30, 0.20)),
+    ("gpu_temp", "GPU °C", "temp", (0.95, 0.65, 0.15)),
+    ("cpu_rpm", "CPU RPM", "rpm", (0.25, 0.55, 0.90)),
+    ("gpu_rpm", "GPU RPM", "rpm", (0.45, 0.75, 0.45)),
+)
+
+BACKGROUND = (0.12, 0.12, 0.14)
+GRID = (0.25, 0.25, 0.28)
+GRID_STEP = 10  # °C tra le linee orizzontali
+
+# Campioni tenuti in memoria: la finestra del grafico a 10 letture al secondo.
+RING_CAPACITY = int(config.GUI_GRAPH_SECONDS * 10)
+
+NAN = float('nan')
+
+
+class SampleRing:
+    """Ultimi `capacity` campioni (istante e un valore per segnale) in array preallocati."""
+
+    def __init__(self, signals, capacity: int = RING_CAPACITY):
+        self.capacity = capacity
+        self.times = array('d', [0.0]) * capacity
+        self.values = {name: array('d', [NAN]) * capacity for name in signals}
+        self.start = 0
+        self.count = 0
+
+    def add(self, t: float, sample: dict):
+        i = (self.start + self.count) % self.capacity
+        if self.count == self.capacity:
+            self.start = (self.start + 1) % self.capacity
+        else:
+            self.count += 1
+        self.times[i] = t
+        for name, values in self.values.items():
+            value = sample.get(name)
+            values[i] = NAN if value is None else value
+
+    def __iter__(self):
+        """(istante, {segnale: valore}) dal più vecchio."""
+        for k in range(self.count):
+            i = (self.start + k) % self.capacity
+            yield self.times[i], {name: values[i] for name, values in self.values.items()}
+
+
+class Column:
+    """Minimo, massimo e ultimo valore di un segnale nei campioni caduti in un pixel."""
+    __slots__ = ("low", "high", "last")
+
+    def __init__(self):
+        self.low = self.high = self.last = None
+
+    def add(self, value: float):
+        if value != value:  # NaN: sensore non letto
+            return
+        self.low = value if self.low is None else min(self.low, value)
+        self.high = value if self.high is None else max(self.high, value)
+        self.last = value
+
+
+class HistoryGraph:
+    """
+    Modello del grafico: una colonna di pixel copre `seconds / width` secondi e conserva
+    minimo e massimo di ogni segnale, così i picchi restano visibili qualunque sia la
+    frequenza dei campioni. Le scale sono fisse: un campione cambia solo la colonna più
+    recente e il passaggio a una nuova colonna fa scorrere il grafico di pochi pixel.
+    `add` dice quale delle due cose è successa; il disegno di un intervallo di colonne
+    è in `draw`, su un contesto Cairo qualsiasi.
+    """
+
+    def __init__(self, seconds: float = config.GUI_GRAPH_SECONDS, signals=GRAPH_SIGNALS,
+                 temp_range=config.GUI_GRAPH_TEMP_RANGE, rpm_range=config.GUI_GRAPH_RPM_RANGE):
+        self.seconds = seconds
+        self.signals = signals
+        self.ranges = {"temp": temp_range, "rpm": rpm_range}
+        self.ring = SampleRing([name for name, _, _, _ in signals])
+        self.width = 0
+        self.height = 0
+        self.step = None      # secondi per colonna
+        self.columns = deque()
+        self.last_index = None
+
+    def _new_column(self):
+        return {name: Column() for name, _, _, _ in self.signals}
+
+    def resize(self, width: int, height: int):
+        """Nuove dimensioni: le colonne vengono ricalcolate (decimate) dai campioni nel buffer."""
+        self.width, self.height = max(1, width), max(1, height)
+        self.step = self.seconds / self.width
+        self.columns = deque(maxlen=self.width)
+        self.last_index = None
+        for t, sample in self.ring:
+            self._place(t, sample)
+
+    def _place(self, t: float, sample: dict) -> int:
+        """Aggiunge il campione alle colonne; ritorna di quante colonne il grafico è scorso."""
+        index = int(t // self.step)
+        shift = 0
+        if self.last_index is None:
+            self.columns.append(self._new_column())
+        elif index > self.last_index:
+            shift = min(index - self.last_index, self.width)
+            for _ in range(shift):
+                self.columns.append(self._new_column())
+        elif index < self.last_index:
+            index = self.last_index  # orologio tornato indietro: resta nella colonna corrente
+        self.last_index = index
+        column = self.columns[-1]
+        for name, _, _, _ in self.signals:
+            value = sample.get(name)
+            if value is not None:
+                column[name].add(value)
+        return shift
+
+    def add(self, t: float, sample: dict) -> int:
+        """
+        Registra un campione. Ritorna 0 se è cambiata solo l'ultima colonna, altrimenti
+        il numero di colonne (pixel) di cui il grafico è scorso verso sinistra.
+        """
+        self.ring.add(t, sample)
+        if self.step is None:
+            return 0
+        return self._place(t, sample)
+
+    def x_of(self, position: int) -> int:
+        """Ascissa della colonna `position` (0 = la più vecchia): il grafico è allineato a destra."""
+        return self.width - len(self.columns) + position
+
+    def _y(self, axis: str, value: float) -> float:
+        low, high = self.ranges[axis]
+        fraction = (value - low) / (high - low)
+        return (self.height - 1) * (1.0 - min(1.0, max(0.0, fraction))) + 0.5
+
+    def draw(self, cr, x0: int, x1: int):
+        """
+        Ridisegna le ascisse [x0, x1): sfondo, griglia e segnali, ritagliati a quell'area.
+        I raccordi tra colonne attraversano il bordo dei pixel: dopo aver cambiato la colonna
+        x va ridisegnato [x - 1, x + 1).
+        """
+        cr.save()
+        cr.rectangle(x0, 0, x1 - x0, self.height)
+        cr.clip()
+        cr.set_source_rgb(*BACKGROUND)
+        cr.paint()
+
+        cr.set_line_width(1.0)
+        cr.set_source_rgb(*GRID)
+        low, high = self.ranges["temp"]
+        for temp in range(int(math.ceil(low / GRID_STEP)) * GRID_STEP, int(high) + 1, GRID_STEP):
+            y = int(self._y("temp", temp)) + 0.5
+            cr.move_to(x0, y)
+            cr.line_to(x1, y)
+        cr.stroke()
+
+        first = self.x_of(0)
+        start, end = max(x0 - 1, first), min(x1 + 1, first + len(self.columns))
+        for name, _, axis, color in self.signals:
+            cr.set_source_rgb(*color)
+            previous = None
+            for x in range(start, end):
+                cell = self.columns[x - first][name]
+                if cell.last is None:
+                    previous = None
+                    continue
+                # Tratto verticale min-max (picchi) e raccordo con l'ultimo valore della colonna precedente.
+                cr.move_to(x + 0.5, self._y(axis, cell.low))
+                cr.line_to(x + 0.5, self._y(axis, cell.high))
+                if previous is not None:
+                    cr.move_to(x - 0.5, self._y(axis, previous))
+                    cr.line_to(x + 0.5, self._y(axis, cell.last))
+                previous = cell.last
+            cr.stroke()
+        cr.restore()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Storico su disco
+Created by Sunray_Vision
+Registro circolare di record binari a lunghezza fissa in un file mappato in memoria, con interrogazione da riga di comando
+
+Uso:
+    python3 history.py --since 2h                          # CSV dei campioni delle ultime 2 ore
+    python3 history.py --since 7d --bucket 3600 --format json
+    python3 history.py --since 1d --stats cpu_temp gpu_temp
+"""
+
+import argparse
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:  # NumPy è opzionale: serve solo ad accelerare le aggregazioni
+    np = None
+
+import config
+
+MAGIC = b"VTHL"
+VERSION = 1
+
+# Intestazione: magic, versione, dimensione record, capacità (record), prossimo indice, record validi.
+HEADER = struct.Struct("<4sHHIII")
+HEADER_SIZE = 64
+
+# Record: istante (s), temperature °C, RPM, batteria %, profilo, alimentatore, carico CPU %.
+FIELDS = ("ts", "cpu_temp", "gpu_temp", "cpu_rpm", "gpu_rpm", "battery", "profile", "ac_online", "cpu_load")
+RECORD = struct.Struct("<dhhhhbbbb")
+MISSING16 = -32768  # valore non disponibile nei campi a 16 bit
+MISSING8 = -128     # ... e in quelli a 8 bit
+_MISSING = (None, MISSING16, MISSING16, MISSING16, MISSING16, MISSING8, MISSING8, MISSING8, MISSING8)
+
+if np is not None:
+    DTYPE = np.dtype([("ts", "<f8"), ("cpu_temp", "<i2"), ("gpu_temp", "<i2"), ("cpu_rpm", "<i2"),
+                      ("gpu_rpm", "<i2"), ("battery", "i1"), ("profile", "i1"), ("ac_online", "i1"),
+                      ("cpu_load", "i1")])
+
+
+def _clip(value, missing):
+    if value is None:
+        return missing
+    limit = 32767 if missing == MISSING16 else 127
+    return max(missing + 1, min(limit, int(value)))
+
+
+class History:
+    """
+    Registro circolare su file: `append` scrive il record direttamente nella mappa (nessuna
+    chiamata di sistema) e aggiorna l'intestazione; quando il file è pieno si sovrascrivono
+    i record più vecchi. La dimensione del file non supera mai `max_bytes`.
+    """
+
+    def __init__(self, path: str = config.HISTORY_FILE, max_bytes: int = config.HISTORY_MAX_BYTES,
+                 writable: bool = True):
+        self.path = path
+        self.writable = writable
+        capacity = max(1, (max_bytes - HEADER_SIZE) // RECORD.size)
+        old = None  # record da conservare se la capacità configurata è cambiata
+        if writable:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        else:
+            fd = os.open(path, os.O_RDONLY)
+        try:
+            size = os.fstat(fd).st_size
+            header = os.pread(fd, HEADER.size, 0) if size >= HEADER_SIZE else b""
+            valid = (len(header) == HEADER.size and HEADER.unpack(header)[:3] == (MAGIC, VERSION, RECORD.size))
+            if not writable:
+                if not valid:
+                    raise ValueError(f"{path} non è uno storico valido")
+                capacity = HEADER.unpack(header)[3]
+            elif not valid or HEADER.unpack(header)[3] != capacity:
+                if valid:
+                    old = self._read_all(fd, size)
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, HEADER_SIZE + capacity * RECORD.size)
+                os.pwrite(fd, HEADER.pack(MAGIC, VERSION, RECORD.size, capacity, 0, 0), 0)
+                if old is not None:
+                    print(f"[STORICO] Capacità cambiata: conservati {min(len(old), capacity)} record")
+            self.mm = mmap.mmap(fd, HEADER_SIZE + capacity * RECORD.size,
+                                access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        _, _, _, self.capacity, self.head, self.count = HEADER.unpack_from(self.mm, 0)
+        if old:
+            for record in old[-capacity:]:
+                self._store(record)
+
+    @staticmethod
+    def _read_all(fd, size):
+        """Record di un file esistente (con un'altra capacità), dal più vecchio."""
+        data = os.pread(fd, size, 0)
+        _, _, _, capacity, head, count = HEADER.unpack_from(data, 0)
+        start = (head - count) % capacity
+        records = []
+        for i in range(count):
+            offset = HEADER_SIZE + ((start + i) % capacity) * RECORD.size
+            records.append(RECORD.unpack_from(data, offset))
+        return records
+
+    def close(self):
+        if self.mm is not None:
+            if self.writable:
+                self.mm.flush()
+            self.mm.close()
+            self.mm = None
+
+    # --- Scrittura ---
+
+    def _store(self, record):
+        RECORD.pack_into(self.mm, HEADER_SIZE + self.head * RECORD.size, *record)
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        HEADER.pack_into(self.mm, 0, MAGIC, VERSION, RECORD.size, self.capacity, self.head, self.count)
+
+    def append(self, ts: float, sample: dict):
+        """Aggiunge un campione (dict con i nomi di FIELDS; i campi assenti restano vuoti)."""
+        self._store((ts,) + tuple(_clip(sample.get(name), missing)
+                                  for name, missing in zip(FIELDS[1:], _MISSING[1:])))
+
+    # --- Lettura ---
+
+    def _refresh(self):
+        _, _, _, _, self.head, self.count = HEADER.unpack_from(self.mm, 0)
+
+    def _index(self, i: int) -> int:
+        """Posizione nel file dell'i-esimo record in ordine cronologico."""
+        return (self.head - self.count + i) % self.capacity
+
+    def _ts(self, i: int) -> float:
+        return struct.unpack_from("<d", self.mm, HEADER_SIZE + self._index(i) * RECORD.size)[0]
+
+    def _bisect(self, ts: float) -> int:
+        """Primo indice cronologico con istante >= ts (ricerca binaria sulla mappa)."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._ts(mid) < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def segments(self, since: float = None, until: float = None):
+        """
+        Porzioni contigue della mappa (memoryview, senza copie) con i record in [since, until),
+        in ordine cronologico: al più due, perché il registro è circolare.
+        """
+        self._refresh()
+        first = self._bisect(since) if since is not None else 0
+        last = self._bisect(until) if until is not None else self.count
+        view = memoryview(self.mm)
+        while first < last:
+            start = self._index(first)
+            n = min(last - first, self.capacity - start)
+            yield view[HEADER_SIZE + start * RECORD.size:HEADER_SIZE + (start + n) * RECORD.size]
+            first += n
+
+    def records(self, since: float = None, until: float = None):
+        """Generatore di dict (campi mancanti = None), un record alla volta."""
+        for segment in self.segments(since, until):
+            for values in RECORD.iter_unpack(segment):
+                yield {name: (None if value == missing else value)
+                       for name, value, missing in zip(FIELDS, values, _MISSING)}
+
+
+# ----------------------------
+#   Aggregazione
+# ----------------------------
+
+def aggregate(history: History, signals, since=None, until=None, bucket: float = None):
+    """
+    Min/max/media per segnale, complessivi o per intervalli di `bucket` secondi.
+    Ritorna una lista di {"ts": inizio bucket, segnale: {"min", "max", "avg", "count"}}.
+    Con NumPy i record vengono letti come array direttamente dalla mappa.
+    """
+    if np is not None:
+        parts = [np.frombuffer(segment, dtype=DTYPE) for segment in history.segments(since, until)]
+        data = np.concatenate(parts) if parts else np.zeros(0, dtype=DTYPE)
+        keys = (data["ts"] // bucket) * bucket if bucket else np.zeros(len(data))
+        result = []
+        for key in np.unique(keys):
+            rows = data[keys == key]
+            entry = {"ts": float(key) if bucket else (float(rows["ts"][0]) if len(rows) else None)}
+            for signal in signals:
+                missing = MISSING16 if DTYPE[signal].itemsize == 2 else MISSING8
+                values = rows[signal][rows[signal] != missing]
+                entry[signal] = ({"min": int(values.min()), "max": int(values.max()),
+                                  "avg": round(float(values.mean()), 2), "count": int(len(values))}
+                                 if len(values) else None)
+            result.append(entry)
+        return result
+
+    result = []
+    current, acc = None, None
+    for record in history.records(since, until):
+        key = (record["ts"] // bucket) * bucket if bucket else 0
+        if key != current:
+            if acc is not None:
+                result.append(_finish(current if bucket else first_ts, acc))
+            current, acc, first_ts = key, {s: [None, None, 0, 0] for s in signals}, record["ts"]
+        for signal in signals:
+            value = record[signal]
+            if value is None:
+                continue
+            a = acc[signal]
+            a[0] = value if a[0] is None else min(a[0], value)
+            a[1] = value if a[1] is None else max(a[1], value)
+            a[2] += value
+            a[3] += 1
+    if acc is not None:
+        result.append(_finish(current if bucket else first_ts, acc))
+    return result
+
+def _finish(ts, acc):
+    entry = {"ts": ts}
+    for signal, (mn, mx, total, count) in acc.items():
+        entry[signal] = {"min": mn, "max": mx, "avg": round(total / count, 2), "count": count} if count else None
+    return entry
+
+
+# ----------------------------
+#   Riga di comando
+# ----------------------------
+
+def parse_time(text: str, now: float) -> float:
+    """Istante assoluto (epoch) o relativo ('90s', '15m', '2h', '7d' fa)."""
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if text and text[-1] in units:
+        return now - float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Interroga lo storico della telemetria")
+    parser.add_argument("--file", default=config.HISTORY_FILE)
+    parser.add_argument("--since", help="inizio: epoch o relativo (es. 2h, 7d)")
+    parser.add_argument("--until", help="fine: epoch o relativo")
+    parser.add_argument("--stats", nargs="*", metavar="SEGNALE",
+                        help="aggrega min/max/media (tutti i segnali se non indicati)")
+    parser.add_argument("--bucket", type=float, help="aggrega per intervalli di N secondi")
+    parser.add_argument("--format", choices=("csv", "json"), default="csv")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.stats or () if name not in FIELDS[1:]]
+    if unknown:
+        print(f"[STORICO] Segnali sconosciuti: {', '.join(unknown)} (disponibili: {', '.join(FIELDS[1:])})",
+              file=sys.stderr)
+        return 1
+
+    try:
+        history = History(args.file, writable=False)
+    except (OSError, ValueError) as e:
+        print(f"[STORICO] Impossibile aprire {args.file}: {e}", file=sys.stderr)
+        return 1
+    now = time.time()
+    since = parse_time(args.since, now) if args.since else None
+    until = parse_time(args.until, now) if args.until else None
+    out = sys.stdout
+
+    if args.stats is not None or args.bucket:
+        signals = args.stats or list(FIELDS[1:])
+        rows = aggregate(history, signals, since, until, args.bucket)
+        if args.format == "json":
+            json.dump(rows, out, indent=2)
+            out.write("\n")
+        else:
+            writer = csv.writer(out)
+            writer.writerow(["ts"] + [f"{s}_{k}" for s in signals for k in ("min", "max", "avg", "count")])
+            for row in rows:
+                writer.writerow([row["ts"]] + [(row[s] or {}).get(k) for s in signals
+                                               for k in ("min", "max", "avg", "count")])
+        return 0
+
+    # Esportazione in streaming: un record alla volta, senza caricare lo storico in memoria.
+    if args.format == "json":
+        out.write("[")
+        for i, record in enumerate(history.records(since, until)):
+            out.write((",\n" if i else "\n") + json.dumps(record))
+        out.write("\n]\n")
+    else:
+        writer = csv.writer(out)
+        writer.writerow(FIELDS)
+        for record in history.records(since, until):
+            writer.writerow(["" if record[name] is None else record[name] for name in FIELDS])
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
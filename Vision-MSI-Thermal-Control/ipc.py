@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - IPC
+Created by Sunray_Vision
+Diffusione della telemetria del daemon su socket Unix: il daemon è l'unico lettore dell'EC
+"""
+
+import json
+import os
+import select
+import socket
+import struct
+import time
+
+import config
+
+# Formato: una riga JSON per messaggio, in entrambe le direzioni.
+# Daemon -> client, campione di telemetria:
+#   {"ts": 1732800000.5, "cpu_temp": 55, "gpu_temp": 50, "cpu_rpm": 2100, "gpu_rpm": 2300, "battery": 60, "profile": 2}
+# Client -> daemon, richiesta (solo client root, vedi commands.py):
+#   {"id": 7, "cmd": "profile", "value": 3}
+# Daemon -> client, conferma asincrona della richiesta:
+#   {"ack": 7, "cmd": "profile", "value": 3, "ok": true, "merged": 2, ...}
+
+# Dimensione massima del buffer di uscita per client: chi resta indietro viene disconnesso.
+MAX_CLIENT_BACKLOG = 64 * 1024
+
+
+def encode_sample(sample: dict) -> bytes:
+    return json.dumps(sample, separators=(",", ":")).encode() + b"\n"
+
+
+def peer_uid(sock) -> int:
+    """UID del processo all'altro capo del socket Unix (SO_PEERCRED)."""
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", creds)[1]
+
+
+class _Client:
+    __slots__ = ("sock", "pending", "received", "uid")
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.pending = b""
+        self.received = b""
+        self.uid = peer_uid(sock)
+
+
+class TelemetryServer:
+    """
+    Socket Unix in ascolto su TELEMETRY_SOCKET. Ogni campione pubblicato viene inviato a
+    tutti i client con scritture non bloccanti: il carico sull'EC non dipende dal numero
+    di monitor collegati e un client lento non rallenta il daemon.
+
+    Le righe ricevute dai client vengono decodificate e passate a `on_message(client, msg)`.
+    """
+
+    def __init__(self, path: str = config.TELEMETRY_SOCKET, on_message=None):
+        self.path = path
+        self.on_message = on_message
+        self.clients = []
+        self.last = None
+        self.loop = None
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        # Solo lettura della telemetria: anche gli utenti non root possono collegarsi.
+        os.chmod(path, 0o666)
+        self.sock.listen(8)
+        self.sock.setblocking(False)
+
+    def attach(self, loop):
+        """
+        Registra i socket sul loop asyncio: nuovi client e messaggi vengono gestiti dai
+        callback del loop invece che da `wait()`.
+        """
+        self.loop = loop
+        loop.add_reader(self.sock, self._accept)
+        for client in self.clients:
+            loop.add_reader(client.sock, self._receive, client)
+
+    def close(self):
+        if self.loop is not None:
+            self.loop.remove_reader(self.sock)
+        for client in self.clients:
+            if self.loop is not None:
+                self.loop.remove_reader(client.sock)
+            client.sock.close()
+        self.clients = []
+        self.sock.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except BlockingIOError:
+                return
+            conn.setblocking(False)
+            client = _Client(conn)
+            self.clients.append(client)
+            if self.loop is not None:
+                self.loop.add_reader(conn, self._receive, client)
+            # Il nuovo client riceve subito l'ultimo campione noto.
+            if self.last is not None:
+                self._send(client, self.last)
+
+    def _send(self, client: _Client, data: bytes) -> bool:
+        client.pending += data
+        try:
+            sent = client.sock.send(client.pending)
+            client.pending = client.pending[sent:]
+        except BlockingIOError:
+            pass
+        except OSError:
+            return False
+        return len(client.pending) <= MAX_CLIENT_BACKLOG
+
+    def _drop(self, client: _Client):
+        if client in self.clients:
+            self.clients.remove(client)
+            if self.loop is not None:
+                self.loop.remove_reader(client.sock)
+        client.sock.close()
+
+    def send(self, client: _Client, message: dict):
+        """Invia un messaggio a un solo client (es. la conferma di una richiesta)."""
+        if client in self.clients and not self._send(client, encode_sample(message)):
+            self._drop(client)
+
+    def _receive(self, client: _Client):
+        try:
+            data = client.sock.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(client)
+            return
+        client.received += data
+        *lines, client.received = client.received.split(b"\n")
+        if len(client.received) > MAX_CLIENT_BACKLOG:
+            self._drop(client)
+            return
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if self.on_message is not None and isinstance(message, dict):
+                self.on_message(client, message)
+
+    def publish(self, sample: dict):
+        self.last = encode_sample(sample)
+        for client in list(self.clients):
+            if not self._send(client, self.last):
+                self._drop(client)
+
+
+class TelemetryClient:
+    """Client della telemetria: `fileno()` può essere passato a select o a GLib.io_add_watch."""
+
+    def __init__(self, path: str = config.TELEMETRY_SOCKET):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.sock.connect(path)
+        except OSError:
+            self.sock.close()  # la GUI riprova ad ogni tick finché il daemon è fermo: niente fd persi
+            raise
+        self.sock.setblocking(False)
+        self.buffer = b""
+        self.next_id = 1
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+    def close(self):
+        self.sock.close()
+
+    def request(self, cmd: str, value: int) -> int:
+        """Invia una richiesta al daemon e ritorna il suo id; la conferma arriva con read_samples."""
+        request_id = self.next_id
+        self.next_id += 1
+        self.sock.setblocking(True)
+        try:
+            self.sock.sendall(encode_sample({"id": request_id, "cmd": cmd, "value": value}))
+        finally:
+            self.sock.setblocking(False)
+        return request_id
+
+    def query(self, cmd: str, value=None, timeout: float = 5.0):
+        """Invia una richiesta e attende la sua conferma (bloccante). Ritorna None allo scadere."""
+        request_id = self.request(cmd, value)
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([self.sock], [], [], remaining)[0]:
+                return None
+            for message in self.read_samples():
+                if message.get("ack") == request_id:
+                    return message
+
+    def read_samples(self):
+        """
+        Ritorna i messaggi completi arrivati finora (lista, eventualmente vuota): campioni
+        di telemetria e conferme delle richieste, riconoscibili dalla chiave "ack".
+        Solleva ConnectionError se il daemon ha chiuso la connessione.
+        """
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                break
+            if not data:
+                raise ConnectionError("connessione chiusa dal daemon")
+            self.buffer += data
+        *lines, self.buffer = self.buffer.split(b"\n")
+        return [json.loads(line) for line in lines if line]
+
+    def stream(self):
+        """Generatore bloccante di campioni, utile per script e monitor."""
+        while True:
+            select.select([self.sock], [], [])
+            yield from self.read_samples()
+
+
+def connect(path: str = config.TELEMETRY_SOCKET):
+    """Ritorna un TelemetryClient, oppure None se il daemon non è in esecuzione."""
+    try:
+        return TelemetryClient(path)
+    except OSError:
+        return None
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Profilo dal carico
+Created by Sunray_Vision
+Sceglie il profilo ventole dal carico CPU e dalla pressione PSI sostenuti nel tempo, con una permanenza minima
+"""
+
+import time
+from typing import NamedTuple
+
+import config
+from cpu_load import CpuLoad, CpuPressure
+
+
+class LoadRule(NamedTuple):
+    profile: int          # profilo da applicare (1-4)
+    min_load: float       # carico 0-1 oltre cui la regola è soddisfatta (None: ignorato)
+    min_pressure: float   # pressione PSI 0-1 oltre cui la regola è soddisfatta (None: ignorata)
+    window: float         # secondi di condizione continua prima che la regola valga
+
+    def matches(self, load, pressure) -> bool:
+        return ((self.min_load is not None and load is not None and load >= self.min_load)
+                or (self.min_pressure is not None and pressure is not None and pressure >= self.min_pressure))
+
+
+class LoadSampler:
+    """Carico e pressione su descrittori propri: le letture delle temperature hanno i loro intervalli."""
+
+    def __init__(self, clock=time.monotonic):
+        self.load = CpuLoad()
+        self.pressure = CpuPressure(clock=clock)
+
+    def read(self):
+        """(carico, pressione) dall'ultima chiamata; ciascuno None se non disponibile."""
+        return self.load.read(), self.pressure.read()
+
+    def close(self):
+        self.load.close()
+        self.pressure.close()
+
+
+class LoadProfileScheduler:
+    """
+    Classifica il carico con regole a finestra temporale: una regola vale quando la sua
+    condizione resta vera per `window` secondi di fila, e tra quelle valide vince la prima
+    in `rules` (la più fresca). Senza regole valide il profilo è `idle`.
+
+    Un profilo più fresco viene applicato appena la sua regola vale, così le ventole
+    accelerano prima che il package si scaldi. Si torna a uno meno fresco solo dopo
+    `min_dwell` secondi dall'ultimo cambio e dall'ultima volta che la regola del profilo
+    attivo valeva: un calo momentaneo non fa oscillare il profilo.
+    """
+
+    def __init__(self, rules=config.LOAD_PROFILE_RULES, idle: int = config.LOAD_PROFILE_IDLE,
+                 min_dwell: float = config.LOAD_PROFILE_MIN_DWELL, current: int = None, now: float = 0.0):
+        self.rules = [LoadRule(*rule) for rule in rules]
+        self.idle = idle
+        self.min_dwell = min_dwell
+        self.current = current
+        self.switched = now
+        self.since = [None] * len(self.rules)  # inizio della condizione continua di ogni regola
+        self.held = {}                         # {profilo: ultimo istante in cui la sua regola valeva}
+
+    def rank(self, profile: int) -> int:
+        """Posizione nella scala di raffreddamento: `idle` e i profili senza regola valgono 0."""
+        for i, rule in enumerate(self.rules):
+            if rule.profile == profile:
+                return len(self.rules) - i
+        return 0
+
+    def classify(self, now: float, load, pressure) -> int:
+        """Aggiorna le finestre con una lettura e ritorna il profilo indicato dal carico."""
+        target = None
+        for i, rule in enumerate(self.rules):
+            if not rule.matches(load, pressure):
+                self.since[i] = None
+                continue
+            if self.since[i] is None:
+                self.since[i] = now
+            if now - self.since[i] >= rule.window:
+                self.held[rule.profile] = now
+                if target is None:
+                    target = rule.profile
+        return self.idle if target is None else target
+
+    def observe(self, now: float, load, pressure):
+        """
+        Ritorna il profilo da applicare se è il momento di cambiarlo, altrimenti None.
+        Il profilo attivo cambia solo con `override()`, dopo che il chiamante l'ha applicato:
+        se la scrittura fallisce, la lettura successiva lo propone di nuovo.
+        """
+        target = self.classify(now, load, pressure)
+        if target == self.current:
+            return None
+        if self.current is not None and self.rank(target) <= self.rank(self.current):
+            if now - self.switched < self.min_dwell:
+                return None
+            if now - self.held.get(self.current, float('-inf')) < self.min_dwell:
+                return None
+        return target
+
+    def override(self, profile: int, now: float):
+        """Profilo applicato (scelto dal carico, da un client o dal file di stato): resta almeno `min_dwell` secondi."""
+        self.current = profile
+        self.switched = now
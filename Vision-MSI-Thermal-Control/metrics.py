@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Esportazione metriche
+Created by Sunray_Vision
+Endpoint HTTP in formato OpenMetrics (compatibile Prometheus) servito dall'ultimo campione del daemon
+"""
+
+import asyncio
+
+from ec_stats import LATENCY_BUCKETS_US, OPS
+from emergency import LATENCY_BUCKETS as EMERGENCY_BUCKETS
+from profiles import PROFILE_NAMES
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Richieste più grandi di così (riga + intestazioni) vengono scartate.
+MAX_REQUEST_SIZE = 8192
+REQUEST_TIMEOUT = 5.0
+
+
+def _gauge(lines, name, help_text, samples, unit=None):
+    """`samples`: lista di (etichette, valore); i valori None (sensore mai letto) vengono omessi."""
+    samples = [(labels, value) for labels, value in samples if value is not None]
+    if not samples:
+        return
+    lines.append(f"# TYPE {name} gauge")
+    if unit:
+        lines.append(f"# UNIT {name} {unit}")
+    lines.append(f"# HELP {name} {help_text}")
+    for labels, value in samples:
+        lines.append(f"{name}{labels} {value}")
+
+
+def render(latest: dict, stats, timestamp: float = None, watchdog=None) -> bytes:
+    """
+    Testo OpenMetrics dall'ultimo campione (`TelemetryStore.latest`), dalle statistiche EC
+    (`ECStats`) e dalla guardia termica (`EmergencyWatchdog`, se attiva). Non esegue alcuna lettura EC.
+    """
+    lines = []
+    _gauge(lines, "vision_temperature_celsius", "Temperature di CPU e GPU (EC) e del core più caldo (hwmon).",
+           [('{sensor="cpu"}', latest.get("cpu_temp")), ('{sensor="gpu"}', latest.get("gpu_temp")),
+            ('{sensor="cpu_core_max"}', latest.get("cpu_core_temp"))],
+           unit="celsius")
+    _gauge(lines, "vision_fan_rpm", "Giri al minuto delle ventole.",
+           [('{fan="cpu"}', latest.get("cpu_rpm")), ('{fan="gpu"}', latest.get("gpu_rpm"))])
+    _gauge(lines, "vision_battery_percent", "Livello della batteria.",
+           [("", latest.get("battery"))])
+    ac_online = latest.get("ac_online")
+    _gauge(lines, "vision_ac_online", "Alimentatore collegato (1) o scollegato (0).",
+           [("", None if ac_online is None else int(ac_online))])
+    if timestamp is not None:
+        _gauge(lines, "vision_sample_timestamp_seconds", "Istante dell'ultimo campione pubblicato.",
+               [("", timestamp)], unit="seconds")
+
+    profile = latest.get("profile")
+    if profile is not None:
+        lines.append("# TYPE vision_fan_profile stateset")
+        lines.append("# HELP vision_fan_profile Profilo ventole attivo.")
+        for i, name in enumerate(PROFILE_NAMES, start=1):
+            lines.append(f'vision_fan_profile{{vision_fan_profile="{name}"}} {int(profile == i)}')
+
+    for metric, counters, help_text in (
+            ("vision_ec_transactions", stats.calls, "Transazioni EC."),
+            ("vision_ec_bytes", stats.bytes, "Byte trasferiti con l'EC."),
+            ("vision_ec_errors", stats.errors, "Transazioni EC fallite."),
+            ("vision_ec_retries", stats.retries, "Scritture EC ripetute dopo una verifica fallita.")):
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"# HELP {metric} {help_text}")
+        for op, name in enumerate(OPS):
+            lines.append(f'{metric}_total{{op="{name}"}} {counters[op]}')
+
+    lines.append("# TYPE vision_ec_latency_seconds histogram")
+    lines.append("# UNIT vision_ec_latency_seconds seconds")
+    lines.append("# HELP vision_ec_latency_seconds Durata delle transazioni EC.")
+    for op, name in enumerate(OPS):
+        cumulative = 0
+        counts = stats.buckets(op)
+        for bound, count in zip(LATENCY_BUCKETS_US, counts):
+            cumulative += count
+            lines.append(f'vision_ec_latency_seconds_bucket{{op="{name}",le="{bound / 1e6:g}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'vision_ec_latency_seconds_bucket{{op="{name}",le="+Inf"}} {cumulative}')
+        lines.append(f'vision_ec_latency_seconds_count{{op="{name}"}} {cumulative}')
+        lines.append(f'vision_ec_latency_seconds_sum{{op="{name}"}} {stats.total_ns[op] / 1e9}')
+
+    if watchdog is not None:
+        _gauge(lines, "vision_emergency_active", "Cooler Booster acceso dalla guardia termica.",
+               [("", int(watchdog.engaged))])
+        lines.append("# TYPE vision_emergency_engagements counter")
+        lines.append("# HELP vision_emergency_engagements Interventi della guardia termica.")
+        lines.append(f"vision_emergency_engagements_total {watchdog.engagements}")
+        lines.append("# TYPE vision_emergency_reaction_seconds histogram")
+        lines.append("# UNIT vision_emergency_reaction_seconds seconds")
+        lines.append("# HELP vision_emergency_reaction_seconds Dall'ultima lettura sotto soglia al Cooler Booster acceso.")
+        cumulative = 0
+        for bound, count in zip(EMERGENCY_BUCKETS, watchdog.latency_counts):
+            cumulative += count
+            lines.append(f'vision_emergency_reaction_seconds_bucket{{le="{bound:g}"}} {cumulative}')
+        cumulative += watchdog.latency_counts[-1]
+        lines.append(f'vision_emergency_reaction_seconds_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f"vision_emergency_reaction_seconds_count {cumulative}")
+        lines.append(f"vision_emergency_reaction_seconds_sum {watchdog.latency_sum}")
+
+    lines.append("# EOF")
+    return ("\n".join(lines) + "\n").encode()
+
+
+class MetricsExporter:
+    """
+    Server HTTP minimale sul loop asyncio del daemon. La risposta viene generata solo
+    quando il daemon ha pubblicato un nuovo campione (`invalidate()`); gli scrape
+    intermedi ricevono il testo in cache, quindi la frequenza di scrape non incide sull'EC.
+    """
+
+    def __init__(self, telemetry, stats, watchdog=None):
+        self.telemetry = telemetry
+        self.stats = stats
+        self.watchdog = watchdog
+        self.timestamp = None
+        self.cached = None
+        self.server = None
+
+    def invalidate(self, timestamp: float = None):
+        self.timestamp = timestamp
+        self.cached = None
+
+    def body(self) -> bytes:
+        if self.cached is None:
+            self.cached = render(self.telemetry.latest, self.stats, self.timestamp, self.watchdog)
+        return self.cached
+
+    async def start(self, host: str, port: int):
+        self.server = await asyncio.start_server(self._handle, host, port)
+        return self.server
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), REQUEST_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ConnectionError):
+            writer.close()
+            return
+        parts = request.split(b"\r\n", 1)[0].split()
+        if len(request) > MAX_REQUEST_SIZE or len(parts) != 3:
+            status, content_type, body = "400 Bad Request", "text/plain", b"richiesta non valida\n"
+        elif parts[0] != b"GET":
+            status, content_type, body = "405 Method Not Allowed", "text/plain", b"solo GET\n"
+        elif parts[1].split(b"?")[0] != b"/metrics":
+            status, content_type, body = "404 Not Found", "text/plain", b"usa /metrics\n"
+        else:
+            status, content_type, body = "200 OK", CONTENT_TYPE, self.body()
+        header = (f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                  f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n")
+        try:
+            writer.write(header.encode() + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Profili ventole
+Created by Sunray_Vision
+Traduzione dei profili (Auto, Basic, Advanced, Cooler Booster) in valori dei registri EC
+"""
+
+import config
+from curves import CurveError, compile_curve, offset_curve
+
+# 1 = Auto, 2 = Basic, 3 = Advanced, 4 = Cooler Booster
+PROFILE_NAMES = ["Auto", "Basic", "Advanced", "Cooler Booster"]
+
+def profile_curve(profile_id: int, basic_offset: int = None):
+    """
+    Ritorna la curva [[CPU], [GPU]] del profilo (7 punti EC ciascuna, validati da curves.py),
+    oppure None se non ha curva (Cooler Booster).
+    `basic_offset` sostituisce BASIC_FAN_OFFSET di config.py (es. dal file di stato).
+    Solleva CurveError se la curva in config.py non è valida.
+    """
+    if basic_offset is None:
+        basic_offset = config.BASIC_FAN_OFFSET
+    if profile_id == 1:
+        curves = config.AUTO_FAN_CURVE
+    elif profile_id == 2:
+        # Basic = Auto con offset sui 7 punti compilati (qualunque sia la forma della curva Auto),
+        # clippato tra 0 e 150 e mai sotto i minimi di sicurezza
+        curves = [offset_curve(compile_curve(curve).points, basic_offset) for curve in config.AUTO_FAN_CURVE]
+    elif profile_id == 3:
+        curves = config.ADVANCED_FAN_CURVE
+    else:
+        return None
+    return [list(compile_curve(curve).points) for curve in curves]
+
+def profile_registers(profile_id: int, basic_offset: int = None):
+    """
+    Ritorna lo stato EC desiderato per il profilo come {indirizzo: valore},
+    oppure None se il profilo non è valido.
+    """
+    if profile_id not in (1, 2, 3, 4):
+        return None
+
+    if profile_id == 4:
+        # Le curve in modalità Cooler Booster sono gestite dal firmware.
+        return {config.EC_COOLER_BOOSTER_CONTROL_ADDR: config.EC_COOLER_BOOSTER_ON_VALUE}
+
+    registers = {
+        config.EC_COOLER_BOOSTER_CONTROL_ADDR: config.EC_COOLER_BOOSTER_OFF_VALUE,
+        config.EC_AUTO_ADV_CONTROL_ADDR:
+            config.EC_ADVANCED_VALUE if profile_id == 3 else config.EC_AUTO_VALUE,
+    }
+    try:
+        curve = profile_curve(profile_id, basic_offset)
+    except CurveError as e:
+        print(f"[ERRORE] Curva del profilo {PROFILE_NAMES[profile_id - 1]} non valida: {e}")
+        return None
+    for i in range(2):
+        for j in range(7):
+            registers[config.EC_FAN_CURVE_ADDRESSES[i][j]] = curve[i][j]
+    return registers
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Registrazione tracce
+Created by Sunray_Vision
+Registra con il tempo di ogni evento le letture EC, la batteria, il carico CPU, le richieste e le scritture del daemon
+"""
+
+import gzip
+import json
+import threading
+import time
+
+import config
+
+# Formato: una riga JSON per evento, {"t": secondi dall'avvio, "ev": tipo, ...}.
+#   start     prefs, page (pagina EC completa in esadecimale), config
+#   read      addr, data        lettura EC riuscita
+#   write     addr, data        scrittura EC riuscita
+#   load      value             carico CPU 0-1 (None se non disponibile)
+#   cpu_temps value             viste dei sensori hwmon [core più caldo, package, media pesata]
+#   load_profile value          [carico, pressione PSI] letti dal profilo automatico
+#   battery   value             livello batteria letto (0 = lettura fallita)
+#   ac        value             stato dell'alimentatore all'avvio
+#   power     events            uevent power_supply ({"battery": %, "ac_online": bool})
+#   state     changed           preferenze cambiate nel file di stato (o SIGHUP)
+#   command   cmd, value        richiesta di un client
+#   emergency engaged, restore  Cooler Booster acceso/spento dalla guardia termica
+#   stop                        inizio dell'arresto
+TRACE_VERSION = 1
+
+
+def _open(path: str, mode: str):
+    """I file .gz sono compressi: una giornata di traccia occupa pochi MB."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def config_snapshot() -> dict:
+    """Impostazioni di config.py salvate nella traccia, per segnalare differenze alla riproduzione."""
+    snapshot = {}
+    for name, value in vars(config).items():
+        if name.isupper():
+            try:
+                # Come verrà riletto dalla traccia (le tuple diventano liste).
+                snapshot[name] = json.loads(json.dumps(value))
+            except TypeError:
+                continue
+    return snapshot
+
+
+class TraceRecorder:
+    """
+    Scrive la traccia del daemon. Le letture e scritture EC arrivano dal thread dell'EC,
+    gli altri eventi dal loop: un lock serializza le righe.
+    """
+
+    def __init__(self, path: str, clock=time.monotonic):
+        self.path = path
+        self.clock = clock
+        self.file = _open(path, "w")
+        self.lock = threading.Lock()
+        self.origin = None
+        self.events = 0
+
+    def _write(self, kind: str, fields: dict):
+        if self.origin is None:
+            return
+        line = json.dumps(dict(t=round(self.clock() - self.origin, 6), ev=kind, **fields),
+                          separators=(",", ":"))
+        with self.lock:
+            if self.file is not None:
+                self.file.write(line + "\n")
+                self.events += 1
+
+    def start(self, prefs: dict, page: bytes):
+        """Primo evento: da qui parte il tempo della traccia."""
+        self.origin = self.clock()
+        self._write("start", {"version": TRACE_VERSION, "prefs": prefs, "page": page.hex(),
+                              "config": config_snapshot()})
+
+    def event(self, kind: str, **fields):
+        self._write(kind, fields)
+
+    def ec_read(self, byte_address: int, data: bytes):
+        self._write("read", {"addr": byte_address, "data": data.hex()})
+
+    def ec_write(self, byte_address: int, data: bytes):
+        self._write("write", {"addr": byte_address, "data": bytes(data).hex()})
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def load_trace(path: str):
+    """Eventi della traccia come lista di dict, in ordine di tempo."""
+    with _open(path, "r") as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    if not events or events[0].get("ev") != "start":
+        raise ValueError(f"{path} non è una traccia del daemon (manca l'evento start)")
+    if events[0].get("version") != TRACE_VERSION:
+        raise ValueError(f"{path}: versione traccia {events[0].get('version')} non supportata")
+    events.sort(key=lambda e: e["t"])  # le righe dei due thread possono essere fuori ordine di poco
+    return events
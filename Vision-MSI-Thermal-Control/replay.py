@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Riproduzione tracce
+Created by Sunray_Vision
+Esegue il daemon su una traccia registrata con un orologio virtuale e confronta le scritture EC con quelle originali
+
+Uso:
+    sudo python3 fan_daemon.py --record traccia.jsonl.gz   # registrazione (Ctrl+C per terminare)
+    python3 replay.py traccia.jsonl.gz                     # riproduzione e confronto
+    python3 replay.py traccia.jsonl.gz --verbose           # mostra anche l'output del daemon
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import selectors
+import sys
+import time
+from bisect import bisect_right
+from collections import deque
+
+import ec
+from battery import set_monitor
+from cpu_sensors import CpuTemps
+from ec import EC_PAGE_SIZE, ECDevice
+from fan_daemon import Daemon
+from recorder import config_snapshot, load_trace
+
+# Una lettura del daemon riprodotto corrisponde a quella registrata allo stesso indirizzo se
+# dista meno di MATCH_WINDOW secondi (la registrazione include i ritardi reali dei thread).
+# Deve restare sotto metà dell'intervallo minimo di campionamento (TEMP_POLL).
+MATCH_WINDOW = 0.1
+
+# Differenze mostrate al massimo nel riepilogo.
+MAX_DIFFERENCES = 20
+
+
+# ----------------------------
+#   Orologio e loop virtuali
+# ----------------------------
+
+class VirtualClock:
+    """Tempo della riproduzione in secondi dall'inizio della traccia."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class VirtualSelector(selectors.DefaultSelector):
+    """
+    Selector che non dorme: se nessun descrittore è pronto, invece di attendere
+    `timeout` secondi fa avanzare l'orologio virtuale fino al prossimo timer del loop.
+    """
+
+    def __init__(self, clock: VirtualClock):
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout=None):
+        events = super().select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            raise RuntimeError("riproduzione bloccata: nessun timer in programma")
+        self.clock.now += timeout
+        return []
+
+
+class VirtualLoop(asyncio.SelectorEventLoop):
+    def __init__(self, clock: VirtualClock):
+        super().__init__(VirtualSelector(clock))
+        self.clock = clock
+
+    def time(self) -> float:
+        return self.clock.now
+
+
+# ----------------------------
+#   Ingressi dalla traccia
+# ----------------------------
+
+class TraceSeries:
+    """Valori registrati nel tempo: `at(t)` ritorna l'ultimo letto entro t."""
+
+    def __init__(self):
+        self.times = []
+        self.values = []
+
+    def add(self, t: float, value):
+        self.times.append(t)
+        self.values.append(value)
+
+    def at(self, now: float):
+        i = bisect_right(self.times, now + MATCH_WINDOW) - 1
+        return self.values[i] if i >= 0 else None
+
+
+class ReplayEC(ECDevice):
+    """
+    Pagina EC ricostruita dalla traccia. Le letture registrate aggiornano solo i byte
+    cambiati dal firmware (sensori, o registri modificati dall'EC stesso): i registri scritti
+    dal daemon riprodotto restano quelli che ha scritto lui, anche se diversi dall'originale.
+    Quando una lettura corrisponde a una registrata, l'orologio avanza al suo istante:
+    così i ritardi reali della registrazione non si accumulano nella riproduzione.
+    """
+
+    def __init__(self, events, clock: VirtualClock):
+        super().__init__(path="<traccia>")
+        self.clock = clock
+        self.page = bytearray.fromhex(events[0]["page"])
+        self.recorded = bytearray(self.page)  # pagina come la vedeva il daemon registrato
+        self.timeline = [(e["t"], e["ev"], e["addr"], bytes.fromhex(e["data"]))
+                         for e in events if e["ev"] in ("read", "write")]
+        self.position = 0
+        self.reads = {}
+        for t, kind, addr, data in self.timeline:
+            if kind == "read":
+                self.reads.setdefault((addr, len(data)), []).append(t)
+        self.next_read = dict.fromkeys(self.reads, 0)
+        self.matched = 0
+        self.writes = []  # [(t, indirizzo, bytes)] del daemon riprodotto
+
+    def open(self):
+        if self.fd is None:
+            self.fd = -1
+            self.writable = True
+        return self
+
+    def close(self):
+        self.fd = None
+
+    def _advance(self, now: float):
+        while self.position < len(self.timeline) and self.timeline[self.position][0] <= now:
+            _, kind, addr, data = self.timeline[self.position]
+            self.position += 1
+            if kind == "write":
+                self.recorded[addr:addr + len(data)] = data
+                continue
+            for offset, value in enumerate(data):
+                if self.recorded[addr + offset] != value:
+                    self.recorded[addr + offset] = value
+                    self.page[addr + offset] = value
+
+    def _match(self, key, now: float):
+        """Istante della lettura registrata corrispondente (None se non c'è)."""
+        times = self.reads.get(key)
+        if times is None:
+            return None
+        i = self.next_read[key]
+        while i < len(times) and times[i] < now - MATCH_WINDOW:
+            i += 1
+        match = None
+        if i < len(times) and times[i] <= now + MATCH_WINDOW:
+            match = times[i]
+            i += 1
+        self.next_read[key] = i
+        return match
+
+    def _pread(self, byte_address: int, size: int) -> bytes:
+        self.open()
+        if byte_address < 0 or byte_address + size > EC_PAGE_SIZE:
+            raise OSError(f"lettura EC fuori pagina a {hex(byte_address)}")
+        match = self._match((byte_address, size), self.clock.now)
+        if match is not None:
+            self.matched += 1
+            self.clock.now = max(self.clock.now, match)
+        self._advance(self.clock.now)
+        return bytes(self.page[byte_address:byte_address + size])
+
+    def _pwrite(self, byte_address: int, data: bytes):
+        self.open()
+        if byte_address < 0 or byte_address + len(data) > EC_PAGE_SIZE:
+            raise OSError(f"scrittura EC fuori pagina a {hex(byte_address)}")
+        self.writes.append((self.clock.now, byte_address, bytes(data)))
+        self.page[byte_address:byte_address + len(data)] = data
+
+
+class ReplayBattery:
+    """Al posto di BatteryMonitor: livelli e alimentatore letti durante la registrazione."""
+
+    def __init__(self, levels: TraceSeries, ac_online, clock: VirtualClock):
+        self.levels = levels
+        self.clock = clock
+        self.capacity = None
+        self.ac_online = ac_online
+
+    def read_capacity(self):
+        value = self.levels.at(self.clock.now) or 0
+        if value:
+            self.capacity = value
+        return value
+
+    def read_ac_online(self):
+        return self.ac_online
+
+    def read_events(self):
+        return {}
+
+    def fileno(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class ReplayLoad:
+    """Al posto di CpuLoad: il carico registrato."""
+
+    def __init__(self, series: TraceSeries, clock: VirtualClock):
+        self.series = series
+        self.clock = clock
+
+    def read(self):
+        return self.series.at(self.clock.now)
+
+    def close(self):
+        pass
+
+
+class ReplayLoadSampler:
+    """Al posto di LoadSampler: carico e pressione letti dal profilo automatico."""
+
+    def __init__(self, series: TraceSeries, clock: VirtualClock):
+        self.series = series
+        self.clock = clock
+
+    def read(self):
+        value = self.series.at(self.clock.now)
+        return tuple(value) if value is not None else (None, None)
+
+    def close(self):
+        pass
+
+
+class ReplayCpuSensors:
+    """Al posto di CpuSensors: le viste dei sensori hwmon registrate."""
+
+    def __init__(self, series: TraceSeries, clock: VirtualClock):
+        self.series = series
+        self.clock = clock
+
+    def __len__(self):
+        return len(self.series.times)
+
+    def read(self):
+        value = self.series.at(self.clock.now)
+        return CpuTemps(*value) if value is not None else None
+
+    def close(self):
+        pass
+
+
+class ReplayState:
+    """Al posto di StateWatcher: le modifiche del file di stato arrivano dalla traccia."""
+
+    def __init__(self, prefs: dict):
+        self.current = dict(prefs)
+
+    def fileno(self):
+        return None
+
+    def acknowledge(self, state: dict):
+        self.current = dict(state)
+
+    def changes(self) -> dict:
+        return {}
+
+    def close(self):
+        pass
+
+
+# ----------------------------
+#   Daemon riprodotto
+# ----------------------------
+
+class ReplayDaemon(Daemon):
+    """
+    Il daemon vero, con EC, batteria, carico CPU e file di stato sostituiti dalla traccia.
+    L'I/O viene eseguito subito nel loop invece che nei thread: con l'orologio virtuale
+    ogni esecuzione è deterministica e non attende mai il tempo reale.
+    """
+
+    def __init__(self, events, clock: VirtualClock):
+        start = events[0]
+        levels, load, cpu_temps, load_profile = TraceSeries(), TraceSeries(), TraceSeries(), TraceSeries()
+        ac_online = None
+        self.inputs = []
+        for event in events:
+            kind = event["ev"]
+            if kind == "battery":
+                levels.add(event["t"], event["value"])
+            elif kind == "load":
+                load.add(event["t"], event["value"])
+            elif kind == "cpu_temps":
+                cpu_temps.add(event["t"], event["value"])
+            elif kind == "load_profile":
+                load_profile.add(event["t"], event["value"])
+            elif kind == "ac" and ac_online is None:
+                ac_online = event["value"]
+            elif kind in ("state", "power", "command", "emergency"):
+                self.inputs.append(event)
+        self.end = next((e["t"] for e in events if e["ev"] == "stop"), events[-1]["t"])
+
+        self.replay_device = ReplayEC(events, clock)
+        ec.set_device(self.replay_device)
+        set_monitor(ReplayBattery(levels, ac_online, clock))
+        super().__init__(clock=clock)
+        self.watcher.close()
+        self.watcher = ReplayState(start["prefs"])
+        self.prefs = dict(start["prefs"])
+        self.cpu_load = ReplayLoad(load, clock)
+        if self.load_sampler is not None:
+            self.load_sampler.close()
+            self.load_sampler = ReplayLoadSampler(load_profile, clock)
+        self.cpu_sensors.close()
+        self.cpu_sensors = ReplayCpuSensors(cpu_temps, clock)
+        self.replies = []
+
+    def ec(self, func, *args):
+        future = self.loop.create_future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    io = ec
+
+    async def persist(self, updates):
+        self.watcher.acknowledge(dict(self.watcher.current, **updates))
+
+    def start_watchdog(self):
+        pass  # gli interventi della guardia arrivano dalla traccia (evento emergency)
+
+    async def open_endpoints(self):
+        pass  # niente storico, socket, metriche o segnali durante la riproduzione
+
+    def services(self):
+        services = [self.sample_sensors, self.poll_battery, self.run_commands, self.verify_registers,
+                    self.replay_inputs]
+        if self.load_profiles is not None:
+            services.append(self.schedule_profiles)
+        return services
+
+    async def sleep_until(self, t: float):
+        await asyncio.sleep(max(0.0, t - self.clock()))
+
+    async def replay_inputs(self):
+        """Modifiche allo stato, uevent, richieste dei client e guardia termica agli istanti registrati."""
+        for event in self.inputs:
+            await self.sleep_until(event["t"])
+            if event["ev"] == "state":
+                await self.apply_preferences(event["changed"])
+            elif event["ev"] == "power":
+                self.on_power_events(event["events"])
+            elif event["ev"] == "emergency":
+                self.on_emergency(event["engaged"], event["restore"])
+            else:
+                self.commands.submit(event["cmd"], event["value"], self.replies.append)
+                self.commands_ready.set()
+        await self.sleep_until(self.end)
+        self.stopping.set()
+
+
+def replay(events, verbose: bool = False):
+    """Esegue la traccia e ritorna le scritture del daemon riprodotto [(t, indirizzo, bytes)]."""
+    clock = VirtualClock()
+    loop = VirtualLoop(clock)
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    try:
+        with output:
+            daemon = ReplayDaemon(events, clock)
+            loop.run_until_complete(daemon.run())
+    finally:
+        loop.close()
+    return daemon.replay_device.writes
+
+
+# ----------------------------
+#   Confronto
+# ----------------------------
+
+def recorded_writes(events):
+    return [(e["t"], e["addr"], bytes.fromhex(e["data"])) for e in events if e["ev"] == "write"]
+
+def compare_writes(recorded, replayed, tolerance: float):
+    """
+    Abbina ogni scrittura registrata alla prima riprodotta con stesso indirizzo e stessi dati
+    entro `tolerance` secondi. L'ordine tra scritture quasi simultanee non conta: nella
+    registrazione i task concorrenti (es. soglia batteria e profilo) si alternano a caso.
+    Ritorna corrispondenze, scarto di tempo massimo e differenze [(tipo, t, indirizzo, bytes)].
+    """
+    pending = {}  # (indirizzo, dati) -> scritture riprodotte non ancora abbinate
+    for write in replayed:
+        pending.setdefault(write[1:], deque()).append(write)
+    matched, max_skew, differences = 0, 0.0, []
+    for t, addr, data in recorded:
+        candidates = pending.get((addr, data))
+        while candidates and candidates[0][0] < t - tolerance:
+            differences.append(("in più", *candidates.popleft()))
+        if candidates and candidates[0][0] <= t + tolerance:
+            max_skew = max(max_skew, abs(candidates.popleft()[0] - t))
+            matched += 1
+        else:
+            differences.append(("mancante", t, addr, data))
+    for candidates in pending.values():
+        differences.extend(("in più", *write) for write in candidates)
+    differences.sort(key=lambda d: d[1])
+    return {"recorded": len(recorded), "replayed": len(replayed), "matched": matched,
+            "max_skew": max_skew, "differences": differences}
+
+def _format_write(t, addr, data):
+    return f"{t:.3f}s {hex(addr)} <- {data.hex()}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Riproduce una traccia del daemon e confronta le scritture EC")
+    parser.add_argument("trace", help="traccia registrata con fan_daemon.py --record")
+    parser.add_argument("--tolerance", type=float, default=1.0,
+                        help="scarto massimo (s) tra una scrittura registrata e quella riprodotta")
+    parser.add_argument("--verbose", action="store_true", help="mostra l'output del daemon riprodotto")
+    parser.add_argument("--json", action="store_true", help="stampa il riepilogo in JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        events = load_trace(args.trace)
+    except (OSError, ValueError) as e:
+        print(f"[REPLAY] Impossibile leggere {args.trace}: {e}", file=sys.stderr)
+        return 2
+
+    recorded_config = events[0].get("config", {})
+    for name, value in config_snapshot().items():
+        if name in recorded_config and recorded_config[name] != value \
+                and not name.endswith(("_FILE", "_SOCKET")):
+            print(f"[REPLAY] {name} diverso dalla registrazione: {recorded_config[name]!r} -> {value!r}")
+
+    start = time.perf_counter()
+    replayed = replay(events, args.verbose)
+    elapsed = time.perf_counter() - start
+    duration = events[-1]["t"]
+    result = compare_writes(recorded_writes(events), replayed, args.tolerance)
+
+    if args.json:
+        summary = dict(result, duration=duration, elapsed=elapsed,
+                       differences=[{"kind": kind, "t": t, "addr": addr, "data": data.hex()}
+                                    for kind, t, addr, data in result["differences"]])
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+    else:
+        print(f"[REPLAY] {duration:.1f}s di traccia ({len(events)} eventi) riprodotti in {elapsed:.2f}s "
+              f"({duration / max(elapsed, 1e-9):.0f}x il tempo reale)")
+        print(f"[REPLAY] Scritture: {result['recorded']} registrate, {result['replayed']} riprodotte, "
+              f"{result['matched']} corrispondenti (scarto massimo {result['max_skew']:.3f}s)")
+        for kind, t, addr, data in result["differences"][:MAX_DIFFERENCES]:
+            print(f"  [{kind}] {_format_write(t, addr, data)}")
+        if len(result["differences"]) > MAX_DIFFERENCES:
+            print(f"  ... altre {len(result['differences']) - MAX_DIFFERENCES} differenze")
+        if not result["differences"]:
+            print("[REPLAY] OK: il daemon riprodotto ha fatto le stesse scritture, entro la tolleranza.")
+    return 1 if result["differences"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Campionamento adattivo
+Created by Sunray_Vision
+Intervalli di lettura che si accorciano quando un valore cambia in fretta e si allungano quando è stabile
+"""
+
+import time
+
+
+class AdaptiveSchedule:
+    """
+    Intervallo di campionamento di un singolo sensore.
+    Dopo ogni lettura `observe` stima la velocità di variazione (unità/s):
+        - sopra `fast_rate`        -> intervallo minimo
+        - sopra `fast_rate / 4`    -> intervallo dimezzato
+        - altrimenti (stabile)     -> intervallo moltiplicato per `backoff`, fino al massimo
+    """
+
+    def __init__(self, min_interval: float, max_interval: float, fast_rate: float,
+                 backoff: float = 1.5):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.fast_rate = fast_rate
+        self.backoff = backoff
+        self.interval = min_interval
+        self.last_value = None
+        self.last_time = None
+        self.next_time = 0.0
+
+    def observe(self, value: float, now: float) -> float:
+        """Registra una lettura e ritorna il nuovo intervallo."""
+        if self.last_value is not None and now > self.last_time:
+            rate = abs(value - self.last_value) / (now - self.last_time)
+            if rate >= self.fast_rate:
+                self.interval = self.min_interval
+            elif rate >= self.fast_rate / 4:
+                self.interval = max(self.min_interval, self.interval / 2)
+            else:
+                self.interval = min(self.max_interval, self.interval * self.backoff)
+        self.last_value = value
+        self.last_time = now
+        self.next_time = now + self.interval
+        return self.interval
+
+
+class Scheduler:
+    """Insieme di AdaptiveSchedule con nome: dice quali sensori leggere e quanto dormire."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.schedules = {}
+
+    def add(self, name: str, schedule: AdaptiveSchedule):
+        self.schedules[name] = schedule
+        return schedule
+
+    def due(self):
+        """Nomi dei sensori da leggere adesso."""
+        now = self.clock()
+        return [name for name, s in self.schedules.items() if s.next_time <= now]
+
+    def observe(self, name: str, value: float):
+        return self.schedules[name].observe(value, self.clock())
+
+    def postpone(self, name: str):
+        """Lettura fallita: riprova dopo l'intervallo corrente senza modificarlo."""
+        schedule = self.schedules[name]
+        schedule.next_time = self.clock() + schedule.interval
+
+    def time_to_next(self) -> float:
+        if not self.schedules:
+            return float('inf')
+        return max(0.0, min(s.next_time for s in self.schedules.values()) - self.clock())
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Stato utente
+Created by Sunray_Vision
+Preferenze utente in un piccolo file JSON scritto in modo atomico e osservato con inotify dal daemon
+"""
+
+import ctypes
+import ctypes.util
+import json
+import os
+import struct
+
+import config
+
+# Le preferenze modificabili dall'utente. I valori di config.py fanno da default
+# finché il file di stato non esiste (prima esecuzione).
+DEFAULTS = {
+    "fan_profile": config.DEFAULT_FAN_PROFILE,
+    "battery_threshold": config.BATTERY_CHARGE_THRESHOLD,
+    "basic_fan_offset": config.BASIC_FAN_OFFSET,
+}
+
+# Valori ammessi per ogni campo.
+LIMITS = {
+    "fan_profile": range(1, 5),
+    "battery_threshold": range(50, 101),
+    "basic_fan_offset": range(-150, 151),
+}
+
+
+def validate(state: dict) -> dict:
+    """Ritorna solo i campi conosciuti e validi; quelli mancanti o errati prendono il default."""
+    clean = dict(DEFAULTS)
+    for key, value in state.items():
+        if key in LIMITS and isinstance(value, int) and value in LIMITS[key]:
+            clean[key] = value
+        elif key in LIMITS:
+            print(f"[STATO] Valore non valido per {key}: {value!r}, uso {clean[key]}")
+    return clean
+
+
+def load_state(path: str = config.STATE_FILE) -> dict:
+    try:
+        with open(path) as f:
+            return validate(json.load(f))
+    except FileNotFoundError:
+        return dict(DEFAULTS)
+    except (OSError, ValueError) as e:
+        print(f"[STATO] Impossibile leggere {path}: {e}. Uso i valori predefiniti.")
+        return dict(DEFAULTS)
+
+
+def save_state(updates: dict, path: str = config.STATE_FILE) -> dict:
+    """
+    Aggiorna i campi indicati e riscrive il file in modo atomico: file temporaneo nella
+    stessa cartella, fsync, rename. Un crash a metà scrittura lascia il file precedente intatto.
+    Ritorna lo stato completo salvato.
+    """
+    state = load_state(path)
+    state.update(updates)
+    state = validate(state)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+        f.write("\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    return state
+
+
+# ----------------------------
+#   Osservazione con inotify
+# ----------------------------
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class StateWatcher:
+    """
+    Osserva il file di stato e riporta solo i campi cambiati rispetto all'ultimo stato noto.
+    Si osserva la cartella (non il file) perché il rename atomico sostituisce l'inode.
+    Senza inotify si ripiega sul confronto della data di modifica ad ogni `changes()`.
+    """
+
+    def __init__(self, path: str = config.STATE_FILE):
+        self.path = path
+        self.name = os.path.basename(path).encode()
+        self.current = load_state(path)
+        self.fd = None
+        self.mtime = self._mtime()
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1")
+            directory = os.path.dirname(os.path.abspath(path)).encode()
+            if libc.inotify_add_watch(fd, directory, IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+                os.close(fd)
+                raise OSError(ctypes.get_errno(), "inotify_add_watch")
+            self.fd = fd
+        except (OSError, AttributeError) as e:
+            print(f"[STATO] inotify non disponibile ({e}), controllo per data di modifica.")
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def _touched(self) -> bool:
+        if self.fd is None:
+            mtime = self._mtime()
+            touched, self.mtime = mtime != self.mtime, mtime
+            return touched
+        touched = False
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except BlockingIOError:
+                return touched
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length]
+                if name.rstrip(b"\0") == self.name:
+                    touched = True
+                offset += _EVENT_HEADER.size + length
+
+    def acknowledge(self, state: dict):
+        """Registra uno stato già applicato (es. salvato dal daemon stesso) per non riapplicarlo."""
+        self.current = dict(state)
+
+    def changes(self) -> dict:
+        """Ritorna {campo: nuovo_valore} per i campi modificati dall'ultima chiamata."""
+        if not self._touched():
+            return {}
+        new = load_state(self.path)
+        changed = {key: value for key, value in new.items() if self.current.get(key) != value}
+        self.current = new
+        return changed
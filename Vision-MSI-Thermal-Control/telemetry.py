@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Telemetria
+Created by Sunray_Vision
+Storico a memoria fissa di temperature, RPM, batteria e profilo su buffer circolari a livelli (1 s, 1 min, 1 h)
+"""
+
+import math
+import time
+from array import array
+
+# Colonne dello storico, una per segnale.
+SIGNALS = ("cpu_temp", "gpu_temp", "cpu_rpm", "gpu_rpm", "battery", "profile", "ac_online", "cpu_load",
+           "cpu_core_temp")
+
+# Livelli di aggregazione: (durata bucket in secondi, numero di bucket).
+# 512 s di dettaglio al secondo, ~17 ore al minuto, ~21 giorni all'ora.
+TIERS = ((1, 512), (60, 1024), (3600, 512))
+
+# Segnali e finestre (secondi) del riepilogo inviato con le statistiche del daemon (--stats, SIGUSR1).
+SUMMARY_SIGNALS = ("cpu_temp", "gpu_temp", "cpu_rpm", "gpu_rpm", "cpu_load")
+SUMMARY_WINDOWS = (60, 3600, 86400)
+
+# I valori sono memorizzati come interi a 16 bit: fuori da questo range vengono clippati.
+VALUE_MIN, VALUE_MAX = -32768, 32767
+
+
+class _Column:
+    """Alberi di segmenti (min, max, somma, conteggio) su un buffer circolare di `size` bucket."""
+    __slots__ = ("size", "mn", "mx", "sum", "count")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.mn = array('h', [VALUE_MAX]) * (2 * size)
+        self.mx = array('h', [VALUE_MIN]) * (2 * size)
+        self.sum = array('q', [0]) * (2 * size)
+        self.count = array('I', [0]) * (2 * size)
+
+    def _fix_up(self, i: int):
+        mn, mx, sm, ct = self.mn, self.mx, self.sum, self.count
+        i >>= 1
+        while i:
+            l, r = 2 * i, 2 * i + 1
+            mn[i] = mn[l] if mn[l] < mn[r] else mn[r]
+            mx[i] = mx[l] if mx[l] > mx[r] else mx[r]
+            sm[i] = sm[l] + sm[r]
+            ct[i] = ct[l] + ct[r]
+            i >>= 1
+
+    def add(self, slot: int, value: int):
+        i = slot + self.size
+        if value < self.mn[i]:
+            self.mn[i] = value
+        if value > self.mx[i]:
+            self.mx[i] = value
+        self.sum[i] += value
+        self.count[i] += 1
+        self._fix_up(i)
+
+    def clear(self, slot: int):
+        i = slot + self.size
+        if self.count[i]:
+            self.mn[i], self.mx[i], self.sum[i], self.count[i] = VALUE_MAX, VALUE_MIN, 0, 0
+            self._fix_up(i)
+
+    def query(self, lo: int, hi: int):
+        """Aggrega i bucket [lo, hi) in O(log n): ritorna (min, max, somma, conteggio)."""
+        mn, mx, sm, ct = VALUE_MAX, VALUE_MIN, 0, 0
+        lo += self.size
+        hi += self.size
+        while lo < hi:
+            if lo & 1:
+                mn = min(mn, self.mn[lo]); mx = max(mx, self.mx[lo])
+                sm += self.sum[lo]; ct += self.count[lo]
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                mn = min(mn, self.mn[hi]); mx = max(mx, self.mx[hi])
+                sm += self.sum[hi]; ct += self.count[hi]
+            lo >>= 1
+            hi >>= 1
+        return mn, mx, sm, ct
+
+    def bucket_mean(self, slot: int):
+        i = slot + self.size
+        return self.sum[i] / self.count[i] if self.count[i] else None
+
+
+class _Tier:
+    """Un livello di aggregazione: `capacity` bucket da `resolution` secondi."""
+
+    def __init__(self, resolution: int, capacity: int, signals):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.size = 1 << (capacity - 1).bit_length()  # potenza di 2 per gli alberi
+        self.columns = {name: _Column(self.size) for name in signals}
+        self.last_bucket = None
+
+    @property
+    def span(self) -> int:
+        return self.resolution * self.capacity
+
+    def _advance(self, bucket: int):
+        """Svuota gli slot dei bucket saltati (o scaduti) fino a `bucket` compreso."""
+        if self.last_bucket is None:
+            first = bucket
+        elif bucket <= self.last_bucket:
+            return
+        else:
+            first = max(self.last_bucket + 1, bucket - self.capacity + 1)
+        for b in range(first, bucket + 1):
+            slot = b % self.capacity
+            for column in self.columns.values():
+                column.clear(slot)
+        self.last_bucket = bucket
+
+    def add(self, ts: float, values: dict):
+        bucket = int(ts // self.resolution)
+        self._advance(bucket)
+        if bucket <= self.last_bucket - self.capacity:
+            return  # campione più vecchio dello storico di questo livello
+        slot = bucket % self.capacity
+        for name, value in values.items():
+            self.columns[name].add(slot, value)
+
+    def first_bucket(self, start: float) -> int:
+        """
+        Primo bucket ancora nello storico che contiene campioni da `start` in poi: anche quello
+        coperto solo in parte, altrimenti i campioni all'inizio della finestra andrebbero persi.
+        """
+        return max(int(start // self.resolution), self.last_bucket - self.capacity + 1)
+
+    def slot_ranges(self, start: float, end: float):
+        """Intervalli di slot [lo, hi) che coprono i bucket tra `start` ed `end` (massimo 2 per il giro)."""
+        if self.last_bucket is None:
+            return []
+        first = self.first_bucket(start)
+        last = min(int(end // self.resolution), self.last_bucket)
+        if first > last:
+            return []
+        lo, hi = first % self.capacity, last % self.capacity
+        if lo <= hi:
+            return [(lo, hi + 1)]
+        return [(lo, self.capacity), (0, hi + 1)]
+
+
+class TelemetryStore:
+    """
+    Storico telemetria a memoria costante (qualche centinaio di KB, indipendente dall'uptime).
+
+    Ogni campione viene aggregato subito nei bucket correnti di tutti i livelli. Le query
+    usano il livello più fine che copre la finestra richiesta:
+        min / max / media  -> O(log n) sugli alberi di segmenti
+        percentili         -> ordinamento delle medie dei bucket nella finestra (al più qualche centinaio)
+    """
+
+    def __init__(self, signals=SIGNALS, tiers=TIERS, clock=time.time):
+        self.signals = tuple(signals)
+        self.tiers = [_Tier(resolution, capacity, self.signals) for resolution, capacity in tiers]
+        self.clock = clock
+        self.latest = {}
+
+    def record(self, ts: float = None, **values):
+        """Registra un campione. Si possono passare solo i segnali disponibili in quel momento."""
+        if ts is None:
+            ts = self.clock()
+        clipped = {}
+        for name, value in values.items():
+            if name not in self.signals:
+                raise KeyError(f"segnale sconosciuto: {name}")
+            if value is None:
+                continue
+            clipped[name] = max(VALUE_MIN, min(VALUE_MAX, int(value)))
+            self.latest[name] = value
+        for tier in self.tiers:
+            tier.add(ts, clipped)
+
+    def _tier_for(self, window: float):
+        for tier in self.tiers:
+            if tier.span >= window:
+                return tier
+        return self.tiers[-1]
+
+    def stats(self, signal: str, window: float = None, end: float = None):
+        """
+        Statistiche di `signal` negli ultimi `window` secondi (tutto lo storico se None).
+        Ritorna un dict con min, max, avg e count, oppure None se non ci sono campioni.
+        """
+        end = self.clock() if end is None else end
+        tier = self.tiers[-1] if window is None else self._tier_for(window)
+        start = end - (window if window is not None else tier.span)
+        column = tier.columns[signal]
+
+        mn, mx, sm, ct = VALUE_MAX, VALUE_MIN, 0, 0
+        for lo, hi in tier.slot_ranges(start, end):
+            q_mn, q_mx, q_sm, q_ct = column.query(lo, hi)
+            mn, mx, sm, ct = min(mn, q_mn), max(mx, q_mx), sm + q_sm, ct + q_ct
+        if not ct:
+            return None
+        return {"min": mn, "max": mx, "avg": sm / ct, "count": ct}
+
+    def series(self, signal: str, window: float, end: float = None):
+        """Medie per bucket [(inizio_bucket, media)] del livello più fine che copre la finestra."""
+        end = self.clock() if end is None else end
+        tier = self._tier_for(window)
+        column = tier.columns[signal]
+        first = tier.first_bucket(end - window) if tier.last_bucket is not None else 0
+        points = []
+        for lo, hi in tier.slot_ranges(end - window, end):
+            for slot in range(lo, hi):
+                mean = column.bucket_mean(slot)
+                if mean is not None:
+                    # Ricostruisce il bucket assoluto dallo slot
+                    bucket = first + (slot - first) % tier.capacity
+                    points.append((bucket * tier.resolution, mean))
+        return points
+
+    def percentile(self, signal: str, q: float, window: float, end: float = None):
+        """Percentile `q` (0-100) delle medie dei bucket nella finestra, o None se vuota."""
+        values = sorted(mean for _, mean in self.series(signal, window, end))
+        if not values:
+            return None
+        k = (len(values) - 1) * q / 100
+        lo, hi = math.floor(k), math.ceil(k)
+        return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+    def summary(self, signals=SUMMARY_SIGNALS, windows=SUMMARY_WINDOWS, end: float = None):
+        """
+        {segnale: {finestra in secondi (stringa, per JSON): statistiche con p95}} per le
+        finestre indicate; le finestre senza campioni vengono omesse.
+        """
+        end = self.clock() if end is None else end
+        result = {}
+        for signal in signals:
+            windows_stats = {}
+            for window in windows:
+                stats = self.stats(signal, window, end)
+                if stats is not None:
+                    stats["p95"] = self.percentile(signal, 95, window, end)
+                    windows_stats[str(window)] = stats
+            if windows_stats:
+                result[signal] = windows_stats
+        return result
+
+
+def _window_label(seconds: int) -> str:
+    return f"{seconds // 3600} h" if seconds >= 3600 else f"{seconds // 60} min"
+
+def format_summary(summary: dict) -> str:
+    """Testo leggibile da un dict di `TelemetryStore.summary()` (anche ricevuto dal daemon)."""
+    lines = ["[TELEMETRIA] Min / media / p95 / max per finestra"]
+    for signal, windows in summary.items():
+        parts = [f"{_window_label(int(window))}: {s['min']} / {s['avg']:.1f} / {s['p95']:.1f} / {s['max']}"
+                 for window, s in windows.items()]
+        lines.append(f"  {signal:<14} " + "; ".join(parts))
+    return "\n".join(lines)
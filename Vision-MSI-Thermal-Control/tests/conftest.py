@@ -0,0 +1,6 @@
+"""I moduli del progetto sono nella directory superiore, senza pacchetto."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,72 @@
+"""Sequenza della soglia batteria: passi, attese e nuovi tentativi."""
+
+import config
+from charge_threshold import THRESHOLD_RESET_VALUE, ThresholdSequence
+from ec_sim import SimulatedEC
+
+ADDR = config.EC_BATTERY_THRESHOLD_ADDR
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class StubbornEC(SimulatedEC):
+    """Ignora le prime `refuse` scritture della soglia, come un firmware che non le accetta."""
+
+    def __init__(self, refuse: int):
+        super().__init__(clock=lambda: 0.0)
+        self.refuse = refuse
+        self.written = []
+
+    def _pwrite(self, byte_address: int, data: bytes):
+        if byte_address <= ADDR < byte_address + len(data):
+            self.written.append(data[ADDR - byte_address])
+            if self.refuse > 0:
+                self.refuse -= 1
+                return
+        super()._pwrite(byte_address, data)
+
+
+def run(job, clock):
+    polls = 0
+    while not job.poll():
+        clock.now += job.time_to_next()
+        polls += 1
+        assert polls < 100
+    return job.result()
+
+
+def test_steps_with_dwell_between_them():
+    clock = Clock()
+    ec = StubbornEC(refuse=0)
+    job = ThresholdSequence(70, device=ec, clock=clock, dwell=1.0, retry_delay=0.2, max_attempts=5)
+    assert run(job, clock) == {"ok": True, "retries": 0}
+    assert ec.written == [198, THRESHOLD_RESET_VALUE, 198]
+    assert ec.page[ADDR] == 198
+    assert clock.now == 2.0
+
+
+def test_refused_write_is_retried_with_backoff():
+    clock = Clock()
+    ec = StubbornEC(refuse=2)
+    job = ThresholdSequence(60, device=ec, clock=clock, dwell=1.0, retry_delay=0.2, max_attempts=5)
+    result = run(job, clock)
+    assert result == {"ok": True, "retries": 2}
+    assert ec.written == [188, 188, 188, THRESHOLD_RESET_VALUE, 188]
+    assert abs(clock.now - (0.2 + 0.4 + 2.0)) < 1e-9
+    assert ec.stats.as_dict()["registers"][hex(ADDR)]["write"]["retries"] == 2
+
+
+def test_gives_up_after_max_attempts():
+    clock = Clock()
+    ec = StubbornEC(refuse=10)
+    job = ThresholdSequence(80, device=ec, clock=clock, dwell=1.0, retry_delay=0.2, max_attempts=3)
+    result = run(job, clock)
+    assert not result["ok"] and result["retries"] == 3
+    assert "3 tentativi" in result["error"]
+    assert job.time_to_next() == float('inf')
@@ -0,0 +1,77 @@
+"""Compilazione delle curve e profilo Basic (curva Auto con offset) per ogni forma di curva."""
+
+import pytest
+
+import config
+from curves import CurveError, compile_curve, offset_curve
+from profiles import profile_curve, profile_registers
+
+VALUES = [0, 40, 48, 56, 64, 72, 80]
+POINTS = [[0, 0], [50, 40], [90, 80]]
+LINEAR = {"type": "linear", "start": 40, "end": 90, "min": 0, "max": 80}
+POWER = {"type": "power", "start": 40, "end": 90, "min": 20, "max": 100, "exponent": 2}
+
+
+def test_values_compile_to_themselves():
+    assert compile_curve(VALUES).points == tuple(VALUES)
+
+
+def test_free_points_are_interpolated():
+    points = compile_curve(POINTS).points
+    assert points[0] == 0 and points[1] == 40 and points[-1] == 80
+    assert points[2] == 48  # 58 °C: 40 + 40 * 8 / 40
+
+
+def test_parametric_curves():
+    linear = compile_curve(LINEAR).points
+    assert linear[0] == 0 and linear[-1] == 80
+    assert list(linear) == sorted(linear)
+    power = compile_curve(POWER).points
+    assert power[0] == 20 and power[-1] == 100
+
+
+def test_table_lookup_matches_points():
+    curve = compile_curve(VALUES)
+    for temp, value in zip(config.FAN_CURVE_TEMPS, VALUES):
+        assert curve.lookup(temp) == value
+    assert curve.lookup(-5) == curve.table[0]
+    assert curve.lookup(500) == curve.table[-1]
+
+
+@pytest.mark.parametrize("spec", [
+    [0, 50, 40, 56, 64, 72, 80],         # non monotona
+    [0, 40, 48, 56, 64, 30, 80],         # sotto il minimo di sicurezza a 82 °C
+    [0, 40, 48, 56, 64, 72, 200],        # fuori range
+    [0, 40, 48],                         # numero di punti sbagliato
+    [[50, 40], [50, 60]],                # temperatura ripetuta
+    {"type": "cubic", "start": 0, "end": 1},
+    {"type": "linear", "start": 90, "end": 40},
+    "auto",
+])
+def test_invalid_curves_are_rejected(spec):
+    with pytest.raises(CurveError):
+        compile_curve(spec)
+
+
+def test_offset_is_clipped_and_keeps_safety_floor():
+    assert offset_curve(VALUES, 100) == [100, 140, 148, 150, 150, 150, 150]
+    lowered = offset_curve(VALUES, -60)
+    assert lowered[:5] == [0, 0, 0, 0, 4]
+    assert lowered[5] >= 40 and lowered[6] >= 50
+
+
+@pytest.mark.parametrize("spec", [VALUES, POINTS, LINEAR, POWER])
+def test_basic_offsets_every_curve_form(monkeypatch, spec):
+    monkeypatch.setattr(config, "AUTO_FAN_CURVE", [spec, spec])
+    auto = profile_curve(1)
+    basic = profile_curve(2, 5)
+    assert basic == [offset_curve(points, 5) for points in auto]
+    registers = profile_registers(2, 5)
+    for fan in range(2):
+        for point, addr in enumerate(config.EC_FAN_CURVE_ADDRESSES[fan]):
+            assert registers[addr] == basic[fan][point]
+
+
+def test_invalid_auto_curve_gives_no_registers(monkeypatch):
+    monkeypatch.setattr(config, "AUTO_FAN_CURVE", [{"type": "linear"}, VALUES])
+    assert profile_registers(2, 5) is None
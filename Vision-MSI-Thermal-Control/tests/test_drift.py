@@ -0,0 +1,56 @@
+"""Verifica dei registri attesi e riscrittura dei soli byte cambiati."""
+
+import config
+from drift import DriftMonitor
+from ec_sim import SimulatedEC
+
+CURVE = config.EC_FAN_CURVE_ADDRESSES[0]
+
+
+def make_monitor():
+    ec = SimulatedEC(clock=lambda: 0.0)
+    expected = dict(zip(CURVE, [0, 40, 48, 56, 64, 72, 80]))
+    expected[config.EC_BATTERY_THRESHOLD_ADDR] = 198
+    ec.apply(expected)
+    monitor = DriftMonitor(ec)
+    monitor.update(expected)
+    return ec, monitor
+
+
+def test_matching_registers_cost_one_read_per_block():
+    ec, monitor = make_monitor()
+    ec.reset_counters()
+    assert monitor.check() == []
+    assert ec.syscalls == 2 and ec.transactions == 8
+    assert monitor.checks == 1 and monitor.events == 0
+
+
+def test_changed_registers_are_rewritten():
+    ec, monitor = make_monitor()
+    ec.page[CURVE[2]] = 0       # es. il firmware ricarica la curva dopo un resume
+    ec.page[CURVE[3]] = 0
+    ec.page[config.EC_BATTERY_THRESHOLD_ADDR] = 0
+    assert monitor.check() == [CURVE[2], CURVE[3], config.EC_BATTERY_THRESHOLD_ADDR]
+    assert list(ec.page[CURVE[2]:CURVE[4]]) == [48, 56]
+    assert ec.page[config.EC_BATTERY_THRESHOLD_ADDR] == 198
+    assert monitor.events == 1 and monitor.rewritten == 3
+    assert monitor.check() == []
+
+
+def test_discarded_addresses_are_not_restored():
+    ec, monitor = make_monitor()
+    monitor.discard([config.EC_BATTERY_THRESHOLD_ADDR])
+    ec.page[config.EC_BATTERY_THRESHOLD_ADDR] = 228  # passo intermedio della sequenza soglia
+    assert monitor.check() == []
+    assert ec.page[config.EC_BATTERY_THRESHOLD_ADDR] == 228
+
+
+def test_failed_read_returns_none(monkeypatch):
+    ec, monitor = make_monitor()
+
+    def fail(byte_address, size):
+        raise OSError("EC non disponibile")
+
+    monkeypatch.setattr(ec, "_pread", fail)
+    assert monitor.check() is None
+    assert monitor.checks == 0
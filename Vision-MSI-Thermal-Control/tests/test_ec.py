@@ -0,0 +1,90 @@
+"""Blocchi di lettura, unione delle scritture e transazioni EC sul backend simulato."""
+
+import pytest
+
+import config
+from ec import ECSnapshot, SENSOR_BLOCKS, plan_writes, rpm_from_raw, runs
+from ec_sim import SimulatedEC
+
+
+def make_ec():
+    # Orologio fermo: il modello termico non cambia i byte. Già aperto: l'open non entra nei conteggi.
+    return SimulatedEC(clock=lambda: 0.0).open()
+
+
+def test_runs_merges_contiguous_addresses():
+    assert runs([0x75, 0x72, 0x73, 0x74, 0x90]) == [(0x72, 0x76), (0x90, 0x91)]
+    assert runs([0x10, 0x10]) == [(0x10, 0x11)]
+    assert runs([]) == []
+
+
+def test_runs_with_words_overlapping_blocks():
+    assert runs([0xc8, 0xca], 2) == [(0xc8, 0xcc)]
+    assert runs([0xc8, 0xc9], 2) == [(0xc8, 0xcb)]
+    assert runs(config.EC_RPM_ADDRESSES, 2) == [(0xc8, 0xcc)]
+
+
+def test_sensor_blocks_skip_the_bytes_in_between():
+    assert sum(end - start for start, end in SENSOR_BLOCKS) == 6
+
+
+def test_plan_writes_skips_unchanged_and_coalesces():
+    snap = ECSnapshot(bytes([1, 2, 3, 4, 5, 6]), base=0x70)
+    targets = {0x70: 1, 0x71: 9, 0x72: 9, 0x74: 5, 0x75: 8}
+    writes, changed = plan_writes(snap, targets)
+    assert writes == [(0x71, bytes([9, 9])), (0x75, bytes([8]))]
+    assert changed == {0x71: (2, 9), 0x72: (3, 9), 0x75: (6, 8)}
+
+
+def test_plan_writes_without_snapshot_writes_everything():
+    writes, changed = plan_writes(None, {0x10: 1, 0x11: 0x102, 0x20: 3})
+    assert writes == [(0x10, bytes([1, 2])), (0x20, bytes([3]))]
+    assert changed[0x11] == (None, 2)
+
+
+def test_read_registers_reads_only_the_blocks():
+    ec = make_ec()
+    ec.page[0x72:0x79] = bytes(range(7))
+    ec.page[0x8a] = 42
+    ec.reset_counters()
+    snap = ec.read_registers(config.EC_FAN_CURVE_ADDRESSES[0] + [0x8a])
+    assert ec.transactions == 8 and ec.syscalls == 2
+    assert snap.byte(0x75) == 3 and snap.byte(0x8a) == 42
+    with pytest.raises(IndexError):
+        snap.byte(0x80)
+
+
+def test_snapshot_word_across_blocks_needs_both_bytes():
+    snap = ECSnapshot.from_blocks([(0xc8, b"\x01\x02"), (0xca, b"\x03\x04")])
+    assert snap.word(0xc8) == 0x0102 and snap.word(0xca) == 0x0304
+    assert snap.word(0xc9) == 0x0203
+    with pytest.raises(IndexError):
+        snap.word(0xcb)
+
+
+def test_apply_writes_only_changed_bytes_and_verifies():
+    ec = make_ec()
+    ec.page[0x72:0x79] = bytes([0, 40, 48, 56, 64, 72, 80])
+    targets = dict(zip(config.EC_FAN_CURVE_ADDRESSES[0], [0, 40, 50, 60, 64, 72, 90]))
+    ec.reset_counters()
+    report = ec.apply(targets)
+    assert report.ok
+    assert report.runs == [(0x74, bytes([50, 60])), (0x78, bytes([90]))]
+    assert ec.transactions == 7 + 3  # lettura del blocco, poi i soli byte cambiati
+    assert ec.verify(targets) == []
+
+    ec.reset_counters()
+    assert not ec.apply(targets).changed
+    assert ec.transactions == 7
+
+
+def test_read_sensors_decodes_the_blocks():
+    ec = make_ec()
+    ec.page[0x68], ec.page[0x80] = 61, 55
+    raw = config.FAN_RPM_CALIBRATION_CONSTANT // 3000
+    ec.page[0xc8:0xcc] = raw.to_bytes(2, 'big') + bytes(2)
+    ec.reset_counters()
+    readings = ec.read_sensors()
+    assert (readings.cpu_temp, readings.gpu_temp) == (61, 55)
+    assert readings.cpu_rpm == rpm_from_raw(raw) and readings.gpu_rpm == 0
+    assert ec.transactions == 6
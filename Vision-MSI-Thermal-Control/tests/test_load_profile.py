@@ -0,0 +1,59 @@
+"""Profilo dal carico: finestre delle regole, permanenza minima e profilo applicato solo con override."""
+
+from load_profile import LoadProfileScheduler
+
+# Cooler Booster con carico >= 0.9 per 4 s; Advanced con carico >= 0.5 o pressione >= 0.2 per 2 s.
+RULES = [(4, 0.9, None, 4.0), (3, 0.5, 0.2, 2.0)]
+
+
+def make_scheduler(current=2):
+    return LoadProfileScheduler(rules=RULES, idle=2, min_dwell=10.0, current=current, now=0.0)
+
+
+def test_rule_needs_its_whole_window():
+    scheduler = make_scheduler()
+    assert scheduler.observe(0.0, 0.6, None) is None
+    assert scheduler.observe(1.0, 0.6, None) is None
+    assert scheduler.observe(2.0, 0.6, None) == 3
+    assert scheduler.observe(3.0, 0.1, 0.3) == 3     # la pressione tiene valida la regola
+    assert scheduler.observe(4.0, 0.1, 0.0) is None  # ricade su idle, che è il profilo attivo
+
+
+def test_observe_does_not_commit_until_override():
+    scheduler = make_scheduler()
+    for t in range(3):
+        proposal = scheduler.observe(float(t), 0.6, None)
+    assert proposal == 3 and scheduler.current == 2
+    # Scrittura fallita: il profilo viene proposto di nuovo alla lettura successiva.
+    assert scheduler.observe(3.0, 0.6, None) == 3
+    scheduler.override(3, 3.0)
+    assert scheduler.current == 3 and scheduler.switched == 3.0
+    assert scheduler.observe(4.0, 0.6, None) is None
+
+
+def test_hotter_profile_ignores_dwell():
+    scheduler = make_scheduler()
+    scheduler.override(3, 0.0)
+    for t in range(4):
+        assert scheduler.observe(float(t), 0.95, None) is None
+    assert scheduler.observe(4.0, 0.95, None) == 4
+
+
+def test_cooler_profile_waits_for_dwell():
+    scheduler = make_scheduler()
+    for t in range(3):
+        scheduler.observe(float(t), 0.6, None)
+    scheduler.override(3, 2.0)
+    # Il carico cala: si torna a idle solo 10 s dopo il cambio e dopo l'ultima volta che la regola valeva.
+    assert scheduler.observe(5.0, 0.6, None) is None
+    assert scheduler.observe(6.0, 0.0, None) is None
+    assert scheduler.observe(12.0, 0.0, None) is None
+    assert scheduler.observe(14.5, 0.0, None) is None
+    assert scheduler.observe(15.0, 0.0, None) == 2
+
+
+def test_manual_choice_holds_for_dwell():
+    scheduler = make_scheduler()
+    scheduler.override(4, 100.0)  # scelto da un client
+    assert scheduler.observe(105.0, 0.0, None) is None
+    assert scheduler.observe(110.0, 0.0, None) == 2
@@ -0,0 +1,41 @@
+"""Finestre delle query sullo storico a livelli."""
+
+from telemetry import TelemetryStore
+
+
+def make_store(samples, end):
+    store = TelemetryStore(clock=lambda: end)
+    for ts, value in samples:
+        store.record(ts=ts, cpu_temp=value)
+    return store
+
+
+def test_window_includes_the_partially_covered_first_bucket():
+    # Un campione a metà di ogni secondo: la finestra di 60 s ne deve contenere 60.
+    store = make_store([(800 + i + 0.5, 40 + i % 20) for i in range(200)], end=1000.0)
+    stats = store.stats("cpu_temp", 60)
+    assert stats["count"] == 60
+    assert stats["min"] == 40 and stats["max"] == 59
+
+
+def test_peak_at_window_start_is_not_lost():
+    samples = [(940.5, 90)] + [(941.5 + i, 50) for i in range(59)]
+    store = make_store(samples, end=1000.0)
+    assert store.stats("cpu_temp", 60)["max"] == 90
+    assert store.percentile("cpu_temp", 100, 60) == 90
+
+
+def test_series_and_percentile():
+    store = make_store([(i + 0.5, i) for i in range(100)], end=100.0)
+    series = store.series("cpu_temp", 10)
+    assert [t for t, _ in series] == list(range(90, 100))
+    assert store.percentile("cpu_temp", 50, 10) == 94.5
+
+
+def test_older_windows_use_coarser_tiers():
+    store = make_store([(i * 10.0, 60) for i in range(600)], end=6000.0)
+    stats = store.stats("cpu_temp", 3600)
+    assert stats["count"] == 360
+    summary = store.summary(signals=("cpu_temp",), windows=(60, 3600))
+    assert set(summary["cpu_temp"]) == {"60", "3600"}
+    assert summary["cpu_temp"]["3600"]["p95"] == 60
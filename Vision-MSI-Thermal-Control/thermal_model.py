@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Modello termico
+Created by Sunray_Vision
+Modello del primo ordine stimato online (minimi quadrati ricorsivi) per prevedere la temperatura qualche secondo avanti
+
+Valutazione su una traccia registrata (CSV con intestazione ts,cpu_temp,gpu_temp,cpu_rpm,gpu_rpm,cpu_load):
+    python3 thermal_model.py traccia.csv [--horizon 5]
+    python3 thermal_model.py --simulate 3600 [--save traccia.csv]   # traccia dall'EC simulato, riproducibile
+"""
+
+import argparse
+import csv
+import math
+import random
+import sys
+
+try:
+    import numpy as np
+except ImportError:  # NumPy è opzionale: senza, le stesse operazioni su liste (matrici 4x4)
+    np = None
+
+import config
+
+# Regressori del modello: [temperatura, carico CPU (0-1), ventola (migliaia di RPM), 1].
+PARAMETERS = 4
+
+# Passo di integrazione della previsione (secondi).
+PREDICTION_STEP = 0.5
+
+
+class RLS:
+    """
+    Minimi quadrati ricorsivi con fattore di oblio `forgetting`: i campioni più vecchi
+    pesano sempre meno, così il modello segue polvere, pasta termica e temperatura ambiente.
+    """
+
+    def __init__(self, size: int, forgetting: float = 0.99, initial_covariance: float = 1000.0):
+        self.size = size
+        self.forgetting = forgetting
+        self.max_trace = initial_covariance * size
+        if np is not None:
+            self.theta = np.zeros(size)
+            self.P = np.eye(size) * initial_covariance
+        else:
+            self.theta = [0.0] * size
+            self.P = [[initial_covariance if i == j else 0.0 for j in range(size)] for i in range(size)]
+        self.updates = 0
+
+    def predict(self, phi) -> float:
+        if np is not None:
+            return float(np.dot(self.theta, phi))
+        return sum(t * x for t, x in zip(self.theta, phi))
+
+    def update(self, phi, y: float):
+        lam = self.forgetting
+        if np is not None:
+            phi = np.asarray(phi, dtype=np.float64)
+            Pphi = self.P @ phi
+            gain = Pphi / (lam + phi @ Pphi)
+            self.theta = self.theta + gain * (y - self.theta @ phi)
+            self.P = (self.P - np.outer(gain, Pphi)) / lam
+            trace = float(np.trace(self.P))
+            if trace > self.max_trace:  # senza eccitazione l'oblio farebbe esplodere P
+                self.P *= self.max_trace / trace
+        else:
+            n = self.size
+            Pphi = [sum(self.P[i][j] * phi[j] for j in range(n)) for i in range(n)]
+            denom = lam + sum(phi[i] * Pphi[i] for i in range(n))
+            gain = [v / denom for v in Pphi]
+            error = y - self.predict(phi)
+            self.theta = [t + g * error for t, g in zip(self.theta, gain)]
+            self.P = [[(self.P[i][j] - gain[i] * Pphi[j]) / lam for j in range(n)] for i in range(n)]
+            trace = sum(self.P[i][i] for i in range(n))
+            if trace > self.max_trace:
+                scale = self.max_trace / trace
+                self.P = [[v * scale for v in row] for row in self.P]
+        self.updates += 1
+
+
+class ThermalModel:
+    """
+    Modello del primo ordine di un sensore: dT/dt = a*T + b*carico + c*ventola + d.
+    Si stima la derivata (non il valore al passo successivo), così il modello non dipende
+    dall'intervallo di campionamento, che è adattivo. La previsione integra il modello
+    tenendo fermi carico e ventola.
+    """
+
+    def __init__(self, forgetting: float = config.THERMAL_MODEL_FORGETTING, warmup: int = 30):
+        self.rls = RLS(PARAMETERS, forgetting)
+        self.warmup = warmup
+        self.last = None  # (t, temperatura, carico, ventola)
+
+    @staticmethod
+    def regressors(temp, load, rpm):
+        return [float(temp), float(load or 0.0), (rpm or 0) / 1000, 1.0]
+
+    @property
+    def ready(self) -> bool:
+        return self.rls.updates >= self.warmup
+
+    def observe(self, t: float, temp: float, load: float, rpm: int):
+        """Aggiunge una lettura: aggiorna il modello con la derivata dall'ultima lettura."""
+        if self.last is not None:
+            t0, temp0, load0, rpm0 = self.last
+            dt = t - t0
+            if dt > 0:
+                self.rls.update(self.regressors(temp0, load0, rpm0), (temp - temp0) / dt)
+        self.last = (t, temp, load, rpm)
+
+    def predict(self, horizon: float, temp: float = None, load: float = None, rpm: int = None) -> float:
+        """
+        Temperatura prevista tra `horizon` secondi (per default dall'ultima lettura).
+        Finché il modello non ha visto `warmup` campioni ritorna la temperatura attuale.
+        """
+        if self.last is not None:
+            temp = self.last[1] if temp is None else temp
+            load = self.last[2] if load is None else load
+            rpm = self.last[3] if rpm is None else rpm
+        if temp is None or not self.ready:
+            return temp
+        steps = max(1, int(math.ceil(horizon / PREDICTION_STEP)))
+        step = horizon / steps
+        for _ in range(steps):
+            temp += step * self.rls.predict(self.regressors(temp, load, rpm))
+        return temp
+
+
+# ----------------------------
+#   Valutazione su tracce registrate
+# ----------------------------
+
+def load_trace(path: str):
+    """Righe della traccia CSV come dict di float (campi vuoti = None)."""
+    with open(path, newline="") as f:
+        rows = []
+        for row in csv.DictReader(f):
+            rows.append({key: float(value) if value not in ("", None) else None
+                         for key, value in row.items()})
+    return rows
+
+def simulated_trace(duration: int = 3600, seed: int = 1, load_period: int = 300,
+                    loads=(0.1, 0.3, 0.9, 1.0, 0.5)):
+    """
+    Traccia di `duration` secondi (un campione al secondo) dall'EC simulato con il controllo
+    ventole reattivo: ogni `load_period` secondi il carico cambia a caso tra `loads`.
+    Stesso `seed`, stessa traccia.
+    """
+    from ec_sim import SimulatedEC
+    from fan_control import FanController
+
+    rng = random.Random(seed)
+    now = [0.0]
+    sim = SimulatedEC(clock=lambda: now[0])
+    controller = FanController(sim, clock=lambda: now[0], predictive=False)
+    controller.enable()
+    rows = []
+    load = None
+    for k in range(duration):
+        if k % load_period == 0:
+            load = rng.choice(loads)
+        sim.load = load
+        now[0] += 1.0
+        cpu_temp, gpu_temp, cpu_rpm, gpu_rpm = sim.read_sensors()
+        rows.append({"ts": now[0], "cpu_temp": cpu_temp, "gpu_temp": gpu_temp,
+                     "cpu_rpm": cpu_rpm, "gpu_rpm": gpu_rpm, "cpu_load": load})
+        controller.update([cpu_temp, gpu_temp], [cpu_rpm, gpu_rpm], load)
+    return rows
+
+def save_trace(path: str, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["ts", "cpu_temp", "gpu_temp", "cpu_rpm", "gpu_rpm", "cpu_load"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+def evaluate(rows, sensor: str = "cpu", horizon: float = 5.0):
+    """
+    Esegue il modello online lungo la traccia e confronta ogni previsione a `horizon`
+    secondi con la temperatura registrata, e con la previsione "persistenza" (nessuna variazione).
+    """
+    model = ThermalModel()
+    temp_key, rpm_key = f"{sensor}_temp", f"{sensor}_rpm"
+    rows = [r for r in rows if r.get("ts") is not None and r.get(temp_key) is not None]
+    predictions = []  # (istante obiettivo, previsione, temperatura al momento della previsione)
+    errors, baseline = [], []
+    target = 0
+    for row in rows:
+        model.observe(row["ts"], row[temp_key], row.get("cpu_load"), row.get(rpm_key))
+        if model.ready:
+            predictions.append((row["ts"] + horizon, model.predict(horizon), row[temp_key]))
+        # Confronta le previsioni il cui istante obiettivo è stato raggiunto.
+        while target < len(predictions) and predictions[target][0] <= row["ts"]:
+            _, predicted, current = predictions[target]
+            errors.append(predicted - row[temp_key])
+            baseline.append(current - row[temp_key])
+            target += 1
+
+    def summary(values):
+        if not values:
+            return None
+        return {
+            "mae": sum(abs(v) for v in values) / len(values),
+            "rmse": math.sqrt(sum(v * v for v in values) / len(values)),
+        }
+    return {"samples": len(errors), "model": summary(errors), "persistence": summary(baseline),
+            "parameters": [round(float(v), 4) for v in model.rls.theta]}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Valuta il modello termico su una traccia registrata")
+    parser.add_argument("trace", nargs="?", help="CSV con colonne ts, cpu_temp, gpu_temp, cpu_rpm, gpu_rpm, cpu_load")
+    parser.add_argument("--horizon", type=float, default=config.FAN_CONTROL_HORIZON)
+    parser.add_argument("--simulate", type=int, metavar="SECONDI",
+                        help="valuta su una traccia generata dall'EC simulato invece che su un file")
+    parser.add_argument("--seed", type=int, default=1, help="seme dei cambi di carico con --simulate")
+    parser.add_argument("--save", metavar="FILE", help="con --simulate, salva la traccia generata in CSV")
+    args = parser.parse_args(argv)
+    if (args.trace is None) == (args.simulate is None):
+        parser.error("indicare una traccia CSV oppure --simulate")
+
+    if args.simulate is not None:
+        rows = simulated_trace(args.simulate, args.seed)
+        if args.save:
+            save_trace(args.save, rows)
+    else:
+        rows = load_trace(args.trace)
+    for sensor in ("cpu", "gpu"):
+        result = evaluate(rows, sensor, args.horizon)
+        if not result["samples"]:
+            print(f"[MODELLO] {sensor.upper()}: campioni insufficienti")
+            continue
+        model, persistence = result["model"], result["persistence"]
+        print(f"[MODELLO] {sensor.upper()} a {args.horizon:g}s su {result['samples']} previsioni: "
+              f"MAE {model['mae']:.2f}°C, RMSE {model['rmse']:.2f}°C "
+              f"(persistenza: MAE {persistence['mae']:.2f}°C, RMSE {persistence['rmse']:.2f}°C)")
+        print(f"          parametri [a, b, c, d] = {result['parameters']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
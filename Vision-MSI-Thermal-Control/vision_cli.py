@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+
+"""
+Vision MSI Thermal Control - Riga di comando
+Created by Sunray_Vision
+Letture e impostazioni senza GTK, per script, cron e barre di stato: parte in poche decine di millisecondi
+"""
+
+# Solo moduli leggeri: niente gi, asyncio, numpy o subprocess. Quelli che servono a una
+# sola azione (profili, soglia, stato, batteria) vengono importati dentro la funzione che li usa.
+import argparse
+import json
+import sys
+import time
+
+import config
+import ipc
+from ec import SENSOR_BLOCKS, get_device, runs
+from telemetry import SIGNALS
+
+# Colonne dell'uscita, uguali a quelle pubblicate dal daemon.
+FIELDS = ("ts",) + SIGNALS
+# La lettura diretta aggiunge i registri di controllo decodificati (vedi read_direct).
+DIRECT_FIELDS = FIELDS + ("cooler_booster", "battery_threshold")
+
+# Con il daemon attivo ogni lettura passa dalla sua telemetria. Senza daemon si leggono
+# solo i blocchi di temperature, RPM e registri di controllo (ec_sys: una transazione per byte).
+SNAPSHOT_BLOCKS = sorted(SENSOR_BLOCKS + runs([config.EC_COOLER_BOOSTER_CONTROL_ADDR, config.EC_BATTERY_THRESHOLD_ADDR]))
+
+EXIT_OK, EXIT_FAILED, EXIT_UNAVAILABLE = 0, 1, 2
+
+# Opzioni prima del sottocomando, tutte con un valore.
+GLOBAL_OPTIONS = ("--source", "--socket", "--timeout")
+
+
+def _read_int(path: str):
+    try:
+        with open(path) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def read_direct(device=None):
+    """
+    Campione letto direttamente dall'EC (richiede root), nello stesso formato del daemon più
+    lo stato del Cooler Booster e la soglia batteria, decodificati dallo stesso snapshot.
+    Carico CPU e sensori hwmon restano None: servono più letture o moduli pesanti.
+    Ritorna None se la lettura EC fallisce.
+    """
+    from battery import SYSFS_BATTERY_CAPACITY, find_ac_online
+    from state import load_state
+
+    snap = (device or get_device()).read_blocks(SNAPSHOT_BLOCKS)
+    if snap is None:
+        return None
+    cpu_temp, gpu_temp = snap.temps()
+    cpu_rpm, gpu_rpm = snap.rpms()
+    ac_path = find_ac_online()
+    ac_online = _read_int(ac_path) if ac_path is not None else None
+    return {
+        "ts": time.time(),
+        "cpu_temp": cpu_temp, "gpu_temp": gpu_temp, "cpu_rpm": cpu_rpm, "gpu_rpm": gpu_rpm,
+        "battery": _read_int(SYSFS_BATTERY_CAPACITY),
+        "profile": load_state()["fan_profile"],
+        "ac_online": None if ac_online is None else bool(ac_online),
+        "cpu_load": None,
+        "cpu_core_temp": None,
+        "cooler_booster": snap.byte(config.EC_COOLER_BOOSTER_CONTROL_ADDR) == config.EC_COOLER_BOOSTER_ON_VALUE,
+        "battery_threshold": snap.byte(config.EC_BATTERY_THRESHOLD_ADDR) - 128,
+    }
+
+
+class Output:
+    """Una riga per campione: JSON (un oggetto per riga) oppure CSV con intestazione."""
+
+    def __init__(self, fmt: str, out=sys.stdout, fields=FIELDS):
+        self.fmt = fmt
+        self.out = out
+        self.fields = fields
+        self.header = False
+
+    def write(self, sample: dict):
+        if self.fmt == "json":
+            line = json.dumps(sample)
+        else:
+            if not self.header:
+                self.out.write(",".join(self.fields) + "\n")
+                self.header = True
+            line = ",".join("" if sample.get(name) is None else str(sample[name]) for name in self.fields)
+        self.out.write(line + "\n")
+        self.out.flush()  # barre di stato e pipe leggono riga per riga
+
+
+def daemon_samples(client, watch: bool):
+    """Campioni dal daemon: il primo arriva subito alla connessione (l'ultimo pubblicato)."""
+    for sample in client.stream():
+        if "ack" in sample:
+            continue
+        yield sample
+        if not watch:
+            return
+
+
+def direct_samples(watch: bool, interval: float):
+    device = get_device()
+    while True:
+        sample = read_direct(device)
+        if sample is None:
+            raise OSError(f"lettura di {device.path} non riuscita")
+        yield sample
+        if not watch:
+            return
+        time.sleep(interval)
+
+
+def cmd_status(args, client):
+    if client is not None:
+        output, samples = Output(args.format), daemon_samples(client, args.watch)
+    else:
+        output, samples = Output(args.format, fields=DIRECT_FIELDS), direct_samples(args.watch, args.interval)
+    try:
+        for sample in samples:
+            output.write(sample)
+    except ConnectionError:
+        print("[CLI] Il daemon ha chiuso la connessione.", file=sys.stderr)
+        return EXIT_FAILED
+    except OSError as e:
+        print(f"[ERRORE] {e}", file=sys.stderr)
+        return EXIT_UNAVAILABLE
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    return EXIT_OK
+
+
+def _report(result: dict, what: str):
+    if result is None:
+        print(f"[ERRORE] {what}: nessuna risposta dal daemon.", file=sys.stderr)
+        return EXIT_FAILED
+    if not result.get("ok"):
+        print(f"[ERRORE] {what}: {result.get('error') or result.get('mismatched')}", file=sys.stderr)
+        return EXIT_FAILED
+    print(json.dumps(result))
+    return EXIT_OK
+
+
+def set_profile_direct(profile_id: int) -> dict:
+    """Senza daemon: scrittura a blocchi dei soli registri diversi, verifica e file di stato."""
+    from profiles import profile_registers
+    from state import load_state, save_state
+
+    registers = profile_registers(profile_id, load_state()["basic_fan_offset"])
+    if registers is None:
+        return {"ok": False, "cmd": "profile", "value": profile_id, "error": "curva del profilo non valida"}
+    device = get_device()
+    report = device.apply(registers)
+    mismatched = device.verify(registers)
+    result = {"ok": report.ok and not mismatched, "cmd": "profile", "value": profile_id,
+              "changed": len(report.changed), "mismatched": [hex(addr) for addr in mismatched]}
+    if result["ok"]:
+        save_state({"fan_profile": profile_id})
+    return result
+
+
+def set_threshold_direct(threshold: int) -> dict:
+    """Senza daemon: la stessa sequenza verificata del daemon e della GUI, attesa in modo bloccante."""
+    from charge_threshold import ThresholdSequence
+    from state import save_state
+
+    job = ThresholdSequence(threshold)
+    while not job.poll():
+        time.sleep(job.time_to_next())
+    result = dict(job.result(), cmd="battery_threshold", value=threshold)
+    if result["ok"]:
+        save_state({"battery_threshold": threshold})
+    return result
+
+
+def cmd_set(cmd: str, value: int, client, timeout: float):
+    """Con il daemon la richiesta passa dalla sua coda comandi (solo root); altrimenti scrittura diretta."""
+    what = f"{cmd}={value}"
+    try:
+        if client is not None:
+            return _report(client.query(cmd, value, timeout=timeout), what)
+        return _report(set_profile_direct(value) if cmd == "profile" else set_threshold_direct(value), what)
+    except ConnectionError:
+        print(f"[ERRORE] {what}: il daemon ha chiuso la connessione.", file=sys.stderr)
+        return EXIT_FAILED
+    except OSError as e:
+        print(f"[ERRORE] {what}: {e}", file=sys.stderr)
+        return EXIT_UNAVAILABLE
+    except Exception as e:
+        # Es. file di stato o curva malformati: messaggio e codice d'uscita, non un traceback.
+        print(f"[ERRORE] {what}: {type(e).__name__}: {e}", file=sys.stderr)
+        return EXIT_FAILED
+
+
+def parse_profile(text: str) -> int:
+    """Numero (1-4) o nome del profilo, senza distinzione di maiuscole."""
+    from profiles import PROFILE_NAMES
+
+    names = [name.lower() for name in PROFILE_NAMES]
+    if text.lower() in names:
+        return names.index(text.lower()) + 1
+    try:
+        value = int(text)
+    except ValueError:
+        value = 0
+    if not 1 <= value <= len(PROFILE_NAMES):
+        raise argparse.ArgumentTypeError(f"profilo non valido: {text} (1-4 oppure {', '.join(PROFILE_NAMES)})")
+    return value
+
+
+def threshold_value(text: str) -> int:
+    try:
+        value = int(text)
+    except ValueError:
+        value = 0
+    if not 50 <= value <= 100:
+        raise argparse.ArgumentTypeError(f"soglia non valida: {text} (50-100)")
+    return value
+
+
+def _default_command(argv, commands):
+    """
+    Senza sottocomando vale "status": lo inserisce dopo le opzioni globali, così anche le
+    sue opzioni (es. `vision_cli.py --format csv`) vengono riconosciute.
+    """
+    i = 0
+    while i < len(argv) and argv[i].split("=", 1)[0] in GLOBAL_OPTIONS:
+        i += 1 if "=" in argv[i] else 2
+    if i < len(argv) and (argv[i] in commands or argv[i] in ("-h", "--help")):
+        return argv
+    return argv[:i] + ["status"] + argv[i:]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vision MSI Thermal Control da riga di comando")
+    parser.add_argument("--source", choices=("auto", "daemon", "ec"), default="auto",
+                        help="daemon: solo tramite il daemon; ec: lettura/scrittura diretta (root)")
+    parser.add_argument("--socket", default=config.TELEMETRY_SOCKET)
+    parser.add_argument("--timeout", type=float, default=10.0, help="attesa massima della conferma del daemon")
+    sub = parser.add_subparsers(dest="command")
+
+    status = sub.add_parser("status", help="temperature, ventole e batteria (predefinito)")
+    status.add_argument("--format", choices=("json", "csv"), default="json")
+    status.add_argument("--watch", action="store_true", help="una riga per campione, fino a Ctrl+C")
+    status.add_argument("--interval", type=float, default=1.0,
+                        help="secondi tra le letture dirette con --watch (col daemon: ogni suo campione)")
+
+    profile = sub.add_parser("profile", help="applica un profilo ventole")
+    profile.add_argument("profile", type=parse_profile, help="1-4 oppure Auto, Basic, Advanced, Cooler Booster")
+
+    threshold = sub.add_parser("threshold", help="imposta la soglia di carica della batteria")
+    threshold.add_argument("threshold", type=threshold_value, help="percentuale 50-100")
+
+    args = parser.parse_args(_default_command(list(sys.argv[1:] if argv is None else argv), sub.choices))
+
+    client = ipc.connect(args.socket) if args.source != "ec" else None
+    if client is None and args.source == "daemon":
+        print(f"[ERRORE] Daemon non raggiungibile su {args.socket}.", file=sys.stderr)
+        return EXIT_UNAVAILABLE
+    try:
+        if args.command == "status":
+            return cmd_status(args, client)
+        if args.command == "profile":
+            return cmd_set("profile", args.profile, client, args.timeout)
+        return cmd_set("battery_threshold", args.threshold, client, args.timeout)
+    finally:
+        if client is not None:
+            client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())